@@ -1,49 +1,252 @@
 import os
 import json
-import requests
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+
 from django.conf import settings
 
-OPENROUTER_URL = 'https://openrouter.ai/api/v1/chat/completions'
-MODEL_NAME = 'mistralai/mistral-7b-instruct:free'
-FALLBACK_MODEL = 'openrouter/auto'
+from api.llm_providers import (
+    CALL_EVALUATION,
+    CALL_EVALUATION_CRITERION,
+    CALL_EVALUATION_SUMMARY,
+    CALL_START,
+    CALL_TURN,
+    CALL_TURN_SHORT,
+    default_provider_name,
+    get_provider,
+    resolve_provider,
+)
+
+logger = logging.getLogger(__name__)
+
+# Modelos que requieren marcar explícitamente el prefijo cacheable (cache_control).
+# Otros proveedores (OpenAI, DeepSeek...) cachean solos si el prefijo es idéntico byte a byte.
+PROMPT_CACHE_MODEL_PREFIXES = ('anthropic/', 'google/gemini')
+
+# Rúbrica de evaluación: va como mensaje de sistema ANTES del historial para que el
+# prefijo (rúbrica + conversación) sea estable entre llamadas y se pueda cachear.
+EVALUATION_RUBRIC = """TAREA: Analiza el historial de conversación que sigue a estas instrucciones.
+Evalúa al usuario basándote en los siguientes criterios, usando una escala de 1 a 5 (siendo 5 el mejor).
+
+Criterios de Evaluación: {criteria}
+
+FORMATO DE SALIDA: Debes responder ÚNICAMENTE con un objeto JSON válido, sin preámbulos.
+El objeto debe contener:
+1. 'scores': Un objeto con las puntuaciones para cada criterio (ej: {{"liderazgo": 4, "comunicacion": 3}}).
+2. 'summary': Un resumen textual y una interpretación profesional de los resultados.
+3. 'feedback': Una sugerencia concisa para el usuario."""
+
+EVALUATION_TRIGGER = "Evalúa ahora la conversación anterior. Responde ÚNICAMENTE con el objeto JSON."
+
+# Evaluación por criterios en paralelo: mismo prefijo (instrucción + historial) para todas
+# las sub-peticiones, de modo que el proveedor pueda reutilizarlo desde su cache.
+SHARD_RUBRIC = """TAREA: Analiza el historial de conversación que sigue a estas instrucciones.
+Se te pedirá evaluar al usuario en un único aspecto. Responde ÚNICAMENTE con un objeto JSON válido, sin preámbulos."""
+
+SHARD_CRITERION_TRIGGER = """Evalúa ahora al usuario SOLO en el criterio "{name}": {description}
+Usa una escala de 1 a 5 (siendo 5 el mejor). Responde con {{"score": <1-5>}}."""
+
+SHARD_SUMMARY_TRIGGER = """Criterios de Evaluación: {criteria}
+Escribe ahora un objeto JSON con:
+1. 'summary': Un resumen textual y una interpretación profesional del desempeño del usuario.
+2. 'feedback': Una sugerencia concisa para el usuario."""
+
+# max_tokens según el tamaño de la respuesta esperada
+EVALUATION_BASE_TOKENS = 200
+EVALUATION_TOKENS_PER_CRITERION = 40
+EVALUATION_MAX_TOKENS = 1024
+SHARD_SCORE_TOKENS = 32
+SHARD_SUMMARY_TOKENS = 384
+
+# Prompts precompilados por Test: {test_id: (versión, {'system_prompt', 'evaluation_rubric'})}
+_test_prompts = {}
+
+
+def build_evaluation_rubric(evaluation_criteria) -> str:
+    # Serialización canónica (claves ordenadas) para que el texto no cambie entre llamadas
+    criteria = json.dumps(evaluation_criteria, ensure_ascii=False, sort_keys=True)
+    return EVALUATION_RUBRIC.format(criteria=criteria)
+
+
+def get_test_prompts(test) -> dict:
+    # Compila una vez por versión del Test (updated_at) el prompt de sistema y la rúbrica
+    version = getattr(test, 'updated_at', None)
+    cached = _test_prompts.get(test.pk)
+    if cached and cached[0] == version:
+        return cached[1]
+    prompts = {
+        "system_prompt": test.ai_prompt_instructions,
+        "evaluation_rubric": build_evaluation_rubric(test.evaluation_criteria),
+    }
+    _test_prompts[test.pk] = (version, prompts)
+    return prompts
+
+
+def evaluation_max_tokens(criteria_count: int) -> int:
+    # Evaluación completa en una llamada: el JSON crece con el número de criterios
+    tokens = EVALUATION_BASE_TOKENS + EVALUATION_TOKENS_PER_CRITERION * criteria_count
+    return min(tokens, EVALUATION_MAX_TOKENS)
+
+
+def evaluation_mode(criteria_count: int) -> str:
+    # 'single': una llamada; 'sharded': una sub-petición por criterio;
+    # 'auto': en paralelo a partir de AI_EVALUATION_SHARD_MIN_CRITERIA criterios
+    mode = getattr(settings, 'AI_EVALUATION_MODE', 'auto')
+    if mode == 'auto':
+        threshold = getattr(settings, 'AI_EVALUATION_SHARD_MIN_CRITERIA', 4)
+        return 'sharded' if criteria_count >= threshold else 'single'
+    return mode
+
+
+def parse_json_content(response_data: dict) -> dict:
+    # Extrae el objeto JSON de la respuesta de la IA (tolera bloques Markdown y texto sobrante)
+    content = ''
+    try:
+        content = response_data['choices'][0]['message']['content'].strip()
+
+        # Eliminar bloques con Markdonw si existen
+        if content.startswith('```'):
+            content = '\n'.join(content.splitlines()[1:])
+
+            if content.endswith('```'):
+                content = content[:-3].strip()
+
+        return json.loads(content)
+
+    except (json.JSONDecodeError, KeyError, IndexError, TypeError, AttributeError):
+        try:
+            start_index = content.find('{')
+            end_index = content.rfind('}')
+
+            if start_index != -1 and end_index != -1 and end_index > start_index:
+                # Recortar la cadena al objeto JSON (contenido basura antes/después)
+                cleaned_content = content[start_index:end_index + 1]
+                return json.loads(cleaned_content)
+
+            # Si no se encuentra un JSON válido lanzamos el error
+            raise json.JSONDecodeError("No se pudo aislar un objeto JSON válido", content, 0)
+
+        except json.JSONDecodeError:
+            if not content:
+                return {
+                    "error": "Error de procesamiento de JSON de la IA (Estructura de respuesta inesperada)"
+                }
+            return {
+                "error": "Error de procesamiento de JSON de la IA (Fallo al aislar el JSON válido)"
+            }
+
+
+def _parse_score(result: dict):
+    # Puntuación de una sub-petición: número entre 1 y 5, o None si no es válida
+    if not isinstance(result, dict) or 'error' in result:
+        return None
+    score = result.get('score')
+    if isinstance(score, str):
+        try:
+            score = float(score.strip())
+        except ValueError:
+            return None
+    if isinstance(score, bool) or not isinstance(score, (int, float)) or not 1 <= score <= 5:
+        return None
+    return int(score) if float(score).is_integer() else score
+
+
+def supports_prompt_cache_control(model_name: str) -> bool:
+    prefixes = getattr(settings, 'AI_PROMPT_CACHE_MODEL_PREFIXES', PROMPT_CACHE_MODEL_PREFIXES)
+    return bool(model_name) and model_name.startswith(tuple(prefixes))
+
+
+def mark_cacheable(messages: list, prefix_len: int) -> list:
+    # Marca con cache_control el mensaje de sistema y el último mensaje del prefijo estable
+    # (máximo 4 puntos de corte en Anthropic; aquí se usan 2)
+    breakpoints = {0, prefix_len - 1} if prefix_len else set()
+    marked = []
+    for index, message in enumerate(messages):
+        if index in breakpoints and isinstance(message.get("content"), str):
+            message = {
+                "role": message["role"],
+                "content": [{
+                    "type": "text",
+                    "text": message["content"],
+                    "cache_control": {"type": "ephemeral"},
+                }],
+            }
+        marked.append(message)
+    return marked
+
 
 class OpenRouterAIService:
-    # Clase para manejar la comunicación con la API de OpenRouter
-    def __init__(self, system_prompt: str=None):
+    # Clase para manejar la comunicación con el LLM (OpenRouter u otro proveedor, ver api.llm_providers)
+    def __init__(self, system_prompt: str=None, evaluation_rubric: str=None, ai_provider: str=None):
         # Inicializa el servicio
         self.system_prompt = system_prompt
-        self.base_headers = {
-            "Authorization": f"Bearer {settings.OPENROUTER_API_KEY}",
-            "Content-Type": "application/json",
-            "HTTP-Referer": settings.YOUR_SITE_URL,
-            "X-Title": settings.YOUR_SITE_NAME,
-        }
+        self.evaluation_rubric = evaluation_rubric
+        # Proveedor fijado por el Test (si no, se aplican las reglas de AI_ROUTING)
+        self.ai_provider = ai_provider
+        # Uso de tokens acumulado (incluye tokens servidos desde la cache del proveedor)
+        self.usage = {"prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0}
+        # La evaluación por criterios registra el uso desde varios hilos
+        self._usage_lock = threading.Lock()
 
-    def _send_request(self, messages: list, force_json: bool=False, model_name: str=None):
-        # Ejecuta la petición HTTP POST
-        data = {
-            "model": model_name or MODEL_NAME,
-            "messages": messages,
-            # algunos parámetros para evitar respuestas vacías
-            "temperature": 0.7,
-            "max_tokens": 256,
-        }
+    @classmethod
+    def for_test(cls, test):
+        # Servicio con los prompts del Test ya compilados
+        return cls(**get_test_prompts(test), ai_provider=getattr(test, 'ai_provider', None) or None)
 
-        if force_json: 
-            data["response_format"] = {
-                "type": "json_object", # Asegura que la IA se esfuerce en devolver un objeto JSON
-            }
+    def _record_usage(self, response_data: dict, model: str):
+        usage = response_data.get('usage') or {}
+        cached = (usage.get('prompt_tokens_details') or {}).get('cached_tokens') or 0
+        with self._usage_lock:
+            self.usage["prompt_tokens"] += usage.get('prompt_tokens') or 0
+            self.usage["completion_tokens"] += usage.get('completion_tokens') or 0
+            self.usage["cached_tokens"] += cached
+        if usage:
+            logger.info(
+                "LLM %s: prompt_tokens=%s cached_tokens=%s completion_tokens=%s",
+                model, usage.get('prompt_tokens'), cached, usage.get('completion_tokens'),
+            )
 
-        try:
-            response = requests.post(OPENROUTER_URL, headers=self.base_headers, json=data)
-            response.raise_for_status()
-            return response.json()
+    def _send_request(self, messages: list, force_json: bool=False, fallback: bool=False,
+                      cache_prefix_len: int=0, max_tokens: int=256, call_type: str=CALL_TURN):
+        # Ejecuta la petición con el proveedor que corresponda al tipo de llamada
+        # cache_prefix_len: nº de mensajes iniciales que forman el prefijo estable (cacheable)
+        # fallback: usa el modelo de respaldo del proveedor
+        provider = resolve_provider(call_type, self.ai_provider)
+        providers = [provider]
+        if provider.name != default_provider_name():
+            # Si el proveedor elegido (p. ej. el servidor local) falla, se recurre al de por defecto
+            providers.append(get_provider(default_provider_name()))
+            # Con errores recientes (en cualquier worker) se va directamente al de por defecto
+            if not provider.is_available():
+                providers = providers[1:]
 
-        except requests.exceptions.HTTPError as err:
-            return {
-                "error": f"Error de conexión o HTTP con OpenRouter: {err}"
+        for provider in providers:
+            model = provider.fallback_model if fallback else provider.model
+            payload_messages = messages
+            if cache_prefix_len and provider.cache_control and supports_prompt_cache_control(model):
+                payload_messages = mark_cacheable(messages, cache_prefix_len)
+            data = {
+                "model": model,
+                "messages": payload_messages,
+                # algunos parámetros para evitar respuestas vacías
+                "temperature": 0.7,
+                "max_tokens": max_tokens,
             }
 
+            if force_json:
+                data["response_format"] = {
+                    "type": "json_object", # Asegura que la IA se esfuerce en devolver un objeto JSON
+                }
+
+            response_data = provider.send(data, call_type)
+            if 'error' not in response_data:
+                self._record_usage(response_data, model)
+                return response_data
+            logger.warning("Proveedor %s (%s): %s", provider.name, call_type, response_data['error'])
+        return response_data
+
     def start_conversacion(self, initial_user_message: str):
         # Con system_prompt inicia una conversación
         messages = []
@@ -58,15 +261,16 @@ class OpenRouterAIService:
             "content": initial_user_message,
         })
 
-        # Primer intento con el modelo definido
-        resp = self._send_request(messages)
+        # Primer intento con el modelo definido (el prompt de sistema es el prefijo cacheable)
+        prefix_len = 1 if self.system_prompt else 0
+        resp = self._send_request(messages, cache_prefix_len=prefix_len, call_type=CALL_START)
         # Si la respuesta es vacía o solo tokens tipo <s>, hacer fallback
         try:
             content = resp.get('choices', [{}])[0].get('message', {}).get('content', '').strip()
         except Exception:
             content = ''
         if not content or content in {"<s>", "</s>", "<bos>", "<eos>"}:
-            resp = self._send_request(messages, model_name=FALLBACK_MODEL)
+            resp = self._send_request(messages, fallback=True, cache_prefix_len=prefix_len, call_type=CALL_START)
         return resp
 
     def continuar_conversacion(self, chat_history: list, new_user_message: str):
@@ -78,78 +282,112 @@ class OpenRouterAIService:
                 "content": self.system_prompt,
             })
         messages.extend(chat_history)
+        # Sistema + historial previo no cambian entre turnos: prefijo cacheable
+        prefix_len = len(messages)
         messages.append({
             "role": "user",
             "content": new_user_message,
         })
 
-        resp = self._send_request(messages)
+        # Respuestas cortas del usuario: turno ligero, candidato a un proveedor local más rápido
+        short = len(new_user_message or '') <= getattr(settings, 'AI_SHORT_TURN_MAX_CHARS', 200)
+        call_type = CALL_TURN_SHORT if short else CALL_TURN
+        resp = self._send_request(messages, cache_prefix_len=prefix_len, call_type=call_type)
         try:
             content = resp.get('choices', [{}])[0].get('message', {}).get('content', '').strip()
         except Exception:
             content = ''
         if not content or content in {"<s>", "</s>", "<bos>", "<eos>"}:
-            resp = self._send_request(messages, model_name=FALLBACK_MODEL)
+            resp = self._send_request(messages, fallback=True, cache_prefix_len=prefix_len, call_type=call_type)
         return resp
 
     def evaluar_test(self, chat_log: list, evaluation_criteria: dict) -> dict:
         # Envia el historial completo de la conversación para una evaluación estructurada
-        evaluation_prompt = f"""
-        TAREA: Analiza el historial de conversación proporcionado a continuación. 
-        Evalúa al usuario basándote en los siguientes criterios, usando una escala de 1 a 5 (siendo 5 el mejor).
-
-        Criterios de Evaluación: {json.dumps(evaluation_criteria)}
+        criteria = evaluation_criteria if isinstance(evaluation_criteria, dict) else {}
+        if criteria and evaluation_mode(len(criteria)) == 'sharded':
+            return self._evaluar_por_criterios(chat_log, criteria)
 
-        FORMATO DE SALIDA: Debes responder ÚNICAMENTE con un objeto JSON válido, sin preámbulos.
-        El objeto debe contener:
-        1. 'scores': Un objeto con las puntuaciones para cada criterio (ej: {{"liderazgo": 4, "comunicacion": 3}}).
-        2. 'summary': Un resumen textual y una interpretación profesional de los resultados.
-        3. 'feedback': Una sugerencia concisa para el usuario.
+        rubric = self.evaluation_rubric or build_evaluation_rubric(evaluation_criteria)
 
-        Aquí está el historial de la conversación:
-        """
-
-        mensajes_enviar = chat_log + [{
+        # Rúbrica + historial forman el prefijo estable; la instrucción final es corta
+        mensajes_enviar = [{"role": "system", "content": rubric}] + list(chat_log)
+        prefix_len = len(mensajes_enviar)
+        mensajes_enviar.append({
             "role": "user",
-            "content": evaluation_prompt,
-        }]
+            "content": EVALUATION_TRIGGER,
+        })
 
-        response_data = self._send_request(mensajes_enviar, force_json=True)
+        response_data = self._send_request(mensajes_enviar, force_json=True, cache_prefix_len=prefix_len,
+                                           max_tokens=evaluation_max_tokens(len(criteria)),
+                                           call_type=CALL_EVALUATION)
 
         if 'error' in response_data:
             return response_data
 
-        try:
-            content = response_data['choices'][0]['message']['content'].strip()
-
-            # Eliminar bloques con Markdonw si existen
-            if content.startswith('```'):
-                content = '\n'.join(content.splitlines()[1:])
+        return parse_json_content(response_data)
 
-                if content.endswith('```'):
-                    content = content[:-3].strip()
+    def _evaluar_fragmento(self, messages: list, prefix_len: int, max_tokens: int, validate, call_type: str):
+        # Una sub-petición con reintentos propios: si falla solo se repite este fragmento.
+        # El último intento usa el modelo de respaldo. Devuelve el valor validado o None.
+        retries = getattr(settings, 'AI_EVALUATION_SHARD_RETRIES', 1)
+        for attempt in range(retries + 1):
+            response_data = self._send_request(messages, force_json=True, fallback=bool(attempt) and attempt == retries,
+                                               cache_prefix_len=prefix_len, max_tokens=max_tokens,
+                                               call_type=call_type)
+            if 'error' not in response_data:
+                value = validate(parse_json_content(response_data))
+                if value is not None:
+                    return value
+            logger.warning("Evaluación por criterios: intento %s fallido", attempt + 1)
+        return None
 
-            return json.loads(content)
+    def _evaluar_por_criterios(self, chat_log: list, evaluation_criteria: dict) -> dict:
+        # Puntúa cada criterio en una sub-petición y redacta resumen/feedback en otra,
+        # todas en paralelo (concurrencia acotada). Resultado con la misma forma que evaluar_test.
+        prefix = [{"role": "system", "content": SHARD_RUBRIC}] + list(chat_log)
+        prefix_len = len(prefix)
 
-        except (json.JSONDecodeError, KeyError) as err:
-            try:
-                start_index = content.find('{')
-                end_index = content.rfind('}')
+        def shard(trigger: str) -> list:
+            return prefix + [{"role": "user", "content": trigger}]
 
-                if start_index != -1 and end_index != -1 and end_index > start_index:
-                    # Recortar la cadena al objeto JSON (contenido basura antes/después)
-                    cleaned_content = content[start_index:end_index + 1]
-                    return json.loads(cleaned_content)
+        def valid_summary(result):
+            if not isinstance(result, dict) or 'error' in result or not result.get('summary'):
+                return None
+            return result
 
-                # Si no se encuentra un JSON válido lanzamos el error
-                raise json.JSONDecodeError("No se pudo aislar un objeto JSON válido", content, 0)
+        names = list(evaluation_criteria)
+        criteria_json = json.dumps(evaluation_criteria, ensure_ascii=False, sort_keys=True)
+        workers = max(1, min(getattr(settings, 'AI_EVALUATION_CONCURRENCY', 4), len(names) + 1))
+        # copy_context: cada sub-petición ve el perfil de la petición en curso (core.profiling)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='criterion') as pool:
+            summary_future = pool.submit(
+                copy_context().run, self._evaluar_fragmento,
+                shard(SHARD_SUMMARY_TRIGGER.format(criteria=criteria_json)),
+                prefix_len, SHARD_SUMMARY_TOKENS, valid_summary, CALL_EVALUATION_SUMMARY,
+            )
+            score_futures = {
+                name: pool.submit(
+                    copy_context().run, self._evaluar_fragmento,
+                    shard(SHARD_CRITERION_TRIGGER.format(name=name, description=evaluation_criteria[name])),
+                    prefix_len, SHARD_SCORE_TOKENS, _parse_score, CALL_EVALUATION_CRITERION,
+                )
+                for name in names
+            }
+            scores = {name: future.result() for name, future in score_futures.items()}
+            summary = summary_future.result()
 
-            except json.JSONDecodeError:
-                return {
-                    "error": "Error de procesamiento de JSON de la IA (Fallo al aislar el JSON válido)"
-                }
+        failed = [name for name, score in scores.items() if score is None]
+        if summary is None or len(failed) == len(names):
+            return {
+                "error": "Error de evaluación de la IA (no se pudo evaluar tras los reintentos)"
+            }
 
-            except KeyError:
-                return {
-                    "error": "Error de procesamiento de JSON de la IA (Estructura de respuesta inesperada)"
-                }
\ No newline at end of file
+        result = {
+            "scores": scores,
+            "summary": summary.get('summary'),
+            "feedback": summary.get('feedback') or '',
+        }
+        if failed:
+            # Criterios sin puntuación tras agotar los reintentos (puntuación null)
+            result["failed_criteria"] = failed
+        return result
@@ -0,0 +1,108 @@
+import time
+from functools import wraps
+
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from core import score_stats
+from core.models import TestExecution
+from core.shared_state import get_state
+
+# Versiones de los listados, incrementadas al guardar o borrar filas (ver api.signals).
+# El ETag sale de aquí sin consultar la base de datos
+TESTS_VERSION_KEY = 'conditional:tests:version'
+USERS_VERSION_KEY = 'conditional:users:version'
+
+
+def _is_staff(user) -> bool:
+    return user.is_authenticated and (user.is_staff or user.is_superuser)
+
+
+def conditional_get(validators):
+    # Decorador para métodos GET de APIView: ETag/Last-Modified calculados con una consulta
+    # indexada, sin serializar el cuerpo. 'validators' devuelve (etag, last_modified) o None
+    # (sin validadores, p. ej. usuario no autorizado: la vista responde como siempre).
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            values = validators(request, *args, **kwargs)
+            if values is None:
+                return method(self, request, *args, **kwargs)
+
+            etag, last_modified = values
+            timestamp = int(last_modified.timestamp()) if last_modified else None
+            not_modified = get_conditional_response(request, etag=etag, last_modified=timestamp)
+            if not_modified is not None:
+                not_modified['ETag'] = etag
+                patch_cache_control(not_modified, private=True, no_cache=True)
+                return not_modified
+
+            response = method(self, request, *args, **kwargs)
+            if response.status_code == 200:
+                response['ETag'] = etag
+                if timestamp is not None:
+                    response['Last-Modified'] = http_date(timestamp)
+                # El cliente puede guardar la respuesta pero debe revalidarla siempre (304 si no cambió)
+                patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
+
+
+def execution_log_validators(request, execution_id):
+    if not request.user.is_authenticated:
+        return None
+    row = (
+        TestExecution.objects
+        .filter(pk=execution_id, user=request.user)
+        .values_list('updated_at', 'test_id')
+        .first()
+    )
+    if row is None:
+        return None
+    updated_at, test_id = row
+    # La comparación con la cohorte cambia al evaluarse otras ejecuciones del mismo Test
+    return f'"log-{execution_id}-{updated_at.timestamp()}-{score_stats.version(test_id)}"', updated_at
+
+
+def _initial_version() -> int:
+    # Si el estado compartido se reinicia, la versión vuelve a empezar por encima de las ya emitidas
+    return int(time.time() * 1000)
+
+
+def get_version(key) -> int:
+    state = get_state()
+    value = state.get(key)
+    if value is None:
+        state.add(key, _initial_version())
+        value = state.get(key, 0)
+    return value
+
+
+def bump_version(key):
+    state = get_state()
+    state.add(key, _initial_version())
+    state.incr(key)
+
+
+def bump_tests_version():
+    bump_version(TESTS_VERSION_KEY)
+
+
+def bump_users_version():
+    bump_version(USERS_VERSION_KEY)
+
+
+def tests_list_validators(request):
+    # Listados: solo ETag. Last-Modified no refleja los borrados, y un cliente que solo
+    # enviara If-Modified-Since recibiría 304 con filas que ya no existen
+    if not _is_staff(request.user):
+        return None
+    return f'"tests-{get_version(TESTS_VERSION_KEY)}"', None
+
+
+def users_with_executions_validators(request):
+    if not _is_staff(request.user):
+        return None
+    # Cambia con los usuarios (renombrados) y con las altas y borrados de ejecuciones (contadores)
+    return f'"users-execs-{get_version(USERS_VERSION_KEY)}"', None
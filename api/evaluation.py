@@ -0,0 +1,81 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from api import events
+from api.ai_service import OpenRouterAIService
+from core import score_stats, search
+from core.models import TestExecution
+
+logger = logging.getLogger(__name__)
+
+# Pool acotado para evaluaciones en segundo plano (TestFinalView con async=true)
+_executor = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'EVALUATION_WORKERS', 4),
+            thread_name_prefix='evaluation',
+        )
+    return _executor
+
+
+def evaluate_execution(execution: TestExecution) -> dict:
+    # Evalúa una ejecución ya finalizada, guarda el resultado y notifica por el canal push
+    ai_service = OpenRouterAIService.for_test(execution.test)
+
+    # Usar el chat_log de la ejecución y los criterios del Test
+    evaluation_result = ai_service.evaluar_test(execution.chat_log, execution.test.evaluation_criteria)
+
+    # Si falla, el detalle del error queda en evaluation_result para trazabilidad
+    execution.evaluation_result = evaluation_result
+    # Solo el resultado: la instancia puede ser anterior a la llamada a la IA (chat_log, finish_time)
+    execution.save(update_fields=['evaluation_result', 'updated_at'])
+    search.index_evaluation(execution)
+    score_stats.record_evaluation(execution)
+
+    events.publish(events.EVALUATION_COMPLETED, {
+        "execution_id": execution.id,
+        "user_id": execution.user_id,
+        "ok": 'error' not in evaluation_result,
+    }, user_id=execution.user_id)
+    return evaluation_result
+
+
+def _evaluate_by_id(execution_id: int) -> dict:
+    close_old_connections()
+    try:
+        execution = TestExecution.objects.select_related('test').get(pk=execution_id)
+        return evaluate_execution(execution)
+    finally:
+        close_old_connections()
+
+
+def evaluate_in_background(execution_id: int):
+    # Encola la evaluación; el resultado llega al cliente como evento 'evaluation.completed'
+    return _get_executor().submit(_evaluate_by_id, execution_id)
+
+
+def evaluate_many(execution_ids: list, concurrency: int) -> tuple:
+    # Evalúa un lote con concurrencia acotada (pool propio, no compite con el de las vistas).
+    # Devuelve (correctas, fallidas)
+    def run(execution_id):
+        try:
+            return _evaluate_by_id(execution_id)
+        except Exception:
+            logger.exception("Error evaluando la ejecución %s", execution_id)
+            return {"error": "Error interno de evaluación"}
+
+    ok = failed = 0
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix='evaluation-batch') as pool:
+        for result in pool.map(run, execution_ids):
+            if 'error' in result:
+                failed += 1
+            else:
+                ok += 1
+    return ok, failed
@@ -0,0 +1,119 @@
+import asyncio
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from core.shared_state import get_state
+
+# Canal de eventos push (SSE) respaldado por el estado compartido (core.shared_state): con un
+# backend compartido los eventos llegan a clientes conectados a cualquier worker.
+SEQ_KEY = 'events:seq'
+EVENT_KEY = 'events:{}'
+
+# Tipos de evento
+EVALUATION_COMPLETED = 'evaluation.completed'
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def publish(event_type: str, data: dict, user_id=None, staff: bool = True) -> int:
+    # Publica un evento visible para el usuario indicado y/o para el personal (staff)
+    state = get_state()
+    event_id = state.incr(SEQ_KEY)
+    state.set(EVENT_KEY.format(event_id), {
+        "id": event_id,
+        "type": event_type,
+        "data": data,
+        "user_id": user_id,
+        "staff": staff,
+    }, _setting('EVENTS_TTL', 300))
+    return event_id
+
+
+def push_available() -> bool:
+    # El stream y la evaluación en segundo plano suelen correr en workers distintos: sin estado
+    # compartido el evento no llegaría y el cliente debe consultar el log de la ejecución
+    return get_state().shared
+
+
+def current_id() -> int:
+    return get_state().get(SEQ_KEY, 0)
+
+
+def _visible(event: dict, user) -> bool:
+    if event["user_id"] is not None and event["user_id"] == user.pk:
+        return True
+    return event["staff"] and (user.is_staff or user.is_superuser)
+
+
+def fetch_since(last_id: int, user) -> tuple:
+    # Devuelve (eventos visibles, último id leído) con una única lectura múltiple a cache
+    newest = current_id()
+    if newest <= last_id:
+        return [], last_id
+    # Si el cliente se quedó muy atrás solo se le envían los más recientes
+    first = max(last_id + 1, newest - _setting('EVENTS_MAX_BACKLOG', 200) + 1)
+    keys = [EVENT_KEY.format(i) for i in range(first, newest + 1)]
+    found = get_state().get_many(keys)
+    events = [found[k] for k in keys if k in found and _visible(found[k], user)]
+    return events, newest
+
+
+def format_sse(event: dict) -> str:
+    payload = json.dumps(event["data"], ensure_ascii=False, separators=(',', ':'))
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {payload}\n\n"
+
+
+class _StreamState:
+    # Estado de una conexión SSE: último id enviado, keepalive y duración máxima
+    def __init__(self, last_id: int):
+        now = time.monotonic()
+        self.last_id = last_id
+        self.last_sent = now
+        self.deadline = now + _setting('EVENTS_STREAM_SECONDS', 300)
+
+    @property
+    def alive(self) -> bool:
+        # Al expirar se cierra la conexión y EventSource reconecta con Last-Event-ID
+        return time.monotonic() < self.deadline
+
+    def next_chunk(self, user):
+        events, self.last_id = fetch_since(self.last_id, user)
+        now = time.monotonic()
+        if events:
+            self.last_sent = now
+            return ''.join(format_sse(ev) for ev in events)
+        if now - self.last_sent > _setting('EVENTS_KEEPALIVE_SECONDS', 15):
+            self.last_sent = now
+            return ": keepalive\n\n"
+        return None
+
+
+def _retry_line() -> str:
+    return f"retry: {_setting('EVENTS_RETRY_MS', 3000)}\n\n"
+
+
+def iter_events(user, last_id: int):
+    # Generador síncrono (WSGI, solo desarrollo): ocupa un hilo del worker mientras dure la conexión
+    state = _StreamState(last_id)
+    yield _retry_line()
+    while state.alive:
+        chunk = state.next_chunk(user)
+        if chunk:
+            yield chunk
+        time.sleep(_setting('EVENTS_POLL_INTERVAL', 1.0))
+
+
+async def aiter_events(user, last_id: int):
+    # Generador asíncrono (ASGI): no ocupa un hilo mientras espera
+    state = _StreamState(last_id)
+    yield _retry_line()
+    while state.alive:
+        chunk = await sync_to_async(state.next_chunk)(user)
+        if chunk:
+            yield chunk
+        await asyncio.sleep(_setting('EVENTS_POLL_INTERVAL', 1.0))
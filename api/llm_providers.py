@@ -0,0 +1,223 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from core.profiling import record_upstream
+from core.shared_state import get_state, update_max
+
+logger = logging.getLogger(__name__)
+
+# Proveedores de LLM intercambiables (API de chat compatible con OpenAI).
+# settings.AI_PROVIDERS define los proveedores disponibles y settings.AI_ROUTING qué
+# proveedor atiende cada tipo de llamada; un Test puede fijar el suyo (Test.ai_provider).
+OPENROUTER_URL = 'https://openrouter.ai/api/v1/chat/completions'
+MODEL_NAME = 'mistralai/mistral-7b-instruct:free'
+FALLBACK_MODEL = 'openrouter/auto'
+
+DEFAULT_PROVIDER = 'openrouter'
+
+# Tipos de llamada. Si un tipo no tiene regla propia se usa la de su "padre"
+CALL_START = 'start'
+CALL_TURN = 'turn'
+CALL_TURN_SHORT = 'turn_short'
+CALL_EVALUATION = 'evaluation'
+CALL_EVALUATION_CRITERION = 'evaluation_criterion'
+CALL_EVALUATION_SUMMARY = 'evaluation_summary'
+CALL_TYPE_PARENTS = {
+    CALL_TURN_SHORT: CALL_TURN,
+    CALL_EVALUATION_CRITERION: CALL_EVALUATION,
+    CALL_EVALUATION_SUMMARY: CALL_EVALUATION,
+}
+
+# Errores que merecen reintento (saturación o fallo transitorio del servidor)
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# Métricas y salud de cada proveedor en el estado compartido (core.shared_state): las ven
+# todos los workers. Claves llm:<proveedor>:<métrica>
+METRICS = ('requests', 'errors', 'retries', 'ms')
+METRIC_KEY = 'llm:{}:{}'
+
+_providers = {}
+_providers_lock = threading.Lock()
+
+
+class ChatProvider:
+    # Base: petición HTTP con timeout, reintentos con espera exponencial y métricas
+    label = 'LLM'
+    # El proveedor acepta marcas cache_control en los mensajes (prefijos cacheables)
+    cache_control = False
+
+    def __init__(self, name: str, options: dict):
+        self.name = name
+        self.url = options.get('URL')
+        self.model = options.get('MODEL')
+        self.fallback_model = options.get('FALLBACK_MODEL') or self.model
+        self.timeout = options.get('TIMEOUT', 60)
+        self.retries = options.get('RETRIES', 2)
+        self.backoff = options.get('BACKOFF', 0.5)
+        self.api_key = options.get('API_KEY')
+        # Sesión HTTP persistente: reutiliza conexiones (keep-alive) entre peticiones.
+        # requests se importa aquí, con el primer proveedor: arrancar un worker o un comando no lo paga
+        import requests
+        self.session = requests.Session()
+
+    def headers(self) -> dict:
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        return headers
+
+    def build_payload(self, payload: dict) -> dict:
+        return payload
+
+    def _count(self, **increments):
+        state = get_state()
+        for metric, value in increments.items():
+            state.incr(METRIC_KEY.format(self.name, metric), value)
+
+    def _fail(self):
+        # Tras PROVIDER_FAILURE_THRESHOLD errores en PROVIDER_FAILURE_WINDOW segundos (sumando todos
+        # los workers) el proveedor queda marcado como no disponible durante PROVIDER_COOLDOWN segundos
+        self._count(errors=1)
+        state = get_state()
+        failures_key = METRIC_KEY.format(self.name, 'failures')
+        failures = state.incr(failures_key, ttl=getattr(settings, 'PROVIDER_FAILURE_WINDOW', 60))
+        if failures >= getattr(settings, 'PROVIDER_FAILURE_THRESHOLD', 5):
+            cooldown = getattr(settings, 'PROVIDER_COOLDOWN', 30)
+            if state.add(METRIC_KEY.format(self.name, 'down'), 1, ttl=cooldown):
+                logger.warning("Proveedor %s no disponible durante %ss (%d errores)", self.name, cooldown, failures)
+                state.delete(failures_key)
+
+    def is_available(self) -> bool:
+        return not get_state().get(METRIC_KEY.format(self.name, 'down'))
+
+    def _wait(self, attempt: int, response=None):
+        delay = self.backoff * (2 ** attempt)
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, min(int(retry_after), 10))
+        time.sleep(delay)
+
+    def send(self, payload: dict, call_type: str = None) -> dict:
+        # Devuelve la respuesta JSON del proveedor o {"error": ...} (mismo contrato que antes)
+        import requests
+        payload = self.build_payload(payload)
+        started = time.monotonic()
+        try:
+            for attempt in range(self.retries + 1):
+                response = None
+                try:
+                    response = self.session.post(self.url, headers=self.headers(), json=payload,
+                                                 timeout=self.timeout)
+                    if response.status_code in RETRY_STATUS and attempt < self.retries:
+                        self._count(retries=1)
+                        self._wait(attempt, response)
+                        continue
+                    response.raise_for_status()
+                    return response.json()
+                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as err:
+                    if attempt < self.retries:
+                        self._count(retries=1)
+                        self._wait(attempt)
+                        continue
+                    self._fail()
+                    return {"error": f"Error de conexión o HTTP con {self.label}: {err}"}
+                except (requests.exceptions.RequestException, ValueError) as err:
+                    self._fail()
+                    return {"error": f"Error de conexión o HTTP con {self.label}: {err}"}
+        finally:
+            elapsed = time.monotonic() - started
+            elapsed_ms = round(elapsed * 1000)
+            self._count(requests=1, ms=elapsed_ms)
+            update_max(METRIC_KEY.format(self.name, 'max_ms'), elapsed_ms)
+            record_upstream(self.label, elapsed, call_type)
+
+    def snapshot(self) -> dict:
+        # Métricas agregadas de todos los workers que comparten el estado
+        state = get_state()
+        metrics = {metric: state.get(METRIC_KEY.format(self.name, metric), 0) for metric in METRICS}
+        metrics["max_ms"] = state.get(METRIC_KEY.format(self.name, 'max_ms'))
+        metrics["avg_ms"] = round(metrics["ms"] / metrics["requests"], 1) if metrics["requests"] else None
+        return {"provider": self.name, "label": self.label, "model": self.model,
+                "available": self.is_available(), **metrics}
+
+
+class OpenRouterProvider(ChatProvider):
+    label = 'OpenRouter'
+    cache_control = True
+
+    def __init__(self, name: str, options: dict):
+        options = {
+            'URL': OPENROUTER_URL,
+            'MODEL': MODEL_NAME,
+            'FALLBACK_MODEL': FALLBACK_MODEL,
+            'API_KEY': settings.OPENROUTER_API_KEY,
+            **options,
+        }
+        super().__init__(name, options)
+
+    def headers(self) -> dict:
+        return {
+            **super().headers(),
+            "HTTP-Referer": settings.YOUR_SITE_URL,
+            "X-Title": settings.YOUR_SITE_NAME,
+        }
+
+    def build_payload(self, payload: dict) -> dict:
+        # Pide el desglose de uso (incluye tokens cacheados)
+        return {**payload, "usage": {"include": True}}
+
+
+class OpenAICompatibleProvider(ChatProvider):
+    # Servidor de inferencia local compatible con OpenAI (llama.cpp, vLLM, Ollama...)
+    label = 'servidor local'
+
+    def __init__(self, name: str, options: dict):
+        base_url = (options.get('BASE_URL') or 'http://127.0.0.1:8080/v1').rstrip('/')
+        options = {'URL': f"{base_url}/chat/completions", 'TIMEOUT': 30, 'RETRIES': 0, **options}
+        super().__init__(name, options)
+
+
+def _configured() -> dict:
+    return getattr(settings, 'AI_PROVIDERS', None) or {DEFAULT_PROVIDER: {}}
+
+
+def get_provider(name: str) -> ChatProvider:
+    provider = _providers.get(name)
+    if provider is None:
+        with _providers_lock:
+            provider = _providers.get(name)
+            if provider is None:
+                options = dict(_configured()[name])
+                backend = options.pop('BACKEND', 'api.llm_providers.OpenRouterProvider')
+                provider = _providers[name] = import_string(backend)(name, options)
+    return provider
+
+
+def default_provider_name() -> str:
+    return getattr(settings, 'AI_DEFAULT_PROVIDER', DEFAULT_PROVIDER)
+
+
+def resolve_provider(call_type: str, test_provider: str = None) -> ChatProvider:
+    # Prioridad: proveedor del Test > regla del tipo de llamada (o de su padre) > por defecto
+    configured = _configured()
+    if test_provider:
+        if test_provider in configured:
+            return get_provider(test_provider)
+        logger.warning("Proveedor de IA desconocido en el Test: %s", test_provider)
+    routing = getattr(settings, 'AI_ROUTING', {})
+    while call_type:
+        name = routing.get(call_type)
+        if name in configured:
+            return get_provider(name)
+        call_type = CALL_TYPE_PARENTS.get(call_type)
+    return get_provider(default_provider_name())
+
+
+def metrics_snapshot() -> list:
+    # Todos los proveedores configurados: las métricas están en el estado compartido, así que
+    # incluyen las llamadas de otros workers aunque este no haya usado aún el proveedor
+    return [get_provider(name).snapshot() for name in _configured()]
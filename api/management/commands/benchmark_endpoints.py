@@ -0,0 +1,290 @@
+import json
+import random
+import statistics
+import time
+import tracemalloc
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext,
+    override_settings,
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+from django.utils import timezone
+
+from core import score_stats, search
+from core.models import CriterionScore, Entity, EntityProfile, ExecutionSearchDocument, Test, TestExecution
+
+# Presupuestos por endpoint: {"nombre": {"queries": N, "ms": N, "peak_kb": N}}
+BUDGETS_PATH = Path(__file__).resolve().parents[2] / 'benchmark_budgets.json'
+
+CRITERIA = {
+    "comunicacion": "Claridad y coherencia en las respuestas.",
+    "razonamiento": "Capacidad de explicar y argumentar.",
+    "conocimiento": "Dominio del tema y conceptos clave.",
+}
+ANSWER = ("En mi último proyecto coordiné a un equipo de cinco personas; cuando surgió un conflicto "
+          "sobre prioridades propuse una reunión breve, escuchamos a todos y acordamos un plan. ")
+
+
+def fake_completion(payload: dict) -> dict:
+    # Respuesta simulada del LLM con la misma forma que la de OpenRouter
+    last = payload["messages"][-1]["content"]
+    if isinstance(last, list):
+        last = last[0]["text"]
+    if payload.get("response_format"):
+        if '"score"' in last:
+            content = '{"score": 4}'
+        elif "'summary'" in last and "'scores'" not in last:
+            content = json.dumps({"summary": "Buen desempeño.", "feedback": "Concreta más."})
+        else:
+            content = json.dumps({"scores": {name: 4 for name in CRITERIA},
+                                  "summary": "Buen desempeño.", "feedback": "Concreta más."})
+    else:
+        content = "Gracias. ¿Podrías darme un ejemplo concreto de una situación similar?"
+    return {
+        "choices": [{"message": {"role": "assistant", "content": content}}],
+        "usage": {"prompt_tokens": 100, "completion_tokens": 20},
+    }
+
+
+class Command(BaseCommand):
+    help = ("Mide consultas SQL, tiempo y memoria pico de cada endpoint (API y HTML) sobre una BD de prueba "
+            "con datos sembrados y la IA simulada; compara con presupuestos y con una línea base")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--entities', type=int, default=3)
+        parser.add_argument('--candidates', type=int, default=300)
+        parser.add_argument('--tests', type=int, default=20)
+        parser.add_argument('--executions', type=int, default=3000)
+        parser.add_argument('--turns', type=int, default=10, help="Turnos (pregunta + respuesta) por ejecución")
+        parser.add_argument('--repeat', type=int, default=5, help="Repeticiones por endpoint (se toma la mediana)")
+        parser.add_argument('--ai-latency', type=int, default=50, help="Latencia simulada de la IA (ms)")
+        parser.add_argument('--only', help="Endpoints a medir, separados por comas")
+        parser.add_argument('--budgets', default=str(BUDGETS_PATH))
+        parser.add_argument('--baseline', help="JSON de una ejecución anterior con el que comparar")
+        parser.add_argument('--save-baseline', help="Guarda las mediciones en este JSON")
+        parser.add_argument('--strict', action='store_true', help="Falla si algún endpoint supera su presupuesto")
+
+    def handle(self, *args, **options):
+        budgets = self._load_json(options['budgets'], "presupuestos")
+        baseline = self._load_json(options['baseline'], "línea base") if options['baseline'] else {}
+
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+        try:
+            cache.clear()
+            self.seed(options)
+            latency = options['ai_latency'] / 1000
+
+            def send(provider, payload, call_type=None):
+                time.sleep(latency)
+                return fake_completion(payload)
+
+            # Los presupuestos corresponden a producción (cache compartida: sesión y usuario en cache).
+            # En este único proceso la cache local se comporta igual que una compartida
+            with mock.patch('api.llm_providers.ChatProvider.send', send), \
+                    mock.patch('core.auth_cache.cache_is_shared', return_value=True), \
+                    override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cached_db'):
+                results = self.run_benchmarks(options)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        over = self.report(results, budgets, baseline)
+        if options['save_baseline']:
+            with open(options['save_baseline'], 'w', encoding='utf-8') as fh:
+                json.dump(results, fh, indent=2, ensure_ascii=False)
+            self.stdout.write(f"Línea base guardada en {options['save_baseline']}")
+        if over and options['strict']:
+            raise CommandError(f"{len(over)} endpoints superan su presupuesto: {', '.join(over)}")
+
+    def _load_json(self, path, label) -> dict:
+        try:
+            with open(path, encoding='utf-8') as fh:
+                return json.load(fh)
+        except (OSError, ValueError) as err:
+            raise CommandError(f"No se pudo leer el fichero de {label}: {err}")
+
+    # Datos -----------------------------------------------------------------
+
+    def seed(self, options):
+        started = time.monotonic()
+        rnd = random.Random(42)
+        self.admin = User.objects.create_superuser('bench_admin', 'admin@example.com', 'bench')
+        entities = Entity.objects.bulk_create([
+            Entity(name=f"Entidad {i}", contact_email=f"e{i}@example.com") for i in range(options['entities'])
+        ])
+        candidates = User.objects.bulk_create([
+            User(username=f"candidato{i}", email=f"c{i}@example.com", password='!')
+            for i in range(options['candidates'])
+        ])
+        EntityProfile.objects.bulk_create([
+            EntityProfile(user=user, entity=entities[i % len(entities)], is_manager=(i == 0))
+            for i, user in enumerate(candidates)
+        ])
+        tests = Test.objects.bulk_create([
+            Test(name=f"Test {i}", purpose="Evaluación de prueba", creator=self.admin,
+                 ai_prompt_instructions="Eres un entrevistador. Haz preguntas una a una.",
+                 evaluation_criteria=CRITERIA)
+            for i in range(options['tests'])
+        ])
+        chat_log = []
+        for turn in range(options['turns']):
+            chat_log.append({"role": "assistant", "content": f"Pregunta {turn}: ¿cómo resolviste un conflicto?"})
+            chat_log.append({"role": "user", "content": ANSWER})
+
+        batch = []
+        for i in range(options['executions']):
+            user = candidates[i % len(candidates)]
+            batch.append(TestExecution(
+                test=tests[i % len(tests)], user=user, entity=entities[(i % len(candidates)) % len(entities)],
+                chat_log=chat_log, finish_time=timezone.now(),
+                evaluation_result={"scores": {name: rnd.randint(1, 5) for name in CRITERIA},
+                                   "summary": "Buen desempeño.", "feedback": "Concreta más."},
+            ))
+            if len(batch) >= 500:
+                self._save_executions(batch)
+                batch = []
+        if batch:
+            self._save_executions(batch)
+
+        self.candidate = candidates[1]
+        self.test = tests[0]
+        self.execution = TestExecution.objects.filter(user=self.candidate).order_by('pk').first()
+        self.stdout.write(f"Datos sembrados en {time.monotonic() - started:.1f}s: {options['executions']} ejecuciones, "
+                          f"{options['candidates']} candidatos, {options['tests']} tests")
+
+    def _save_executions(self, batch):
+        executions = TestExecution.objects.bulk_create(batch)
+        ExecutionSearchDocument.objects.bulk_create([search.build_document(ex) for ex in executions])
+        CriterionScore.objects.bulk_create([row for ex in executions for row in score_stats.build_rows(ex)])
+
+    def _open_execution(self, turns: int = 3) -> TestExecution:
+        log = [{"role": "assistant", "content": "¿Empezamos?"}, {"role": "user", "content": ANSWER}] * turns
+        return TestExecution.objects.create(test=self.test, user=self.candidate,
+                                            entity=self.candidate.entityprofile.entity, chat_log=log)
+
+    # Endpoints -------------------------------------------------------------
+
+    def endpoints(self) -> list:
+        # (nombre, método, usuario, preparación -> (url, datos))
+        ex = self.execution
+        username = self.candidate.username
+        return [
+            ('test-initiate', 'post', 'candidate', lambda: (f'/api/test/{self.test.pk}/initiate/', {"message": "Hola"})),
+            ('test-continue', 'post', 'candidate',
+             lambda: (f'/api/test/{self._open_execution().pk}/continue/', {"message": ANSWER})),
+            ('test-finish', 'post', 'candidate', lambda: (f'/api/test/{self._open_execution().pk}/finish/', {})),
+            ('test-finish-async', 'post', 'candidate',
+             lambda: (f'/api/test/{self._open_execution().pk}/finish/', {"async": True})),
+            ('tests-random', 'get', 'candidate', lambda: ('/api/tests/random/', None)),
+            ('test-log', 'get', 'candidate', lambda: (f'/api/test/{ex.pk}/log/', None)),
+            ('tests-create', 'post', 'admin', lambda: ('/api/tests/create/', {"template": "soft_skills"})),
+            ('tests-create-custom', 'post', 'admin',
+             lambda: ('/api/tests/create_custom/', {"mode": "tema", "topic": "Redes", "count": 5})),
+            ('tests-bulk-create', 'post', 'admin',
+             lambda: ('/api/tests/bulk_create/', {"tests": [{"template": "idiomas"}] * 50})),
+            ('tests-export-by-user', 'get', 'admin', lambda: (f'/api/tests/export_by_user/?username={username}', None)),
+            ('tests-list', 'get', 'admin', lambda: ('/api/tests/list/', None)),
+            ('tests-delete', 'delete', 'admin', lambda: (f'/api/tests/{self._disposable_test().pk}/delete/', None)),
+            ('users-list-with-execs', 'get', 'admin', lambda: ('/api/users/list_with_execs/', None)),
+            ('search-executions', 'get', 'admin', lambda: ('/api/search/executions/?q=conflicto equipo', None)),
+            ('html-login', 'get', None, lambda: ('/login/', None)),
+            ('html-register', 'get', None, lambda: ('/register/', None)),
+            ('html-dashboard', 'get', 'candidate', lambda: ('/', None)),
+            ('html-export-by-user', 'get', 'admin', lambda: (f'/export/tests/by_user/?username={username}', None)),
+            ('admin-users', 'get', 'admin', lambda: ('/admin/auth/user/', None)),
+            ('admin-entities', 'get', 'admin', lambda: ('/admin/core/entity/', None)),
+            ('admin-tests', 'get', 'admin', lambda: ('/admin/core/test/', None)),
+            ('admin-executions', 'get', 'admin', lambda: ('/admin/core/testexecution/', None)),
+            ('admin-execution-change', 'get', 'admin', lambda: (f'/admin/core/testexecution/{ex.pk}/change/', None)),
+            ('admin-transcript', 'get', 'admin', lambda: (f'/admin/core/testexecution/{ex.pk}/transcript/', None)),
+        ]
+
+    def _disposable_test(self) -> Test:
+        return Test.objects.create(name="Temporal", purpose="-", ai_prompt_instructions="-",
+                                   evaluation_criteria=CRITERIA, creator=self.admin)
+
+    def _request(self, client, method, url, data):
+        if method == 'get':
+            response = client.get(url)
+        else:
+            response = getattr(client, method)(url, data, content_type='application/json')
+        if getattr(response, 'streaming', False):
+            b''.join(response.streaming_content)
+        return response
+
+    def run_benchmarks(self, options) -> dict:
+        clients = {None: Client(), 'admin': Client(), 'candidate': Client()}
+        clients['admin'].force_login(self.admin)
+        clients['candidate'].force_login(self.candidate)
+        only = {name.strip() for name in (options['only'] or '').split(',') if name.strip()}
+
+        results = {}
+        for name, method, who, prepare in self.endpoints():
+            if only and name not in only:
+                continue
+            client = clients[who]
+            # Calentamiento (caches, plantillas, cohortes en memoria)
+            url, data = prepare()
+            status = self._request(client, method, url, data).status_code
+
+            timings, queries = [], 0
+            for _ in range(options['repeat']):
+                url, data = prepare()
+                with CaptureQueriesContext(connection) as ctx:
+                    started = time.perf_counter()
+                    self._request(client, method, url, data)
+                    timings.append((time.perf_counter() - started) * 1000)
+                queries = len(ctx)
+
+            url, data = prepare()
+            tracemalloc.start()
+            self._request(client, method, url, data)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            results[name] = {
+                "status": status,
+                "queries": queries,
+                "ms": round(statistics.median(timings), 2),
+                "peak_kb": round(peak / 1024, 1),
+            }
+        return results
+
+    # Informe ---------------------------------------------------------------
+
+    def report(self, results: dict, budgets: dict, baseline: dict) -> list:
+        over = []
+        self.stdout.write(
+            f"{'endpoint':<24} {'st':>3} {'queries':>7} {'ms':>9} {'peak KB':>9}   "
+            f"{'presupuesto':<22} {'vs. línea base':<24}"
+        )
+        for name, result in results.items():
+            budget = budgets.get(name, {})
+            exceeded = [key for key in ('queries', 'ms', 'peak_kb') if key in budget and result[key] > budget[key]]
+            if exceeded:
+                over.append(name)
+            budget_text = ('SUPERA ' + ','.join(exceeded)) if exceeded else ('ok' if budget else 'sin presupuesto')
+
+            base = baseline.get(name)
+            base_text = '-'
+            if base:
+                delta_q = result['queries'] - base['queries']
+                delta_ms = (result['ms'] - base['ms']) / base['ms'] * 100 if base['ms'] else 0
+                base_text = f"{delta_q:+d} q, {delta_ms:+.0f}% ms"
+
+            line = (f"{name:<24} {result['status']:>3} {result['queries']:>7} {result['ms']:>9.2f} "
+                    f"{result['peak_kb']:>9.1f}   {budget_text:<22} {base_text:<24}")
+            self.stdout.write(self.style.ERROR(line) if exceeded else line)
+        return over
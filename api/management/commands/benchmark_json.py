@@ -0,0 +1,73 @@
+import gzip
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from api.renderers import FastJSONRenderer, orjson
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def build_payload(messages: int) -> dict:
+    # Estructura equivalente a la respuesta de TestLogView
+    turn = ("Describe una situación en la que tuviste que resolver un conflicto en tu equipo, "
+            "qué hiciste, qué resultado obtuviste y qué harías diferente la próxima vez. ")
+    return {
+        "execution_id": 1,
+        "test": "Evaluación Soft Skills",
+        "chat_log": [
+            {"role": "user" if i % 2 else "assistant", "content": f"{i}. {turn * 2}"}
+            for i in range(messages)
+        ],
+        "evaluation_result": {
+            "scores": {"comunicacion": 4, "trabajo_equipo": 3, "gestion_conflictos": 4, "liderazgo": 5},
+            "summary": turn * 3,
+            "feedback": turn,
+        },
+        "start_time": timezone.now(),
+        "finish_time": timezone.now(),
+    }
+
+
+class Command(BaseCommand):
+    help = "Mide tiempo de serialización y bytes transmitidos para transcripciones de 10, 100 y 1000 mensajes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10,100,1000', help="Número de mensajes separados por comas")
+        parser.add_argument('--repeat', type=int, default=200, help="Repeticiones por medición")
+
+    def _time(self, func, repeat):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        return (time.perf_counter() - start) / repeat * 1000
+
+    def handle(self, *args, **options):
+        renderers = {'drf': JSONRenderer(), 'fast': FastJSONRenderer()}
+        self.stdout.write(f"orjson: {'sí' if orjson else 'no'} · brotli: {'sí' if brotli else 'no'}")
+        self.stdout.write(
+            f"{'mensajes':>8} {'drf ms':>9} {'fast ms':>9} {'json B':>10} {'gzip B':>9} {'gzip ms':>8}"
+            f" {'br B':>9} {'br ms':>7}"
+        )
+        for size in [int(s) for s in options['sizes'].split(',') if s.strip()]:
+            payload = build_payload(size)
+            repeat = max(1, options['repeat'] // max(1, size // 100))
+            timings = {name: self._time(lambda r=r: r.render(payload), repeat) for name, r in renderers.items()}
+
+            body = renderers['fast'].render(payload)
+            gz = gzip.compress(body, compresslevel=6)
+            gz_ms = self._time(lambda: gzip.compress(body, compresslevel=6), repeat)
+            br_bytes, br_ms = '-', '-'
+            if brotli:
+                br_bytes = len(brotli.compress(body, quality=5))
+                br_ms = f"{self._time(lambda: brotli.compress(body, quality=5), repeat):.2f}"
+
+            self.stdout.write(
+                f"{size:>8} {timings['drf']:>9.3f} {timings['fast']:>9.3f} {len(body):>10} {len(gz):>9}"
+                f" {gz_ms:>8.2f} {br_bytes:>9} {br_ms:>7}"
+            )
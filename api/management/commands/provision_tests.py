@@ -0,0 +1,41 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from api.provisioning import ProvisioningError, load_manifest, provision_tests, validate_manifest
+
+
+class Command(BaseCommand):
+    help = "Crea tests en bloque a partir de un manifiesto JSON/YAML ({'tests': [...]})"
+
+    def add_arguments(self, parser):
+        parser.add_argument('manifest', help="Ruta al manifiesto .json, .yaml o .yml")
+        parser.add_argument('--creator', help="Usuario que figurará como creador de los tests")
+        parser.add_argument('--dry-run', action='store_true', help="Solo valida el manifiesto")
+
+    def handle(self, *args, **options):
+        try:
+            items = load_manifest(options['manifest'])
+        except ProvisioningError as err:
+            raise CommandError(str(err))
+        except (OSError, ValueError) as err:
+            raise CommandError(f"No se pudo leer el manifiesto: {err}")
+
+        specs, errors = validate_manifest(items)
+        if errors:
+            for err in errors:
+                where = f"[{err['index']}] " if err['index'] is not None else ''
+                self.stderr.write(f"{where}{err['error']}")
+            raise CommandError(f"Manifiesto no válido ({len(errors)} errores)")
+
+        creator = None
+        if options['creator']:
+            creator = User.objects.filter(username=options['creator']).first()
+            if not creator:
+                raise CommandError(f"Usuario no encontrado: {options['creator']}")
+
+        if options['dry_run']:
+            self.stdout.write(f"Manifiesto válido: {len(specs)} tests")
+            return
+
+        tests = provision_tests(specs, creator=creator)
+        self.stdout.write(self.style.SUCCESS(f"Creados {len(tests)} tests"))
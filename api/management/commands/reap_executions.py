@@ -0,0 +1,115 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from api.evaluation import evaluate_many
+from core.models import TestExecution
+from core.similarity import find_similar
+
+
+class Command(BaseCommand):
+    help = "Finaliza (y opcionalmente evalúa) las ejecuciones abandonadas: sin actividad desde hace N minutos"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--idle-minutes', type=int,
+                            default=getattr(settings, 'EXECUTION_IDLE_TIMEOUT_MINUTES', 60),
+                            help="Minutos sin actividad (updated_at) para considerar abandonada una ejecución")
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--limit', type=int, default=None, help="Máximo de ejecuciones a finalizar por pasada")
+        parser.add_argument('--evaluate', action='store_true', help="Evalúa con la IA las ejecuciones finalizadas")
+        parser.add_argument('--concurrency', type=int, default=getattr(settings, 'EVALUATION_WORKERS', 4),
+                            help="Evaluaciones simultáneas")
+        parser.add_argument('--min-turns', type=int, default=2,
+                            help="Respuestas del usuario necesarias para evaluar una ejecución abandonada")
+        parser.add_argument('--dry-run', action='store_true', help="Solo cuenta lo que se finalizaría")
+        parser.add_argument('--every', type=int, default=0,
+                            help="Repite la pasada cada N segundos (0 = una sola pasada)")
+
+    def handle(self, *args, **options):
+        while True:
+            self.sweep(options)
+            if not options['every']:
+                break
+            time.sleep(options['every'])
+
+    def sweep(self, options):
+        cutoff = timezone.now() - timedelta(minutes=options['idle_minutes'])
+        # Usa el índice parcial testexecution_unfinished_idle
+        candidates = TestExecution.objects.filter(finish_time__isnull=True, updated_at__lt=cutoff)
+
+        if options['dry_run']:
+            oldest = candidates.order_by('updated_at').values_list('updated_at', flat=True).first()
+            since = f" (la más antigua sin actividad desde {oldest:%Y-%m-%d %H:%M})" if oldest else ''
+            self.stdout.write(f"Se finalizarían {candidates.count()} ejecuciones abandonadas{since}")
+            return
+
+        concurrency = options['concurrency']
+        if options['evaluate'] and connection.vendor == 'sqlite' and concurrency > 1:
+            # SQLite admite un único escritor: evaluaciones en paralelo acabarían en "database is locked"
+            self.stdout.write("SQLite: evaluaciones en serie (--concurrency 1)")
+            concurrency = 1
+
+        started = time.monotonic()
+        limit = options['limit']
+        finished = evaluated = failed = 0
+        eval_seconds = 0.0
+        while limit is None or finished < limit:
+            size = options['batch_size'] if limit is None else min(options['batch_size'], limit - finished)
+            ids = self.finalize_batch(candidates, cutoff, size)
+            if not ids:
+                break
+            finished += len(ids)
+            to_evaluate = self.after_finish(ids, options['min_turns'])
+            if options['evaluate'] and to_evaluate:
+                eval_started = time.monotonic()
+                ok, errors = evaluate_many(to_evaluate, concurrency)
+                eval_seconds += time.monotonic() - eval_started
+                evaluated += ok
+                failed += errors
+            self.stdout.write(f"  {finished} ejecuciones finalizadas...")
+
+        elapsed = time.monotonic() - started
+        rate = finished / elapsed if elapsed else 0
+        summary = f"Finalizadas {finished} ejecuciones abandonadas en {elapsed:.1f}s ({rate:.0f}/s)"
+        if options['evaluate']:
+            eval_rate = (evaluated + failed) / eval_seconds if eval_seconds else 0
+            summary += f"; evaluadas {evaluated}, con error {failed} ({eval_rate:.2f}/s)"
+        self.stdout.write(self.style.SUCCESS(summary))
+
+    def finalize_batch(self, candidates, cutoff, size) -> list:
+        # Bloquea el lote (saltando filas ya bloqueadas por otro proceso) y lo finaliza con un UPDATE.
+        # finish_time = última actividad, no la hora de la pasada (facturación)
+        with transaction.atomic():
+            ids = list(
+                candidates.order_by('updated_at').select_for_update(skip_locked=True)
+                .values_list('pk', flat=True)[:size]
+            )
+            if ids:
+                # El UPDATE repite las condiciones: una ejecución con actividad después de la selección
+                # no se finaliza aunque el backend no bloquee filas (SQLite ignora select_for_update)
+                now = timezone.now()
+                TestExecution.objects.filter(pk__in=ids, finish_time__isnull=True, updated_at__lt=cutoff).update(
+                    finish_time=F('updated_at'),
+                    updated_at=now,
+                    auto_finished=True,
+                )
+                ids = list(TestExecution.objects.filter(pk__in=ids, auto_finished=True, updated_at=now)
+                           .values_list('pk', flat=True))
+        return ids
+
+    def after_finish(self, ids, min_turns) -> list:
+        # Marca respuestas casi duplicadas (como TestFinalView) y devuelve las evaluables
+        evaluable = []
+        for execution in TestExecution.objects.filter(pk__in=ids).only('id', 'entity_id', 'user_id', 'chat_log'):
+            flags = find_similar(execution)
+            if flags:
+                TestExecution.objects.filter(pk=execution.pk).update(similarity_flags=flags)
+            user_turns = sum(1 for m in execution.chat_log or [] if isinstance(m, dict) and m.get('role') == 'user')
+            if user_turns >= min_turns:
+                evaluable.append(execution.pk)
+        return evaluable
@@ -0,0 +1,192 @@
+import copy
+import json
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+
+from api.conditional import bump_tests_version
+from core.input_guards import InputTooLarge, guard_prompt
+from core.models import Test
+
+# Plantillas predefinidas de tests (antes incrustadas en CreateTestView)
+TEMPLATES_PATH = Path(__file__).resolve().parent / 'test_templates.json'
+
+# Máximo de tests por manifiesto/petición
+MAX_BULK_TESTS = 1000
+# Máximo de preguntas de un test en modo 'preguntas' (igual que 'count' en modo 'tema')
+MAX_CUSTOM_QUESTIONS = 50
+
+
+class ProvisioningError(ValueError):
+    # Error de validación de una definición de test (mensaje apto para la respuesta HTTP)
+    pass
+
+
+@lru_cache(maxsize=None)
+def get_templates() -> dict:
+    with open(TEMPLATES_PATH, encoding='utf-8') as fh:
+        return json.load(fh)
+
+
+def _check_name(spec: dict) -> dict:
+    # Test.name tiene longitud máxima: sin comprobarla, bulk_create falla en PostgreSQL (DataError)
+    if len(spec['name']) > Test._meta.get_field('name').max_length:
+        raise ProvisioningError("El campo 'name' es demasiado largo")
+    return spec
+
+
+def build_from_template(template_key, name: str = None) -> dict:
+    templates = get_templates()
+    if template_key not in templates:
+        raise ProvisioningError("Plantilla no válida")
+    spec = copy.deepcopy(templates[template_key])
+    if name:
+        spec["name"] = name
+    return _check_name(spec)
+
+
+def build_custom(data: dict) -> dict:
+    # Construye un test personalizado por 'tema' o por 'preguntas'
+    mode = str(data.get('mode') or '').strip()
+    if mode not in {'tema', 'preguntas'}:
+        raise ProvisioningError("Modo inválido. Usa 'tema' o 'preguntas'")
+
+    if mode == 'tema':
+        topic = str(data.get('topic') or '').strip()
+        if not topic:
+            raise ProvisioningError("El campo 'topic' es obligatorio")
+        # Número de preguntas deseado (por defecto 5, rango 1..50)
+        try:
+            count = int(data.get('count') or 5)
+        except (TypeError, ValueError):
+            count = 5
+        count = max(1, min(count, 50))
+
+        return _check_name({
+            "name": f"Test: {topic}",
+            "purpose": f"Evaluación conversacional sobre el tema: {topic}",
+            "ai_prompt_instructions": (
+                "Eres un entrevistador experto en el tema indicado. "
+                f"Haz {count} preguntas, una a la vez, "
+                "profundizando en el tema cuando sea necesario. Sé claro y guía la conversación. "
+                f"Tema: {topic}."
+            ),
+            "evaluation_criteria": {
+                "conocimiento": "Dominio del tema y conceptos clave.",
+                "razonamiento": "Capacidad de explicar y argumentar.",
+                "comunicacion": "Claridad y coherencia en las respuestas."
+            },
+        })
+
+    # mode == 'preguntas'
+    questions = data.get('questions')
+    if not isinstance(questions, list) or not questions:
+        raise ProvisioningError("'questions' debe ser una lista con al menos una pregunta")
+    if len(questions) > MAX_CUSTOM_QUESTIONS:
+        raise ProvisioningError(f"Máximo {MAX_CUSTOM_QUESTIONS} preguntas por test")
+
+    # Limpiar preguntas
+    cleaned = [str(q).strip() for q in questions if str(q).strip()]
+    if not cleaned:
+        raise ProvisioningError("La lista de preguntas no puede quedar vacía")
+
+    # Nombre personalizado opcional
+    name = str(data.get('name') or '').strip() or 'Test Personalizado'
+    return _check_name({
+        "name": name,
+        "purpose": "Evaluación conversacional con preguntas definidas por el administrador",
+        # Instrucciones para que la IA pregunte exactamente estas preguntas en orden
+        "ai_prompt_instructions": (
+            "Actúa como entrevistador. Debes realizar las siguientes preguntas en orden, "
+            "siempre una a la vez. No avances a la siguiente hasta que el usuario responda. "
+            "Si la respuesta es breve o ambigua, pide una aclaración breve. Preguntas: "
+            + " " + "; ".join(cleaned)
+        ),
+        "evaluation_criteria": {
+            "comprension": "Comprende y responde de forma adecuada a cada pregunta.",
+            "profundidad": "Aporta detalles y ejemplos cuando corresponde.",
+            "comunicacion": "Claridad y estructura en las respuestas."
+        },
+    })
+
+
+def build_explicit(data: dict) -> dict:
+    # Test definido campo a campo en el manifiesto
+    spec = {}
+    for field in ('name', 'purpose', 'ai_prompt_instructions'):
+        value = data.get(field)
+        if not isinstance(value, str) or not value.strip():
+            raise ProvisioningError(f"El campo '{field}' es obligatorio")
+        spec[field] = value.strip()
+    criteria = data.get('evaluation_criteria')
+    if not isinstance(criteria, dict) or not criteria:
+        raise ProvisioningError("'evaluation_criteria' debe ser un objeto con al menos un criterio")
+    spec['evaluation_criteria'] = criteria
+    provider = data.get('ai_provider')
+    if provider:
+        if provider not in getattr(settings, 'AI_PROVIDERS', {}):
+            raise ProvisioningError(f"Proveedor de IA desconocido: {provider}")
+        spec['ai_provider'] = provider
+    return _check_name(spec)
+
+
+def build_test_spec(item) -> dict:
+    # Una entrada del manifiesto puede usar 'template', 'mode' (tema/preguntas) o campos explícitos
+    if not isinstance(item, dict):
+        raise ProvisioningError("Cada test debe ser un objeto")
+    if 'template' in item:
+        return build_from_template(item.get('template'), name=str(item.get('name') or '').strip() or None)
+    if 'mode' in item:
+        return build_custom(item)
+    return build_explicit(item)
+
+
+def validate_manifest(items, entity=None) -> tuple:
+    # Devuelve (specs, errores); los errores incluyen el índice de la entrada.
+    # entity: límites de tamaño del prompt (core.input_guards); None = valores de settings
+    if isinstance(items, dict):
+        items = items.get('tests')
+    if not isinstance(items, list) or not items:
+        return [], [{"index": None, "error": "El manifiesto debe contener una lista 'tests' no vacía"}]
+    if len(items) > MAX_BULK_TESTS:
+        return [], [{"index": None, "error": f"Máximo {MAX_BULK_TESTS} tests por manifiesto"}]
+
+    specs, errors = [], []
+    for index, item in enumerate(items):
+        try:
+            spec = build_test_spec(item)
+            guard_prompt(spec, entity)
+            specs.append(spec)
+        except (ProvisioningError, InputTooLarge) as err:
+            errors.append({"index": index, "error": str(err)})
+    return specs, errors
+
+
+def provision_tests(specs: list, creator) -> list:
+    # Inserta todos los tests en una sola transacción
+    with transaction.atomic():
+        tests = Test.objects.bulk_create(
+            [Test(creator=creator, **spec) for spec in specs],
+            batch_size=500,
+        )
+        # bulk_create no emite post_save: se invalida el ETag del listado a mano
+        transaction.on_commit(bump_tests_version)
+    return tests
+
+
+def load_manifest(path) -> list:
+    # Lee un manifiesto JSON o YAML (YAML requiere PyYAML)
+    path = Path(path)
+    with open(path, encoding='utf-8') as fh:
+        if path.suffix.lower() in {'.yaml', '.yml'}:
+            try:
+                import yaml
+            except ImportError as exc:
+                raise ProvisioningError("Para manifiestos YAML instala PyYAML") from exc
+            try:
+                return yaml.safe_load(fh)
+            except yaml.YAMLError as exc:
+                raise ProvisioningError(f"El manifiesto YAML no es válido: {exc}") from exc
+        return json.load(fh)
@@ -0,0 +1,30 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from api.conditional import bump_tests_version, bump_users_version
+from core.models import Test, TestExecution
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def _bump_users_version(sender, instance, update_fields=None, **kwargs):
+    # Invalida el ETag del listado de usuarios; el login (solo last_login) no cambia lo mostrado
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    transaction.on_commit(bump_users_version)
+
+
+@receiver(post_save, sender=TestExecution)
+@receiver(post_delete, sender=TestExecution)
+def _bump_executions_version(sender, instance, created=True, **kwargs):
+    # El listado de usuarios muestra el número de ejecuciones: solo cambia con altas y borrados
+    if created:
+        transaction.on_commit(bump_users_version)
+
+
+@receiver(post_save, sender=Test)
+@receiver(post_delete, sender=Test)
+def _bump_tests_version(sender, instance, **kwargs):
+    transaction.on_commit(bump_tests_version)
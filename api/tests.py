@@ -1,3 +1,311 @@
-from django.test import TestCase
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from api.management.commands.reap_executions import Command as ReapCommand
+from api.provisioning import ProvisioningError, load_manifest, validate_manifest
+from core.models import AnswerSignature, Entity, EntityProfile, Test, TestExecution
+
+EVALUATION = {"scores": {"conocimiento": 4}, "summary": "Correcto", "feedback": "Bien"}
+LONG_ANSWER = "esta es una respuesta bastante larga del candidato con muchas palabras distintas para indexar bien"
+
+
+def _ai_reply(content='Siguiente pregunta'):
+    return {"choices": [{"message": {"role": "assistant", "content": content}}]}
+
+
+class ExecutionTestCase(TestCase):
+    # Candidato con entidad, un Test y una ejecución abierta; la IA siempre va simulada
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser('admin', password='clave-admin-1')
+        self.entity = Entity.objects.create(name='Entidad', contact_email='e@example.com')
+        self.user = User.objects.create_user('candidato', password='clave-segura-1')
+        EntityProfile.objects.create(user=self.user, entity=self.entity)
+        self.test = Test.objects.create(name='Test', purpose='p', ai_prompt_instructions='Pregunta',
+                                        evaluation_criteria={'conocimiento': 'Dominio'}, creator=self.admin)
+        self.execution = TestExecution.objects.create(
+            test=self.test, user=self.user, entity=self.entity,
+            chat_log=[{'role': 'assistant', 'content': 'Hola'}],
+        )
+        self.client.force_login(self.user)
+
+    def _set_idle(self, execution, minutes):
+        TestExecution.objects.filter(pk=execution.pk).update(updated_at=timezone.now() - timedelta(minutes=minutes))
+
+
+@mock.patch('api.ai_service.OpenRouterAIService.evaluar_test', return_value=EVALUATION)
+class TestFinalViewTests(ExecutionTestCase):
+    def _finish(self, **data):
+        return self.client.post(reverse('test-finish', args=[self.execution.pk]), data, content_type='application/json')
+
+    def test_finish_evaluates_and_stores_result(self, evaluar_test):
+        response = self._finish()
+        self.assertEqual(response.status_code, 200)
+        self.execution.refresh_from_db()
+        self.assertIsNotNone(self.execution.finish_time)
+        self.assertEqual(self.execution.evaluation_result, EVALUATION)
+
+    def test_finish_after_reaper_keeps_auto_finish(self, evaluar_test):
+        # El reaper finaliza la ejecución mientras se calculan las similitudes
+        finished_at = timezone.now() - timedelta(hours=2)
+
+        def reaper_finishes(execution):
+            TestExecution.objects.filter(pk=execution.pk).update(finish_time=finished_at, auto_finished=True)
+            return []
+
+        with mock.patch('api.views.similarity.find_similar', side_effect=reaper_finishes):
+            response = self._finish()
+        self.assertEqual(response.json(), {"error": "Este test ya ha finalizado."})
+        evaluar_test.assert_not_called()
+        self.execution.refresh_from_db()
+        self.assertEqual(self.execution.finish_time, finished_at)
+        self.assertTrue(self.execution.auto_finished)
+
+    def test_async_finish_without_shared_state_falls_back_to_polling(self, evaluar_test):
+        with mock.patch('api.views.push_available', return_value=False), \
+                mock.patch('api.views.evaluate_in_background') as background:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self._finish(**{'async': True})
+        self.assertEqual(response.status_code, 202)
+        self.assertFalse(response.json()['push'])
+        self.assertIsNone(response.json()['last_event_id'])
+        background.assert_called_once_with(self.execution.pk)
+
+
+@mock.patch('api.ai_service.OpenRouterAIService.continuar_conversacion', return_value=_ai_reply())
+class TestContinueViewTests(ExecutionTestCase):
+    def _continue(self, message):
+        return self.client.post(reverse('test-continue', args=[self.execution.pk]), {'message': message},
+                                content_type='application/json')
+
+    def test_continue_appends_turns(self, continuar):
+        response = self._continue('Mi respuesta')
+        self.assertEqual(response.status_code, 200)
+        self.execution.refresh_from_db()
+        self.assertEqual([m['role'] for m in self.execution.chat_log], ['assistant', 'user', 'assistant'])
+
+    def test_continue_after_reaper_is_rejected(self, continuar):
+        def reaper_finishes(chat_log, message):
+            TestExecution.objects.filter(pk=self.execution.pk).update(finish_time=timezone.now(), auto_finished=True)
+            return _ai_reply()
+
+        continuar.side_effect = reaper_finishes
+        response = self._continue('Mi respuesta')
+        self.assertEqual(response.status_code, 400)
+        self.execution.refresh_from_db()
+        self.assertEqual(len(self.execution.chat_log), 1)
+
+    def test_concurrent_turns_are_kept_and_positioned(self, continuar):
+        # Otra petición añade turnos durante la llamada a la IA
+        def other_request(chat_log, message):
+            TestExecution.objects.filter(pk=self.execution.pk).update(
+                chat_log=chat_log + [{'role': 'user', 'content': 'otra'}, {'role': 'assistant', 'content': 'r'}],
+            )
+            return _ai_reply()
+
+        continuar.side_effect = other_request
+        self.assertEqual(self._continue(LONG_ANSWER).status_code, 200)
+        self.execution.refresh_from_db()
+        self.assertEqual(len(self.execution.chat_log), 5)
+        self.assertEqual(list(AnswerSignature.objects.filter(execution=self.execution)
+                              .values_list('position', flat=True)), [3])
+
+    @override_settings(INPUT_MAX_MESSAGE_TOKENS=10)
+    def test_oversized_message_is_rejected(self, continuar):
+        response = self._continue('palabra ' * 20)
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(response.json()['max_tokens'], 10)
+        continuar.assert_not_called()
+
+    @override_settings(INPUT_MAX_MESSAGE_TOKENS=10, INPUT_OVERSIZE_POLICY='truncate')
+    def test_oversized_message_is_truncated(self, continuar):
+        response = self._continue('palabra ' * 20)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['truncated'])
+        sent = continuar.call_args[0][1]
+        self.assertLessEqual(len(sent), 40)
+        self.execution.refresh_from_db()
+        self.assertEqual(self.execution.chat_log[1]['content'], sent)
+
+
+class ReapExecutionsTests(ExecutionTestCase):
+    def test_idle_execution_is_finished_at_last_activity(self):
+        self._set_idle(self.execution, 120)
+        last_activity = TestExecution.objects.get(pk=self.execution.pk).updated_at
+        call_command('reap_executions', idle_minutes=60, stdout=StringIO())
+        self.execution.refresh_from_db()
+        self.assertEqual(self.execution.finish_time, last_activity)
+        self.assertTrue(self.execution.auto_finished)
+
+    def test_active_execution_is_not_finished(self):
+        call_command('reap_executions', idle_minutes=60, stdout=StringIO())
+        self.execution.refresh_from_db()
+        self.assertIsNone(self.execution.finish_time)
+
+    def test_batch_update_repeats_idle_condition(self):
+        # Actividad después de seleccionar el lote: el UPDATE condicional no la finaliza
+        cutoff = timezone.now() - timedelta(minutes=60)
+        selected = TestExecution.objects.filter(pk=self.execution.pk)
+        self.assertEqual(ReapCommand().finalize_batch(selected, cutoff, 10), [])
+        self.execution.refresh_from_db()
+        self.assertIsNone(self.execution.finish_time)
+        self.assertFalse(self.execution.auto_finished)
+
+    @mock.patch('api.ai_service.OpenRouterAIService.continuar_conversacion', return_value=_ai_reply())
+    def test_continue_after_reaper_is_rejected(self, continuar):
+        self._set_idle(self.execution, 120)
+        call_command('reap_executions', idle_minutes=60, stdout=StringIO())
+        response = self.client.post(reverse('test-continue', args=[self.execution.pk]), {'message': 'hola'},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class ManifestValidationTests(TestCase):
+    def _errors(self, items):
+        specs, errors = validate_manifest(items)
+        self.assertEqual(specs, [])
+        return [err['error'] for err in errors]
+
+    def test_manifest_must_be_a_non_empty_list(self):
+        for items in ({}, {'tests': []}, 'tests', None):
+            with self.subTest(items=items):
+                self.assertEqual(len(self._errors(items)), 1)
+
+    def test_invalid_entries_report_their_index(self):
+        specs, errors = validate_manifest([
+            {'template': 'entrevista_tecnica'},
+            'no es un objeto',
+            {'template': 'no_existe'},
+            {'mode': 'otro'},
+            {'mode': 'preguntas', 'questions': []},
+            {'name': 'Sin criterios', 'purpose': 'p', 'ai_prompt_instructions': 'x'},
+            {'name': 'n', 'purpose': 'p', 'ai_prompt_instructions': 'x', 'evaluation_criteria': {'a': 'b'},
+             'ai_provider': 'desconocido'},
+        ])
+        self.assertEqual(len(specs), 1)
+        self.assertEqual([err['index'] for err in errors], [1, 2, 3, 4, 5, 6])
+
+    def test_long_name_is_rejected_in_every_mode(self):
+        name = 'n' * 300
+        errors = self._errors([
+            {'template': 'soft_skills', 'name': name},
+            {'mode': 'tema', 'topic': name},
+            {'mode': 'preguntas', 'questions': ['¿Por qué?'], 'name': name},
+            {'name': name, 'purpose': 'p', 'ai_prompt_instructions': 'x', 'evaluation_criteria': {'a': 'b'}},
+        ])
+        self.assertEqual(errors, ["El campo 'name' es demasiado largo"] * 4)
+
+    @override_settings(INPUT_MAX_PROMPT_TOKENS=10)
+    def test_oversized_prompt_is_rejected(self):
+        errors = self._errors([
+            {'name': 'n', 'purpose': 'p', 'ai_prompt_instructions': 'x' * 200, 'evaluation_criteria': {'a': 'b'}},
+        ])
+        self.assertIn('demasiado largas', errors[0])
+
+    def _manifest_file(self, suffix, content):
+        handle, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(handle, 'w', encoding='utf-8') as fh:
+            fh.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_malformed_yaml_is_a_provisioning_error(self):
+        try:
+            import yaml  # noqa: F401
+        except ImportError:
+            self.skipTest("PyYAML no instalado")
+        path = self._manifest_file('.yaml', "tests: [\n  - name: {")
+        with self.assertRaises(ProvisioningError):
+            load_manifest(path)
+        with self.assertRaises(CommandError):
+            call_command('provision_tests', path, stdout=StringIO(), stderr=StringIO())
+
+    def test_invalid_manifest_fails_the_command(self):
+        path = self._manifest_file('.json', '{"tests": [{"template": "no_existe"}]}')
+        with self.assertRaises(CommandError):
+            call_command('provision_tests', path, stdout=StringIO(), stderr=StringIO())
+        self.assertFalse(Test.objects.exists())
+
+
+class ConditionalGetTests(ExecutionTestCase):
+    # ETag/304 de los listados (versión en el estado compartido) y del log de una ejecución
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.admin)
+
+    def _get(self, name, *args, **headers):
+        return self.client.get(reverse(name, args=args), headers=headers)
+
+    def test_tests_list_not_modified(self):
+        response = self._get('tests-list')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Last-Modified', response)
+        etag = response['ETag']
+        self.assertEqual(self._get('tests-list', if_none_match=etag).status_code, 304)
+
+    def test_tests_list_etag_changes_on_create_and_delete(self):
+        # Las versiones se incrementan al confirmar la transacción (on_commit)
+        etag = self._get('tests-list')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            test = Test.objects.create(name='Otro', purpose='p', ai_prompt_instructions='x',
+                                       evaluation_criteria={'a': 'b'}, creator=self.admin)
+        created = self._get('tests-list', if_none_match=etag)
+        self.assertEqual(created.status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            test.delete()
+        self.assertEqual(self._get('tests-list', if_none_match=created['ETag']).status_code, 200)
+
+    def test_tests_list_etag_changes_on_bulk_provisioning(self):
+        etag = self._get('tests-list')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('tests-bulk-create'), {'tests': [{'template': 'idiomas'}]},
+                                        content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self._get('tests-list', if_none_match=etag).status_code, 200)
+
+    def test_if_modified_since_alone_is_not_enough(self):
+        self.assertEqual(self._get('tests-list', if_modified_since='Thu, 01 Jan 2099 00:00:00 GMT').status_code, 200)
+
+    def test_users_list_etag_changes_on_new_execution_and_rename(self):
+        etag = self._get('users-list-with-execs')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            TestExecution.objects.create(test=self.test, user=self.user, entity=self.entity)
+        etag_after_create = self._get('users-list-with-execs', if_none_match=etag)
+        self.assertEqual(etag_after_create.status_code, 200)
+        self.user.first_name = 'Ana'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        response = self._get('users-list-with-execs', if_none_match=etag_after_create['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_list_etag_needs_no_query(self):
+        etag = self._get('tests-list')['ETag']
+        # Sesión y usuario: sin consulta para calcular el ETag ni el cuerpo
+        with self.assertNumQueries(2):
+            self.assertEqual(self._get('tests-list', if_none_match=etag).status_code, 304)
+
+    def test_non_staff_gets_no_etag(self):
+        self.client.force_login(self.user)
+        response = self._get('tests-list')
+        self.assertEqual(response.status_code, 403)
+        self.assertNotIn('ETag', response)
+
+    def test_execution_log_not_modified_until_updated(self):
+        self.client.force_login(self.user)
+        response = self._get('test-log', self.execution.pk)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertEqual(self._get('test-log', self.execution.pk, if_none_match=etag).status_code, 304)
+        TestExecution.objects.filter(pk=self.execution.pk).update(evaluation_result=EVALUATION,
+                                                                  updated_at=timezone.now())
+        self.assertEqual(self._get('test-log', self.execution.pk, if_none_match=etag).status_code, 200)
@@ -7,10 +7,15 @@ from .views import (
     TestLogView,
     CreateTestView,
     CreateCustomTestView,
+    BulkCreateTestsView,
     ExportTestsByUserView,
     ListTestsView,
     DeleteTestView,
     ListUsersWithExecutionsView,
+    SearchExecutionsView,
+    ProfilerTracesView,
+    ProviderMetricsView,
+    event_stream,
 )
 
 urlpatterns = [
@@ -30,6 +35,8 @@ urlpatterns = [
     path('tests/create/', CreateTestView.as_view(), name='tests-create'),
     # POST /api/tests/create_custom/ --> Crea un test personalizado (solo admin)
     path('tests/create_custom/', CreateCustomTestView.as_view(), name='tests-create-custom'),
+    # POST /api/tests/bulk_create/ --> Crea varios tests desde un manifiesto {"tests": [...]} (solo admin)
+    path('tests/bulk_create/', BulkCreateTestsView.as_view(), name='tests-bulk-create'),
     # GET /api/tests/export_by_user/?username=<user> --> Exporta ejecuciones de ese usuario (solo admin)
     path('tests/export_by_user/', ExportTestsByUserView.as_view(), name='tests-export-by-user'),
     # GET /api/tests/list/ --> Lista tests (solo admin)
@@ -38,4 +45,12 @@ urlpatterns = [
     path('tests/<int:test_id>/delete/', DeleteTestView.as_view(), name='tests-delete'),
     # GET /api/users/list_with_execs/ --> Lista usuarios con ejecuciones (solo admin)
     path('users/list_with_execs/', ListUsersWithExecutionsView.as_view(), name='users-list-with-execs'),
+    # GET /api/search/executions/?q=<texto>&entity=<id>&page=1 --> Búsqueda en transcripciones y evaluaciones
+    path('search/executions/', SearchExecutionsView.as_view(), name='search-executions'),
+    # GET/DELETE /api/profiler/traces/?limit=20&path=/api/test/ --> Peticiones lentas perfiladas (solo admin)
+    path('profiler/traces/', ProfilerTracesView.as_view(), name='profiler-traces'),
+    # GET /api/providers/metrics/ --> Métricas de los proveedores de IA (solo admin)
+    path('providers/metrics/', ProviderMetricsView.as_view(), name='providers-metrics'),
+    # GET /api/events/stream/ --> Canal push (SSE) con el fin de las evaluaciones en segundo plano
+    path('events/stream/', event_stream, name='events-stream'),
 ]
\ No newline at end of file
@@ -1,4 +1,10 @@
+import random
+
+from django.conf import settings
 from django.db import transaction
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
 from django.shortcuts import render, get_object_or_404
 from rest_framework.response import Response
 from rest_framework.views import APIView
@@ -6,9 +12,37 @@ from rest_framework import status
 from django.utils import timezone
 
 from api.ai_service import OpenRouterAIService
+from api.conditional import (
+    conditional_get,
+    execution_log_validators,
+    tests_list_validators,
+    users_with_executions_validators,
+)
+from api.evaluation import evaluate_execution, evaluate_in_background
+from api.llm_providers import metrics_snapshot
+from api.events import aiter_events, current_id, iter_events, push_available
+from api.provisioning import (
+    ProvisioningError,
+    build_custom,
+    build_from_template,
+    provision_tests,
+    validate_manifest,
+)
+from api.renderers import dumps
+from core import profiling, score_stats, search, similarity
+from core.archive import iter_rehydrated, rehydrate
+from core.db_router import replica_iter, replica_reads
+from core.input_guards import InputTooLarge, guard_conversation, guard_message, guard_prompt
 from core.models import Test, TestExecution
 from django.contrib.auth.models import User
-from django.db.models import Count
+from django.db.models import Count, Max, Min
+from django.utils.cache import add_never_cache_headers
+
+
+def _user_entity(user):
+    # Entidad del usuario ya resuelta por core.auth_cache (sin consulta); None si no tiene perfil
+    profile = getattr(user, 'entityprofile', None)
+    return profile.entity if profile is not None else None
 
 
 # Create your views here.
@@ -27,6 +61,17 @@ class TestInicial(APIView):
                 "error": "Usuario no encontrado",
             }, status=status.HTTP_403_FORBIDDEN)
 
+        # Validación del tamaño antes de crear nada ni llamar a la IA (core.input_guards)
+        message_user_initial = request.data.get("message", "Hola, estoy listo para empezar el test.")
+        if not isinstance(message_user_initial, str):
+            return Response({
+                "error": "El mensaje debe ser texto."
+            }, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            message_user_initial, truncated = guard_message(message_user_initial, profile.entity)
+        except InputTooLarge as err:
+            return Response(err.as_response(), status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
         # La ejecución se crea solo si la API responde
         with transaction.atomic():
             execution = TestExecution.objects.create(
@@ -36,9 +81,7 @@ class TestInicial(APIView):
             )
 
             # 3. Llamamos al servicio de IA
-            ai_service = OpenRouterAIService(system_prompt=test.ai_prompt_instructions)
-
-            message_user_initial = request.data.get("message", "Hola, estoy listo para empezar el test.")
+            ai_service = OpenRouterAIService.for_test(test)
             ai_response_data = ai_service.start_conversacion(message_user_initial)
 
             if 'error' in ai_response_data:
@@ -58,17 +101,22 @@ class TestInicial(APIView):
                 }
             ]
             execution.save()
+            search.append_turns(execution, execution.chat_log)
+            similarity.index_turns(execution, execution.chat_log, 0)
 
-            return Response({
+            data = {
                 "execution_id": execution.id,
                 "response": message_assistant["content"],
-            }, status=status.HTTP_200_OK)
+            }
+            if truncated:
+                data["truncated"] = True
+            return Response(data, status=status.HTTP_200_OK)
 
 
 class TestContinueView(APIView):
     # Endpoint para enviar el siguiente message
     def post(self, request, execution_id):
-        execution = get_object_or_404(TestExecution, pk=execution_id, user=request.user)
+        execution = get_object_or_404(TestExecution.objects.select_related('test'), pk=execution_id, user=request.user)
         message_nuevo_usuario = request.data.get("message")
 
         if execution.finish_time:
@@ -76,13 +124,23 @@ class TestContinueView(APIView):
                 "error": "Este test ya ha finalizado."
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        if not message_nuevo_usuario:
+        if not message_nuevo_usuario or not isinstance(message_nuevo_usuario, str):
             return Response({
                 "error": "message de usuario requerido."
             }, status=status.HTTP_400_BAD_REQUEST)
 
+        # Validación del tamaño antes de llamar a la IA (core.input_guards)
+        entity = _user_entity(request.user)
+        if entity is None or entity.pk != execution.entity_id:
+            entity = execution.entity
+        try:
+            message_nuevo_usuario, truncated = guard_message(message_nuevo_usuario, entity)
+            guard_conversation(execution.chat_log, message_nuevo_usuario, entity)
+        except InputTooLarge as err:
+            return Response(err.as_response(), status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
         # 1. Llamar al servicio de IA (incluyendo el prompt del sistema del Test)
-        ai_service = OpenRouterAIService(system_prompt=execution.test.ai_prompt_instructions)
+        ai_service = OpenRouterAIService.for_test(execution.test)
         ai_response_data = ai_service.continuar_conversacion(execution.chat_log, message_nuevo_usuario)
 
         if 'error' in ai_response_data:
@@ -91,56 +149,92 @@ class TestContinueView(APIView):
         # 2. Actualizar el chat_log
         message_assistant = ai_response_data["choices"][0]["message"]
 
-        execution.chat_log.append(
+        new_turns = [
             {
                 "role": "user",
                 "content": message_nuevo_usuario,
-            }
-        )
-
-        execution.chat_log.append(
+            },
             {
                 "role": "assistant",
                 "content": message_assistant["content"],
-            }
-        )
+            },
+        ]
+        # Guardado sobre la fila bloqueada: durante la llamada a la IA el reaper (reap_executions) puede
+        # haber finalizado la ejecución, u otra petición haber añadido turnos. La posición de los
+        # mensajes nuevos (índice de similitud) se calcula sobre el chat_log ya bloqueado
+        with transaction.atomic():
+            locked = (
+                TestExecution.objects.select_for_update()
+                .filter(pk=execution.pk, finish_time__isnull=True)
+                .only('id', 'chat_log')
+                .first()
+            )
+            if locked is None:
+                return Response({
+                    "error": "Este test ya ha finalizado."
+                }, status=status.HTTP_400_BAD_REQUEST)
+            position = len(locked.chat_log)
+            locked.chat_log.extend(new_turns)
+            TestExecution.objects.filter(pk=execution.pk).update(
+                chat_log=locked.chat_log,
+                updated_at=timezone.now(),
+            )
+        execution.chat_log = locked.chat_log
+        search.append_turns(execution, new_turns)
+        similarity.index_turns(execution, new_turns, position)
 
-        execution.save()
-
-        return Response({
-            "response": message_assistant["content"],
-        }, status=status.HTTP_200_OK)
+        data = {"response": message_assistant["content"]}
+        if truncated:
+            data["truncated"] = True
+        return Response(data, status=status.HTTP_200_OK)
 
 class TestFinalView(APIView):
     # Endpoint para marcar un test como finalizado
     def post(self, request, execution_id):
-        execution = get_object_or_404(TestExecution, pk=execution_id, user=request.user)
+        execution = get_object_or_404(TestExecution.objects.select_related('test'), pk=execution_id, user=request.user)
 
         if execution.finish_time:
             return Response({
                 "error": "Este test ya ha finalizado."
             })
 
-        # 1. Marcar como finalizado (para facturación y evitar más messages)
-        execution.finish_time = timezone.now()
-
-        # 2. Llamada al servicio de evaluación
-        test = execution.test
-        ai_service = OpenRouterAIService()
+        # 1. Marcar como finalizado (para facturación y evitar más messages).
+        # UPDATE condicional: no se pisa el finish_time si el reaper la finalizó entretanto
+        now = timezone.now()
+        # Respuestas casi idénticas a las de otros candidatos de la entidad (solo para gestores)
+        flags = similarity.find_similar(execution)
+        updated = TestExecution.objects.filter(pk=execution.pk, finish_time__isnull=True).update(
+            finish_time=now,
+            similarity_flags=flags,
+            updated_at=now,
+        )
+        if not updated:
+            return Response({
+                "error": "Este test ya ha finalizado."
+            })
+        execution.finish_time = execution.updated_at = now
+        execution.similarity_flags = flags
+
+        # Evaluación en segundo plano: el resultado llega por /api/events/stream/ si el estado es
+        # compartido entre workers ("push"); si no, el cliente consulta /api/test/<id>/log/.
+        # last_event_id (leído antes de encolar) permite suscribirse sin perder el evento
+        if request.data.get('async'):
+            push = push_available()
+            last_event_id = current_id() if push else None
+            transaction.on_commit(lambda: evaluate_in_background(execution.id))
+            return Response({
+                "message": "Test finalizado, evaluación en curso",
+                "evaluation_id": execution.id,
+                "push": push,
+                "last_event_id": last_event_id,
+            }, status=status.HTTP_202_ACCEPTED)
 
-        # Usar el chat_log de la ejecución y los criterios del Test
-        evaluation_result = ai_service.evaluar_test(execution.chat_log, test.evaluation_criteria)
+        # 2. Llamada al servicio de evaluación (guarda el resultado o el error)
+        evaluation_result = evaluate_execution(execution)
 
         if 'error' in evaluation_result:
-            # Si falla, guardar el detalle del error en evaluation_result para trazabilidad
-            execution.evaluation_result = evaluation_result
-            execution.save()
             return Response(evaluation_result, status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
-        # 3. Guardar el resultado y el log
-        execution.evaluation_result = evaluation_result
-        execution.save()
-
         # TODO lógica para generar el PDF
 
         return Response({
@@ -150,12 +244,22 @@ class TestFinalView(APIView):
         }, status=status.HTTP_200_OK)
 
 
+def _pick_random_test():
+    # Evita ORDER BY RANDOM() (recorre y ordena toda la tabla): id aleatorio + búsqueda por índice
+    bounds = Test.objects.aggregate(low=Min('id'), high=Max('id'))
+    if bounds['low'] is None:
+        return None
+    pivot = random.randint(bounds['low'], bounds['high'])
+    tests = Test.objects.only('id', 'name', 'purpose').order_by('id')
+    return tests.filter(id__gte=pivot).first() or tests.first()
+
+
 class RandomTestView(APIView):
     # Devuelve un test aleatorio disponible para iniciar
     def get(self, request):
         if not request.user.is_authenticated:
             return Response({"error": "No autenticado"}, status=status.HTTP_403_FORBIDDEN)
-        test = Test.objects.order_by('?').first()
+        test = _pick_random_test()
         if not test:
             # Crear un test de ejemplo para facilitar pruebas
             test = Test.objects.create(
@@ -172,24 +276,33 @@ class RandomTestView(APIView):
                 },
                 creator=request.user
             )
-        return Response({
+        response = Response({
             "test_id": test.id,
             "name": test.name,
             "purpose": test.purpose,
         })
+        # Cada petición debe devolver un test distinto: nunca se cachea
+        add_never_cache_headers(response)
+        return response
 
 
 class TestLogView(APIView):
     # Devuelve el chat_log y evaluación (si existe) para descarga
+    @replica_reads
+    @conditional_get(execution_log_validators)
     def get(self, request, execution_id):
         if not request.user.is_authenticated:
             return Response({"error": "No autenticado"}, status=status.HTTP_403_FORBIDDEN)
-        execution = get_object_or_404(TestExecution, pk=execution_id, user=request.user)
+        execution = get_object_or_404(TestExecution.objects.select_related('test'), pk=execution_id, user=request.user)
+        # Si la ejecución está archivada se recupera el log comprimido
+        rehydrate(execution)
         return Response({
             "execution_id": execution.id,
             "test": execution.test.name,
             "chat_log": execution.chat_log,
             "evaluation_result": execution.evaluation_result,
+            # Percentil, z-score e histograma de cada criterio frente a su Entidad y al Test
+            "cohort": score_stats.cohort_for(execution),
             "start_time": execution.start_time,
             "finish_time": execution.finish_time,
         })
@@ -201,61 +314,12 @@ class CreateTestView(APIView):
         if not request.user.is_authenticated or not (request.user.is_staff or request.user.is_superuser):
             return Response({"error": "No autorizado"}, status=status.HTTP_403_FORBIDDEN)
 
-        template_key = request.data.get('template')
-        TEMPLATES = {
-            "entrevista_tecnica": {
-                "name": "Entrevista Técnica",
-                "purpose": "Evaluar conocimientos técnicos básicos.",
-                "ai_prompt_instructions": (
-                    "Eres un entrevistador técnico. Realiza 5 preguntas técnicas sencillas, una a la vez, "
-                    "sobre programación, estructuras de datos y debugging. Guía la conversación y profundiza si hace falta."
-                ),
-                "evaluation_criteria": {
-                    "conocimiento_tecnico": "Dominio de conceptos básicos y su aplicación.",
-                    "razonamiento": "Capacidad para explicar y razonar soluciones.",
-                    "claridad": "Comunicación clara y ordenada."
-                }
-            },
-            "soft_skills": {
-                "name": "Evaluación Soft Skills",
-                "purpose": "Evaluar habilidades blandas en un contexto laboral.",
-                "ai_prompt_instructions": (
-                    "Actúa como evaluador de soft skills. Haz 4 preguntas sobre comunicación, trabajo en equipo, "
-                    "gestión de conflictos y liderazgo. Mantén un tono profesional y empático."
-                ),
-                "evaluation_criteria": {
-                    "comunicacion": "Claridad y escucha activa.",
-                    "trabajo_equipo": "Colaboración y responsabilidad compartida.",
-                    "gestion_conflictos": "Manejo de desacuerdos y búsqueda de consenso.",
-                    "liderazgo": "Iniciativa e influencia positiva."
-                }
-            },
-            "idiomas": {
-                "name": "Evaluación de Idiomas",
-                "purpose": "Medir competencia comunicativa en idioma extranjero.",
-                "ai_prompt_instructions": (
-                    "Eres un examinador de idiomas. Conversa en inglés (nivel B2), realiza 5 preguntas, "
-                    "corrige errores suavemente y evalúa fluidez, gramática y vocabulario."
-                ),
-                "evaluation_criteria": {
-                    "fluency": "Fluidez y ritmo natural.",
-                    "grammar": "Uso correcto de estructuras gramaticales.",
-                    "vocabulary": "Variedad y precisión del vocabulario."
-                }
-            },
-        }
-
-        if template_key not in TEMPLATES:
-            return Response({"error": "Plantilla no válida"}, status=status.HTTP_400_BAD_REQUEST)
-
-        tpl = TEMPLATES[template_key]
-        test = Test.objects.create(
-            name=tpl["name"],
-            purpose=tpl["purpose"],
-            ai_prompt_instructions=tpl["ai_prompt_instructions"],
-            evaluation_criteria=tpl["evaluation_criteria"],
-            creator=request.user,
-        )
+        try:
+            tpl = build_from_template(request.data.get('template'))
+        except ProvisioningError as err:
+            return Response({"error": str(err)}, status=status.HTTP_400_BAD_REQUEST)
+
+        test = Test.objects.create(creator=request.user, **tpl)
 
         return Response({
             "message": "Test creado",
@@ -270,68 +334,16 @@ class CreateCustomTestView(APIView):
         if not request.user.is_authenticated or not (request.user.is_staff or request.user.is_superuser):
             return Response({"error": "No autorizado"}, status=status.HTTP_403_FORBIDDEN)
 
-        mode = (request.data.get('mode') or '').strip()
-        if mode not in {'tema', 'preguntas'}:
-            return Response({"error": "Modo inválido. Usa 'tema' o 'preguntas'"}, status=status.HTTP_400_BAD_REQUEST)
-
-        if mode == 'tema':
-            topic = (request.data.get('topic') or '').strip()
-            if not topic:
-                return Response({"error": "El campo 'topic' es obligatorio"}, status=status.HTTP_400_BAD_REQUEST)
-            # Número de preguntas deseado (por defecto 5, rango 1..50)
-            try:
-                count = int(request.data.get('count') or 5)
-            except (TypeError, ValueError):
-                count = 5
-            count = max(1, min(count, 50))
-
-            name = f"Test: {topic}"
-            purpose = f"Evaluación conversacional sobre el tema: {topic}"
-            ai_prompt = (
-                "Eres un entrevistador experto en el tema indicado. "
-                f"Haz {count} preguntas, una a la vez, "
-                "profundizando en el tema cuando sea necesario. Sé claro y guía la conversación. "
-                f"Tema: {topic}."
-            )
-            criteria = {
-                "conocimiento": "Dominio del tema y conceptos clave.",
-                "razonamiento": "Capacidad de explicar y argumentar.",
-                "comunicacion": "Claridad y coherencia en las respuestas."
-            }
-
-        else:  # mode == 'preguntas'
-            questions = request.data.get('questions')
-            if not isinstance(questions, list) or not questions:
-                return Response({"error": "'questions' debe ser una lista con al menos una pregunta"}, status=status.HTTP_400_BAD_REQUEST)
-
-            # Limpiar preguntas
-            cleaned = [str(q).strip() for q in questions if str(q).strip()]
-            if not cleaned:
-                return Response({"error": "La lista de preguntas no puede quedar vacía"}, status=status.HTTP_400_BAD_REQUEST)
-
-            # Nombre personalizado opcional
-            name = (request.data.get('name') or 'Test Personalizado').strip() or 'Test Personalizado'
-            purpose = "Evaluación conversacional con preguntas definidas por el administrador"
-            # Instrucciones para que la IA pregunte exactamente estas preguntas en orden
-            ai_prompt = (
-                "Actúa como entrevistador. Debes realizar las siguientes preguntas en orden, "
-                "siempre una a la vez. No avances a la siguiente hasta que el usuario responda. "
-                "Si la respuesta es breve o ambigua, pide una aclaración breve. Preguntas: "
-                + " " + "; ".join(cleaned)
-            )
-            criteria = {
-                "comprension": "Comprende y responde de forma adecuada a cada pregunta.",
-                "profundidad": "Aporta detalles y ejemplos cuando corresponde.",
-                "comunicacion": "Claridad y estructura en las respuestas."
-            }
+        try:
+            spec = build_custom(request.data)
+        except ProvisioningError as err:
+            return Response({"error": str(err)}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            guard_prompt(spec, _user_entity(request.user))
+        except InputTooLarge as err:
+            return Response(err.as_response(), status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
 
-        test = Test.objects.create(
-            name=name,
-            purpose=purpose,
-            ai_prompt_instructions=ai_prompt,
-            evaluation_criteria=criteria,
-            creator=request.user,
-        )
+        test = Test.objects.create(creator=request.user, **spec)
 
         return Response({
             "message": "Test personalizado creado",
@@ -340,8 +352,29 @@ class CreateCustomTestView(APIView):
         }, status=status.HTTP_201_CREATED)
 
 
+class BulkCreateTestsView(APIView):
+    # Crea muchos tests de una vez a partir de un manifiesto (solo admin)
+    def post(self, request):
+        if not request.user.is_authenticated or not (request.user.is_staff or request.user.is_superuser):
+            return Response({"error": "No autorizado"}, status=status.HTTP_403_FORBIDDEN)
+
+        # Se valida todo el manifiesto antes de insertar nada
+        specs, errors = validate_manifest(request.data, entity=_user_entity(request.user))
+        if errors:
+            return Response({"error": "Manifiesto no válido", "errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        tests = provision_tests(specs, creator=request.user)
+
+        return Response({
+            "message": "Tests creados",
+            "count": len(tests),
+            "tests": [{"test_id": t.id, "name": t.name} for t in tests],
+        }, status=status.HTTP_201_CREATED)
+
+
 class ExportTestsByUserView(APIView):
     # Exporta todas las ejecuciones de un usuario a JSON (solo admin)
+    @replica_reads
     def get(self, request):
         if not request.user.is_authenticated or not (request.user.is_staff or request.user.is_superuser):
             return Response({"error": "No autorizado"}, status=status.HTTP_403_FORBIDDEN)
@@ -354,28 +387,111 @@ class ExportTestsByUserView(APIView):
         if not user:
             return Response({"error": "Usuario no encontrado"}, status=status.HTTP_404_NOT_FOUND)
 
-        executions = TestExecution.objects.filter(user=user).order_by('-start_time')
-        data = []
-        for ex in executions:
-            data.append({
-                "execution_id": ex.id,
-                "user": ex.user.username,
-                "test": ex.test.name,
-                "start_time": ex.start_time,
-                "finish_time": ex.finish_time,
-                "chat_log": ex.chat_log,
-                "evaluation_result": ex.evaluation_result,
-            })
+        executions = TestExecution.objects.filter(user=user).select_related('test').order_by('-start_time')
+        count = executions.count()
+
+        # Se envía en streaming, ejecución a ejecución, para no materializar todos los logs en memoria
+        def stream():
+            yield b'{"username":%s,"count":%d,"executions":[' % (dumps(username), count)
+            for index, ex in enumerate(iter_rehydrated(executions)):
+                item = dumps({
+                    "execution_id": ex.id,
+                    "user": username,
+                    "test": ex.test.name,
+                    "start_time": ex.start_time,
+                    "finish_time": ex.finish_time,
+                    "chat_log": ex.chat_log,
+                    "evaluation_result": ex.evaluation_result,
+                    "cohort": score_stats.cohort_for(ex),
+                    "similarity_flags": ex.similarity_flags,
+                })
+                yield item if index == 0 else b',' + item
+            yield b']}'
+
+        return StreamingHttpResponse(replica_iter(stream()), content_type='application/json', status=status.HTTP_200_OK)
+
+
+class SearchExecutionsView(APIView):
+    # Búsqueda de texto completo en transcripciones y evaluaciones (staff o manager de entidad)
+    def get(self, request):
+        if not request.user.is_authenticated:
+            return Response({"error": "No autenticado"}, status=status.HTTP_403_FORBIDDEN)
+
+        query = (request.query_params.get('q') or '').strip()
+        if not query:
+            return Response({"error": "Parámetro 'q' requerido"}, status=status.HTTP_400_BAD_REQUEST)
+
+        # El staff puede filtrar por entidad; un manager solo ve su propia entidad
+        if request.user.is_staff or request.user.is_superuser:
+            try:
+                entity_id = int(request.query_params.get('entity') or 0) or None
+            except ValueError:
+                return Response({"error": "Parámetro 'entity' inválido"}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            profile = getattr(request.user, 'entityprofile', None)
+            if not profile or not profile.is_manager:
+                return Response({"error": "No autorizado"}, status=status.HTTP_403_FORBIDDEN)
+            entity_id = profile.entity_id
+
+        try:
+            page = max(1, int(request.query_params.get('page') or 1))
+            page_size = max(1, min(int(request.query_params.get('page_size') or 20), 100))
+        except ValueError:
+            return Response({"error": "Paginación inválida"}, status=status.HTTP_400_BAD_REQUEST)
 
+        total, results = search.search_executions(query, entity_id=entity_id,
+                                                  offset=(page - 1) * page_size, limit=page_size)
         return Response({
-            "username": username,
-            "count": executions.count(),
-            "executions": data,
+            "query": query,
+            "count": total,
+            "page": page,
+            "page_size": page_size,
+            "results": results,
         }, status=status.HTTP_200_OK)
 
 
+class ProfilerTracesView(APIView):
+    # Trazas de peticiones lentas del perfilado por muestreo de este proceso (solo admin)
+    def get(self, request):
+        if not request.user.is_authenticated or not (request.user.is_staff or request.user.is_superuser):
+            return Response({"error": "No autorizado"}, status=status.HTTP_403_FORBIDDEN)
+        try:
+            limit = max(1, int(request.query_params.get('limit') or 20))
+        except ValueError:
+            return Response({"error": "Parámetro 'limit' inválido"}, status=status.HTTP_400_BAD_REQUEST)
+
+        traces = profiling.get_traces()
+        path = request.query_params.get('path')
+        if path:
+            traces = [t for t in traces if t["path"].startswith(path)]
+        if request.query_params.get('cprofile') not in {'1', 'true'}:
+            traces = [{**t, "cprofile": None} for t in traces]
+        return Response({
+            "sample_rate": getattr(settings, 'PROFILER_SAMPLE_RATE', 0),
+            "slow_ms": getattr(settings, 'PROFILER_SLOW_MS', 500),
+            "count": len(traces),
+            "traces": traces[:limit],
+        }, status=status.HTTP_200_OK)
+
+    def delete(self, request):
+        if not request.user.is_authenticated or not (request.user.is_staff or request.user.is_superuser):
+            return Response({"error": "No autorizado"}, status=status.HTTP_403_FORBIDDEN)
+        profiling.clear_traces()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class ProviderMetricsView(APIView):
+    # Métricas de los proveedores de IA (llamadas, errores, tiempos, disponibilidad) de todos los workers (solo admin)
+    def get(self, request):
+        if not request.user.is_authenticated or not (request.user.is_staff or request.user.is_superuser):
+            return Response({"error": "No autorizado"}, status=status.HTTP_403_FORBIDDEN)
+        return Response({"providers": metrics_snapshot()}, status=status.HTTP_200_OK)
+
+
 class ListUsersWithExecutionsView(APIView):
     # Lista usuarios que tienen ejecuciones, con conteo (solo admin)
+    @replica_reads
+    @conditional_get(users_with_executions_validators)
     def get(self, request):
         if not request.user.is_authenticated or not (request.user.is_staff or request.user.is_superuser):
             return Response({"error": "No autorizado"}, status=status.HTTP_403_FORBIDDEN)
@@ -396,11 +512,13 @@ class ListUsersWithExecutionsView(APIView):
 
 class ListTestsView(APIView):
     # Lista todos los tests disponibles (solo admin)
+    @replica_reads
+    @conditional_get(tests_list_validators)
     def get(self, request):
         if not request.user.is_authenticated or not (request.user.is_staff or request.user.is_superuser):
             return Response({"error": "No autorizado"}, status=status.HTTP_403_FORBIDDEN)
 
-        tests = Test.objects.all().order_by('id')
+        tests = Test.objects.only('id', 'name', 'purpose').order_by('id')
         data = [{
             "id": t.id,
             "name": t.name,
@@ -425,4 +543,30 @@ class DeleteTestView(APIView):
 
         # Al eliminar el Test, las ejecuciones asociadas se borran por cascade
         test.delete()
-        return Response({"message": "Test eliminado", "test_id": test_id}, status=status.HTTP_200_OK)
\ No newline at end of file
+        return Response({"message": "Test eliminado", "test_id": test_id}, status=status.HTTP_200_OK)
+
+
+@require_GET
+def event_stream(request):
+    # Canal push (Server-Sent Events): evaluaciones en segundo plano completadas
+    if not request.user.is_authenticated:
+        return JsonResponse({"error": "No autenticado"}, status=status.HTTP_403_FORBIDDEN)
+
+    # EventSource reenvía Last-Event-ID al reconectar; sin él solo se envían eventos nuevos
+    try:
+        last_id = int(request.headers.get('Last-Event-ID') or request.GET.get('last_id') or current_id())
+    except ValueError:
+        last_id = current_id()
+
+    # Bajo ASGI el generador asíncrono (asyncio.sleep) no ocupa un hilo por cliente conectado.
+    # El generador síncrono es solo para desarrollo (runserver): bloquea un hilo del worker
+    # durante toda la conexión, así que en producción el canal requiere el servidor ASGI
+    if isinstance(request, ASGIRequest):
+        content = aiter_events(request.user, last_id)
+    else:
+        content = iter_events(request.user, last_id)
+
+    response = StreamingHttpResponse(content, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
\ No newline at end of file
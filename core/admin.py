@@ -1,7 +1,40 @@
-from django.contrib import admin
+import csv
+import os
+
+from django.contrib import admin, messages
 from django.contrib.auth.models import User
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.core.exceptions import PermissionDenied
+from django.core.paginator import Paginator
+from django.db import connections
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404, redirect
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from django.utils.functional import cached_property
+from django.utils.html import format_html, format_html_join
+from .archive import rehydrate
+from .db_router import use_replica
+from .input_guards import get_counters
 from .models import Entity, EntityProfile, Test, TestExecution
+from .onboarding import PASSWORD_HASH, PASSWORD_INVITE, OnboardingError, import_candidates
+
+# A partir de este número de filas el changelist usa el conteo estimado de PostgreSQL
+ESTIMATED_COUNT_THRESHOLD = 100_000
+TRANSCRIPT_PAGE_SIZE = 50
+
+
+class ReplicaChangelistMixin:
+    # Los listados (GET) se leen de la réplica; las acciones (POST) siguen en la primaria
+    def changelist_view(self, request, extra_context=None):
+        if request.method != 'GET':
+            return super().changelist_view(request, extra_context)
+        with use_replica():
+            response = super().changelist_view(request, extra_context)
+            # TemplateResponse evalúa el queryset al renderizar: se renderiza aquí dentro
+            if hasattr(response, 'render'):
+                response.render()
+        return response
 
 # Register your models here.
 class EntityProfileInLine(admin.StackedInline):
@@ -10,10 +43,12 @@ class EntityProfileInLine(admin.StackedInline):
     can_delete = False
     verbose_name_plural = "Perfil de Entidad"
 
-class UserAdmin(BaseUserAdmin):
+class UserAdmin(ReplicaChangelistMixin, BaseUserAdmin):
     # Administrador y usuarios para incluir el perfil de entidad
     inlines = (EntityProfileInLine,)
     list_display = ('username', 'email', 'first_name', 'last_name', 'is_staff', 'get_entity')
+    # Evita una consulta por fila al mostrar la entidad
+    list_select_related = ('entityprofile__entity',)
 
     @admin.display(description='Entidad Asignada')
     def get_entity(self, obj):
@@ -23,17 +58,80 @@ admin.site.unregister(User)
 admin.site.register(User, UserAdmin)
 
 @admin.register(Entity)
-class EntityAdmin(admin.ModelAdmin):
+class EntityAdmin(ReplicaChangelistMixin, admin.ModelAdmin):
     list_display = ('name', 'contact_email', 'is_active')
     search_fields = ('name', 'contact_email')
     list_filter = ('is_active',)
+    actions = ('import_candidates_action',)
+    readonly_fields = ('input_guard_counters',)
+
+    def get_urls(self):
+        urls = [
+            path('<path:object_id>/import_candidates/', self.admin_site.admin_view(self.import_candidates_view),
+                 name='core_entity_import_candidates'),
+        ]
+        return urls + super().get_urls()
+
+    @admin.display(description='Entradas rechazadas / recortadas')
+    def input_guard_counters(self, obj):
+        if obj.pk is None:
+            return '-'
+        counters = get_counters(obj)
+        rows = [
+            (kind, outcome, values['count'], values['bytes'])
+            for kind, outcomes in counters.items()
+            for outcome, values in outcomes.items()
+            if values['count']
+        ]
+        if not rows:
+            return 'Ninguna'
+        return format_html_join('', '<div>{} {}: {} ({} bytes)</div>', rows)
+
+    @admin.action(description='Importar candidatos desde CSV')
+    def import_candidates_action(self, request, queryset):
+        if queryset.count() != 1:
+            self.message_user(request, "Selecciona una única entidad.", level=messages.WARNING)
+            return None
+        return redirect('admin:core_entity_import_candidates', queryset.first().pk)
+
+    def import_candidates_view(self, request, object_id):
+        # Sube un CSV y devuelve otro con el resultado por fila y los enlaces de invitación
+        if not (self.has_change_permission(request) and request.user.has_perm('auth.add_user')):
+            raise PermissionDenied
+        entity = get_object_or_404(Entity, pk=object_id)
+        if request.method == 'POST' and request.FILES.get('csv_file'):
+            mode = request.POST.get('passwords') or PASSWORD_INVITE
+            if mode not in {PASSWORD_INVITE, PASSWORD_HASH}:
+                mode = PASSWORD_INVITE
+            response = HttpResponse(content_type='text/csv; charset=utf-8')
+            response['Content-Disposition'] = f'attachment; filename="alta_{entity.pk}.csv"'
+            writer = csv.writer(response)
+            writer.writerow(['line', 'username', 'status', 'error', 'invite_url'])
+            try:
+                for result in import_candidates(request.FILES['csv_file'].file, entity, password_mode=mode,
+                                                workers=os.cpu_count() or 1):
+                    writer.writerow([result['line'], result['username'], result['status'],
+                                     result.get('error', ''), result.get('invite_url') or ''])
+            except OnboardingError as err:
+                self.message_user(request, str(err), level=messages.ERROR)
+                return redirect('admin:core_entity_import_candidates', entity.pk)
+            return response
+
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': f"Importar candidatos: {entity.name}",
+            'entity': entity,
+        }
+        return TemplateResponse(request, 'admin/core/entity/import_candidates.html', context)
 
 # Gestión de Test y resultados
 @admin.register(Test)
-class TestAdmin(admin.ModelAdmin):
+class TestAdmin(ReplicaChangelistMixin, admin.ModelAdmin):
     list_display = ('name', 'creator', 'purpose')
+    list_select_related = ('creator',)
     search_fields = ('name', 'purpose')
-    fields = ('name', 'purpose', 'creator', 'ai_prompt_instructions', 'evaluation_criteria')
+    fields = ('name', 'purpose', 'creator', 'ai_prompt_instructions', 'evaluation_criteria', 'ai_provider')
     readonly_fields = ('creator',)
 
     # Asigna automáticamente el usuario logueado como creador
@@ -42,15 +140,107 @@ class TestAdmin(admin.ModelAdmin):
             obj.creator = request.user
         super().save_model(request, obj, form, change)
 
+class EstimatedCountPaginator(Paginator):
+    # En tablas enormes COUNT(*) recorre toda la tabla: sin filtros usamos la estimación del planner
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        query = getattr(queryset, 'query', None)
+        if query is not None and not query.where:
+            connection = connections[queryset.db]
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT reltuples::bigint FROM pg_class WHERE relname = %s",
+                        [queryset.model._meta.db_table],
+                    )
+                    row = cursor.fetchone()
+                if row and row[0] >= ESTIMATED_COUNT_THRESHOLD:
+                    return row[0]
+        return super().count
+
+
 @admin.register(TestExecution)
-class TestExecutionAdmin(admin.ModelAdmin):
+class TestExecutionAdmin(ReplicaChangelistMixin, admin.ModelAdmin):
     list_display = ('test', 'user', 'entity', 'start_time', 'finish_time', 'was_successful',)
-    list_filter = ('entity', 'test', 'finish_time',)
+    list_filter = ('entity', 'test', 'finish_time', 'auto_finished',)
     search_fields = ('user__username', 'test__name', 'entity__name',)
-    readonly_fields = ('test', 'user', 'entity', 'start_time', 'finish_time', 'chat_log', 'evaluation_result',
-                       'pdf_report_path')
+    list_select_related = ('test', 'user', 'entity',)
+    # Formulario explícito: las columnas JSON (transcripción, evaluación, similitud) no se cargan ni se editan
+    fields = ('test', 'user', 'entity', 'start_time', 'finish_time', 'auto_finished', 'archived_at', 'transcript',
+              'evaluation_summary', 'similarity_summary', 'pdf_report_path')
+    readonly_fields = fields
+    paginator = EstimatedCountPaginator
+    # Evita el segundo COUNT(*) sin filtros en cada carga del listado
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        # Las columnas JSON solo se cargan cuando se consultan (transcripción paginada)
+        return super().get_queryset(request).defer('chat_log', 'evaluation_result')
+
+    def get_urls(self):
+        urls = [
+            path('<path:object_id>/transcript/', self.admin_site.admin_view(self.transcript_view),
+                 name='core_testexecution_transcript'),
+        ]
+        return urls + super().get_urls()
+
+    def transcript_view(self, request, object_id):
+        # Transcripción paginada bajo demanda
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        execution = get_object_or_404(
+            TestExecution.objects.select_related('test', 'user', 'entity').only(
+                'id', 'chat_log', 'start_time', 'finish_time', 'archived_at',
+                'test__name', 'user__username', 'entity__name',
+            ),
+            pk=object_id,
+        )
+        rehydrate(execution)
+        page = Paginator(execution.chat_log or [], TRANSCRIPT_PAGE_SIZE).get_page(request.GET.get('page'))
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': f"Transcripción: {execution}",
+            'execution': execution,
+            'page': page,
+        }
+        return TemplateResponse(request, 'admin/core/testexecution/transcript.html', context)
+
+    @admin.display(description='Transcripción')
+    def transcript(self, obj):
+        url = reverse('admin:core_testexecution_transcript', args=[obj.pk])
+        return format_html('<a href="{}">Ver transcripción paginada</a>', url)
+
+    @admin.display(description='Evaluación')
+    def evaluation_summary(self, obj):
+        # Vista compacta: puntuaciones y resumen en lugar del JSON completo
+        result = rehydrate(obj).evaluation_result
+        if not result:
+            return '-'
+        if 'error' in result:
+            return result['error']
+        scores = result.get('scores') or {}
+        return format_html(
+            '<ul>{}</ul><p>{}</p>',
+            format_html_join('', '<li>{}: {}</li>', scores.items()),
+            result.get('summary', ''),
+        )
+
+    @admin.display(description='Respuestas similares')
+    def similarity_summary(self, obj):
+        # Respuestas casi idénticas a las de otras ejecuciones de la entidad (calculado al finalizar)
+        flags = obj.similarity_flags or []
+        if not flags:
+            return '-'
+        return format_html('<ul>{}</ul>', format_html_join(
+            '', '<li>Mensaje {} ≈ <a href="{}">ejecución {}</a> (mensaje {}): {}%</li>',
+            ((flag['position'], reverse('admin:core_testexecution_change', args=[flag['execution_id']]),
+              flag['execution_id'], flag['other_position'], round(flag['similarity'] * 100))
+             for flag in flags),
+        ))
 
     @admin.display(description='Completado')
     def was_successful(self, obj):
         return bool(obj.finish_time)
-    was_successful.boolean = True
\ No newline at end of file
+    was_successful.boolean = True
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        # Registra los receptores de señales (invalidación de caches)
+        from core import signals  # noqa: F401
+        # Comprobaciones de configuración (manage.py check y arranque)
+        from core import checks  # noqa: F401
@@ -0,0 +1,100 @@
+import gzip
+import json
+
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import ArchivedExecutionLog, TestExecution
+
+# zstd es opcional (paquete 'zstandard'); gzip siempre está disponible
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+DEFAULT_CODEC = 'zstd' if zstandard else 'gzip'
+
+
+def available_codecs() -> list:
+    return ['gzip', 'zstd'] if zstandard else ['gzip']
+
+
+def compress(data: bytes, codec: str) -> bytes:
+    if codec == 'gzip':
+        return gzip.compress(data, compresslevel=6)
+    if codec == 'zstd' and zstandard:
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    raise ValueError(f"Códec de archivo no disponible: {codec}")
+
+
+def decompress(data: bytes, codec: str) -> bytes:
+    if codec == 'gzip':
+        return gzip.decompress(data)
+    if codec == 'zstd' and zstandard:
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise ValueError(f"Códec de archivo no disponible: {codec}")
+
+
+def archive_execution(execution: TestExecution, codec: str = DEFAULT_CODEC) -> ArchivedExecutionLog:
+    # Mueve chat_log y evaluation_result a almacenamiento frío y deja la fila como stub
+    raw = json.dumps({
+        "chat_log": execution.chat_log,
+        "evaluation_result": execution.evaluation_result,
+    }, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    with transaction.atomic():
+        archived = ArchivedExecutionLog.objects.create(
+            execution=execution,
+            codec=codec,
+            payload=compress(raw, codec),
+            original_size=len(raw),
+        )
+        now = timezone.now()
+        TestExecution.objects.filter(pk=execution.pk).update(
+            chat_log=[],
+            evaluation_result=None,
+            archived_at=now,
+        )
+    execution.archived_at = now
+    return archived
+
+
+def _load(archived: ArchivedExecutionLog) -> dict:
+    return json.loads(decompress(bytes(archived.payload), archived.codec))
+
+
+def rehydrate(execution: TestExecution) -> TestExecution:
+    # Restaura en memoria (no en la BD) el contenido de una ejecución archivada
+    if execution.archived_at:
+        archived = ArchivedExecutionLog.objects.filter(execution_id=execution.pk).first()
+        if archived:
+            data = _load(archived)
+            execution.chat_log = data["chat_log"]
+            execution.evaluation_result = data["evaluation_result"]
+    return execution
+
+
+def rehydrate_many(executions: list) -> list:
+    # Igual que rehydrate pero con una única consulta para todo el lote
+    archived_ids = [ex.pk for ex in executions if ex.archived_at]
+    if archived_ids:
+        archives = ArchivedExecutionLog.objects.in_bulk(archived_ids)
+        for ex in executions:
+            archived = archives.get(ex.pk)
+            if archived:
+                data = _load(archived)
+                ex.chat_log = data["chat_log"]
+                ex.evaluation_result = data["evaluation_result"]
+    return executions
+
+
+def iter_rehydrated(queryset, chunk_size: int = 100):
+    # Recorre el queryset por lotes sin materializarlo entero, rehidratando lo archivado
+    batch = []
+    for execution in queryset.iterator(chunk_size=chunk_size):
+        batch.append(execution)
+        if len(batch) >= chunk_size:
+            yield from rehydrate_many(batch)
+            batch = []
+    if batch:
+        yield from rehydrate_many(batch)
@@ -0,0 +1,89 @@
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, load_backend
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.utils.crypto import constant_time_compare
+
+from core.shared_state import cache_is_shared
+
+# Prefijo de las claves de cache con el usuario ya resuelto (usuario + perfil + entidad)
+USER_CACHE_PREFIX = 'auth:user:'
+
+
+def _cache_key(user_id) -> str:
+    return f"{USER_CACHE_PREFIX}{user_id}"
+
+
+def _timeout() -> int:
+    return getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 300)
+
+
+def cache_enabled() -> bool:
+    # Solo con una cache compartida entre procesos: con la memoria local de cada worker, la
+    # invalidación (logout, cambio de contraseña, desactivación) no llegaría a los demás y
+    # seguirían aceptando la sesión antigua con el usuario cacheado
+    return _timeout() > 0 and cache_is_shared()
+
+
+def _load_user(user_id):
+    # Una sola consulta: usuario, perfil de entidad y entidad.
+    # Si no hay perfil, select_related deja cacheado el "no existe" y el acceso
+    # a user.entityprofile lanza RelatedObjectDoesNotExist sin ir a la BD.
+    return (
+        User.objects
+        .select_related('entityprofile__entity')
+        .filter(pk=user_id)
+        .first()
+    )
+
+
+def get_user(request):
+    # Equivalente a django.contrib.auth.get_user pero resolviendo el usuario desde cache.
+    # Ante cualquier caso no trivial (backend desconocido, hash de sesión que no
+    # coincide...) se delega en Django para conservar su comportamiento exacto.
+    try:
+        user_id = request.session[SESSION_KEY]
+        backend_path = request.session[BACKEND_SESSION_KEY]
+    except KeyError:
+        return auth.get_user(request)
+
+    if backend_path not in settings.AUTHENTICATION_BACKENDS:
+        return auth.get_user(request)
+
+    # Sin cache compartida el usuario (contraseña, is_active) se lee siempre de la BD,
+    # con su perfil y entidad en la misma consulta
+    cached = cache_enabled()
+    key = _cache_key(user_id)
+    user = cache.get(key) if cached else None
+    if user is None:
+        user = _load_user(user_id)
+        if user is None:
+            return auth.get_user(request)
+        if cached:
+            cache.set(key, user, _timeout())
+
+    backend = load_backend(backend_path)
+    if hasattr(backend, 'user_can_authenticate') and not backend.user_can_authenticate(user):
+        return auth.get_user(request)
+
+    session_hash = request.session.get(HASH_SESSION_KEY)
+    if not session_hash or not constant_time_compare(session_hash, user.get_session_auth_hash()):
+        # Contraseña cambiada o SECRET_KEY rotada: Django decide (fallbacks o flush)
+        invalidate_user(user_id)
+        return auth.get_user(request)
+
+    user.backend = backend_path
+    return user
+
+
+def invalidate_user(user_id):
+    # Elimina de cache el usuario resuelto (logout, cambio de contraseña, edición de perfil)
+    if user_id is not None:
+        cache.delete(_cache_key(user_id))
+
+
+def invalidate_users(user_ids):
+    keys = [_cache_key(user_id) for user_id in user_ids]
+    if keys:
+        cache.delete_many(keys)
@@ -0,0 +1,17 @@
+from django.core.checks import Error, register
+
+from core.db_router import replica_alias
+from core.shared_state import get_state
+
+
+@register()
+def replica_needs_shared_state(app_configs, **kwargs):
+    # Con réplica, la marca de lectura tras escritura (mark_user_wrote) vive en el estado compartido:
+    # si es de cada proceso, otro worker leería de la réplica justo después de que el usuario escriba
+    if replica_alias() is None or get_state().shared:
+        return []
+    return [Error(
+        "La réplica de lectura requiere un estado compartido entre workers.",
+        hint="Usa SHARED_STATE_BACKEND=shm (un servidor) o una cache compartida (Redis/Memcached).",
+        id='core.E001',
+    )]
@@ -0,0 +1,152 @@
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+
+from core.shared_state import get_state
+
+logger = logging.getLogger(__name__)
+
+# Lecturas enviadas a la réplica solo dentro de use_replica() (vistas de solo lectura)
+_replica_reads = ContextVar('replica_reads', default=False)
+# Fijado a primaria cuando el usuario acaba de escribir (read-your-writes)
+_pinned_to_primary = ContextVar('pinned_to_primary', default=False)
+
+STICKY_KEY = 'db:sticky:{}'
+HEALTH_KEY = 'db:replica_healthy:{}'
+
+# Último estado de salud conocido de la réplica en este proceso: (comprobado_en, sana)
+_health = {'checked_at': 0.0, 'healthy': False}
+
+
+def replica_alias():
+    alias = getattr(settings, 'DATABASE_REPLICA_ALIAS', 'replica')
+    return alias if alias in settings.DATABASES else None
+
+
+def _replica_lag(alias) -> float:
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        # Sin replicación física (p. ej. dos SQLite en local) el retraso se considera 0
+        return 0.0
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT CASE
+                WHEN NOT pg_is_in_recovery() THEN 0
+                WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+            END
+        """)
+        return float(cursor.fetchone()[0])
+
+
+def _check_replica(alias) -> bool:
+    try:
+        lag = _replica_lag(alias)
+        healthy = lag <= getattr(settings, 'DATABASE_REPLICA_MAX_LAG', 5)
+        if not healthy:
+            logger.warning("Réplica %s con %.1fs de retraso: lecturas a la primaria", alias, lag)
+    except Exception:
+        logger.exception("Réplica %s no disponible: lecturas a la primaria", alias)
+        healthy = False
+    return healthy
+
+
+def replica_is_healthy(alias) -> bool:
+    # Comprueba el retraso como mucho cada DATABASE_REPLICA_CHECK_INTERVAL segundos. El resultado
+    # se comparte entre workers (core.shared_state): solo uno consulta la réplica por intervalo.
+    # Se guarda además en el proceso porque db_for_read se llama en cada consulta
+    now = time.monotonic()
+    interval = getattr(settings, 'DATABASE_REPLICA_CHECK_INTERVAL', 5)
+    if now - _health['checked_at'] < interval:
+        return _health['healthy']
+    state = get_state()
+    key = HEALTH_KEY.format(alias)
+    healthy = state.get(key)
+    if healthy is None:
+        if not state.add(key + ':checking', 1, ttl=interval):
+            # Otro worker está comprobando: último estado conocido hasta la siguiente consulta
+            return _health['healthy']
+        healthy = _check_replica(alias)
+        state.set(key, healthy, ttl=interval)
+    _health['checked_at'] = now
+    _health['healthy'] = healthy
+    return healthy
+
+
+@contextmanager
+def use_replica():
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+@contextmanager
+def pin_to_primary(pinned: bool = True):
+    token = _pinned_to_primary.set(pinned)
+    try:
+        yield
+    finally:
+        _pinned_to_primary.reset(token)
+
+
+def replica_reads(view):
+    # Decorador para vistas (funciones o métodos) de solo lectura
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        with use_replica():
+            return view(*args, **kwargs)
+    return wrapper
+
+
+def replica_iter(iterable):
+    # Para respuestas en streaming: cada paso del iterador lee de la réplica aunque
+    # se consuma fuera de la vista (el estado de fijación a primaria se conserva)
+    pinned = _pinned_to_primary.get()
+    iterator = iter(iterable)
+    while True:
+        with use_replica(), pin_to_primary(pinned):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+def mark_user_wrote(user_id):
+    # Tras una escritura, las lecturas de este usuario van a la primaria durante unos segundos
+    get_state().set(STICKY_KEY.format(user_id), 1, ttl=getattr(settings, 'DATABASE_REPLICA_STICKY_SECONDS', 10))
+
+
+def user_recently_wrote(user_id) -> bool:
+    return bool(get_state().get(STICKY_KEY.format(user_id)))
+
+
+class ReplicaRouter:
+    # Envía a la réplica las lecturas marcadas con use_replica(); todo lo demás a 'default'
+    def db_for_read(self, model, **hints):
+        if not _replica_reads.get() or _pinned_to_primary.get():
+            return None
+        alias = replica_alias()
+        if alias and replica_is_healthy(alias):
+            return alias
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Réplica y primaria contienen los mismos datos
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == replica_alias():
+            # En producción la réplica se replica desde la primaria; en local (dos SQLite) se migra
+            return getattr(settings, 'DATABASE_REPLICA_MIGRATE', False)
+        return None
@@ -0,0 +1,129 @@
+import json
+import logging
+import math
+
+from django.conf import settings
+
+from core.shared_state import get_state
+
+logger = logging.getLogger(__name__)
+
+# Validación del tamaño de la entrada antes de cualquier llamada a la IA: un mensaje o un
+# prompt enorme gasta tokens, se reenvía en cada turno posterior e hincha chat_log.
+# Los tokens se estiman por caracteres (sin tokenizador: cada proveedor usa el suyo).
+# Límites por Entidad (campos max_*_tokens / oversize_policy) con valores por defecto en settings.
+POLICY_REJECT = 'reject'
+POLICY_TRUNCATE = 'truncate'
+
+KIND_MESSAGE = 'message'
+KIND_CONVERSATION = 'conversation'
+KIND_PROMPT = 'prompt'
+
+# Contadores en el estado compartido (core.shared_state): input_guard:<entidad o 'global'>:<tipo>:<rejected|truncated>:<count|bytes>
+COUNTER_KEY = 'input_guard:{}:{}:{}:{}'
+
+TRUNCATION_MARK = ' […]'
+
+
+class InputTooLarge(ValueError):
+    # Entrada que supera el límite (mensaje apto para la respuesta HTTP 413)
+    def __init__(self, kind: str, tokens: int, limit: int):
+        self.kind = kind
+        self.tokens = tokens
+        self.limit = limit
+        labels = {
+            KIND_MESSAGE: "El mensaje es demasiado largo",
+            KIND_CONVERSATION: "La conversación ha alcanzado su longitud máxima; finaliza el test",
+            KIND_PROMPT: "Las instrucciones del test son demasiado largas",
+        }
+        super().__init__(f"{labels[kind]} (~{tokens} tokens, máximo {limit})")
+
+    def as_response(self) -> dict:
+        return {"error": str(self), "tokens": self.tokens, "max_tokens": self.limit}
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / _setting('INPUT_CHARS_PER_TOKEN', 4)) if text else 0
+
+
+def limit_for(entity, kind: str) -> int:
+    value = getattr(entity, f'max_{kind}_tokens', None) if entity is not None else None
+    if value:
+        return value
+    defaults = {
+        KIND_MESSAGE: _setting('INPUT_MAX_MESSAGE_TOKENS', 1000),
+        KIND_CONVERSATION: _setting('INPUT_MAX_CONVERSATION_TOKENS', 16000),
+        KIND_PROMPT: _setting('INPUT_MAX_PROMPT_TOKENS', 4000),
+    }
+    return defaults[kind]
+
+
+def policy_for(entity) -> str:
+    return (getattr(entity, 'oversize_policy', '') if entity is not None else '') or \
+        _setting('INPUT_OVERSIZE_POLICY', POLICY_REJECT)
+
+
+def record(entity, kind: str, outcome: str, nbytes: int):
+    # outcome: 'rejected' o 'truncated'; nbytes: bytes descartados (o el tamaño de lo rechazado)
+    scope = entity.pk if entity is not None else 'global'
+    state = get_state()
+    state.incr(COUNTER_KEY.format(scope, kind, outcome, 'count'))
+    state.incr(COUNTER_KEY.format(scope, kind, outcome, 'bytes'), nbytes)
+    logger.info("Entrada %s %s (%s, %d bytes)", kind, outcome, scope, nbytes)
+
+
+def get_counters(entity=None) -> dict:
+    scope = entity.pk if entity is not None else 'global'
+    keys = {
+        (kind, outcome, unit): COUNTER_KEY.format(scope, kind, outcome, unit)
+        for kind in (KIND_MESSAGE, KIND_CONVERSATION, KIND_PROMPT)
+        for outcome in ('rejected', 'truncated')
+        for unit in ('count', 'bytes')
+    }
+    state = get_state()
+    counters = {}
+    for (kind, outcome, unit), key in keys.items():
+        counters.setdefault(kind, {}).setdefault(outcome, {})[unit] = state.get(key, 0)
+    return counters
+
+
+def guard_message(text, entity) -> tuple:
+    # Devuelve (texto, recortado). Lanza InputTooLarge si la política es rechazar
+    limit = limit_for(entity, KIND_MESSAGE)
+    tokens = estimate_tokens(text)
+    if tokens <= limit:
+        return text, False
+    if policy_for(entity) != POLICY_TRUNCATE:
+        record(entity, KIND_MESSAGE, 'rejected', len(text.encode('utf-8')))
+        raise InputTooLarge(KIND_MESSAGE, tokens, limit)
+    # Se corta en el último espacio dentro del límite para no partir palabras
+    max_chars = limit * _setting('INPUT_CHARS_PER_TOKEN', 4) - len(TRUNCATION_MARK)
+    cut = text.rfind(' ', 0, max_chars)
+    kept = text[:cut if cut > max_chars // 2 else max_chars].rstrip() + TRUNCATION_MARK
+    record(entity, KIND_MESSAGE, 'truncated', len(text.encode('utf-8')) - len(kept.encode('utf-8')))
+    return kept, True
+
+
+def guard_conversation(chat_log: list, message: str, entity):
+    # La conversación completa se reenvía en cada turno: no se admiten más turnos pasado el límite
+    limit = limit_for(entity, KIND_CONVERSATION)
+    chars = len(message) + sum(len(m.get('content') or '') for m in chat_log if isinstance(m, dict))
+    tokens = math.ceil(chars / _setting('INPUT_CHARS_PER_TOKEN', 4))
+    if tokens > limit:
+        record(entity, KIND_CONVERSATION, 'rejected', len(message.encode('utf-8')))
+        raise InputTooLarge(KIND_CONVERSATION, tokens, limit)
+
+
+def guard_prompt(spec: dict, entity=None):
+    # Prompt de sistema de un test nuevo: siempre se rechaza (recortar cambiaría el test en silencio)
+    criteria = json.dumps(spec.get('evaluation_criteria') or {}, ensure_ascii=False)
+    text = (spec.get('ai_prompt_instructions') or '') + criteria
+    limit = limit_for(entity, KIND_PROMPT)
+    tokens = estimate_tokens(text)
+    if tokens > limit:
+        record(entity, KIND_PROMPT, 'rejected', len(text.encode('utf-8')))
+        raise InputTooLarge(KIND_PROMPT, tokens, limit)
@@ -0,0 +1,56 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.archive import DEFAULT_CODEC, archive_execution, available_codecs
+from core.models import TestExecution
+
+
+class Command(BaseCommand):
+    help = "Archiva (comprimido) el chat_log y la evaluación de ejecuciones finalizadas hace más de N días"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=90,
+                            help="Antigüedad mínima (desde finish_time) para archivar. Por defecto 90.")
+        parser.add_argument('--codec', default=DEFAULT_CODEC,
+                            help=f"Códec de compresión ({', '.join(available_codecs())}).")
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--limit', type=int, default=None, help="Máximo de ejecuciones a archivar.")
+        parser.add_argument('--dry-run', action='store_true', help="Solo cuenta lo que se archivaría.")
+
+    def handle(self, *args, **options):
+        codec = options['codec']
+        if codec not in available_codecs():
+            raise CommandError(f"Códec no disponible: {codec}. Disponibles: {', '.join(available_codecs())}")
+
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        pending = TestExecution.objects.filter(
+            finish_time__lt=cutoff,
+            archived_at__isnull=True,
+        ).order_by('pk')
+
+        if options['dry_run']:
+            self.stdout.write(f"Se archivarían {pending.count()} ejecuciones finalizadas antes de {cutoff:%Y-%m-%d}")
+            return
+
+        limit = options['limit']
+        archived = raw_bytes = stored_bytes = 0
+        last_pk = 0
+        while limit is None or archived < limit:
+            size = options['batch_size'] if limit is None else min(options['batch_size'], limit - archived)
+            batch = list(pending.filter(pk__gt=last_pk).only('id', 'chat_log', 'evaluation_result')[:size])
+            if not batch:
+                break
+            for execution in batch:
+                result = archive_execution(execution, codec=codec)
+                raw_bytes += result.original_size
+                stored_bytes += len(result.payload)
+            archived += len(batch)
+            last_pk = batch[-1].pk
+            self.stdout.write(f"  {archived} ejecuciones archivadas...")
+
+        ratio = (stored_bytes / raw_bytes * 100) if raw_bytes else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Archivadas {archived} ejecuciones ({raw_bytes} bytes -> {stored_bytes} bytes, {ratio:.1f}%) con {codec}"
+        ))
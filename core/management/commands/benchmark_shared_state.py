@@ -0,0 +1,102 @@
+import multiprocessing
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.shared_state import BACKENDS, create_backend
+
+OPERATIONS = ('get', 'set', 'incr', 'add', 'compare_and_set')
+
+
+def run_operation(backend, operation: str, ops: int, prefix: str) -> float:
+    # Devuelve operaciones por segundo
+    key = f"{prefix}:{operation}"
+    backend.set(key, 0)
+    started = time.perf_counter()
+    if operation == 'get':
+        for _ in range(ops):
+            backend.get(key)
+    elif operation == 'set':
+        for i in range(ops):
+            backend.set(key, i, 60)
+    elif operation == 'incr':
+        for _ in range(ops):
+            backend.incr(key)
+    elif operation == 'add':
+        for i in range(ops):
+            backend.add(f"{key}:{i}", 1, 60)
+    elif operation == 'compare_and_set':
+        for i in range(ops):
+            backend.compare_and_set(key, i, i + 1)
+    elapsed = time.perf_counter() - started
+    return ops / elapsed if elapsed else float('inf')
+
+
+def _incr_worker(name, options, key, ops, queue):
+    backend = create_backend(name, options)
+    started = time.perf_counter()
+    for _ in range(ops):
+        backend.incr(key)
+    queue.put(time.perf_counter() - started)
+
+
+class Command(BaseCommand):
+    help = ("Mide operaciones/segundo de cada backend de estado compartido (core.shared_state) y "
+            "comprueba que los contadores son atómicos entre procesos")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backends', default=','.join(BACKENDS), help="Backends separados por comas")
+        parser.add_argument('--ops', type=int, default=5000, help="Operaciones por prueba")
+        parser.add_argument('--processes', type=int, default=4,
+                            help="Procesos que incrementan el mismo contador a la vez (0 = no probar)")
+
+    def handle(self, *args, **options):
+        names = [name.strip() for name in options['backends'].split(',') if name.strip()]
+        unknown = [name for name in names if name not in BACKENDS]
+        if unknown:
+            raise CommandError(f"Backends desconocidos: {', '.join(unknown)}")
+
+        prefix = f"bench:{os.getpid()}"
+        with tempfile.TemporaryDirectory() as directory:
+            # El backend 'shm' de la prueba usa un fichero propio, no el de la aplicación
+            backend_options = {'shm': {'PATH': os.path.join(directory, 'bench-state.sqlite3')}}
+
+            self.stdout.write(f"{'backend':<8} " + ' '.join(f"{op:>16}" for op in OPERATIONS) + f" {'multiproceso':>26}")
+            for name in names:
+                backend = create_backend(name, backend_options.get(name))
+                rates = [run_operation(backend, op, options['ops'], prefix) for op in OPERATIONS]
+                shared = self.check_processes(name, backend_options.get(name), options, prefix)
+                self.stdout.write(f"{name:<8} " + ' '.join(f"{rate:>14,.0f}/s" for rate in rates) + f" {shared:>26}")
+
+    def check_processes(self, name, backend_options, options, prefix) -> str:
+        # Incrementos simultáneos desde varios procesos: el total debe cuadrar si el backend es compartido
+        processes = options['processes']
+        if processes <= 0:
+            return '-'
+        key = f"{prefix}:shared"
+        ops = max(1, options['ops'] // processes)
+        backend = create_backend(name, backend_options)
+        backend.delete(key)
+
+        context = multiprocessing.get_context('fork')
+        queue = context.Queue()
+        workers = [
+            context.Process(target=_incr_worker, args=(name, backend_options, key, ops, queue))
+            for _ in range(processes)
+        ]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+        if any(worker.exitcode for worker in workers):
+            return 'error en un proceso'
+
+        expected = ops * processes
+        total = backend.get(key, 0)
+        if total == expected:
+            return f"{expected / elapsed:,.0f}/s ok"
+        return f"no compartido ({total}/{expected})"
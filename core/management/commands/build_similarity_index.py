@@ -0,0 +1,106 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from core import minhash
+from core.archive import iter_rehydrated
+from core.models import AnswerBucket, AnswerSignature, TestExecution
+from core.similarity import build_rows, find_similar, save_rows
+
+
+class Command(BaseCommand):
+    help = "Construye el índice MinHash/LSH de respuestas para detectar respuestas casi duplicadas"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200,
+                            help="Ejecuciones por lote enviado a los procesos")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--rebuild', action='store_true',
+                            help="Borra el índice existente antes de reconstruirlo")
+        parser.add_argument('--flag', action='store_true',
+                            help="Recalcula similarity_flags de las ejecuciones finalizadas")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        if options['rebuild']:
+            AnswerBucket.objects.all().delete()
+            AnswerSignature.objects.all().delete()
+            TestExecution.objects.update(similarity_indexed_at=None)
+
+        # Sin firmas ni marca de procesada: las ejecuciones sin respuestas largas no se repiten en
+        # cada pasada, y las indexadas en vivo (core.similarity.index_turns) ya tienen firmas
+        executions = TestExecution.objects.filter(
+            similarity_indexed_at__isnull=True, answer_signatures__isnull=True,
+        ).only(
+            'id', 'entity_id', 'user_id', 'chat_log', 'archived_at',
+        ).order_by('pk')
+        min_words = getattr(settings, 'SIMILARITY_MIN_WORDS', 12)
+        hash_batch = partial(minhash.hash_answers, min_words=min_words)
+
+        # El hashing (CPU) va a los procesos; las escrituras se hacen en este proceso
+        indexed = answers = 0
+        with ProcessPoolExecutor(max_workers=max(1, options['workers'])) as pool:
+            pending = []
+            for batch in self._batches(executions, options['batch_size']):
+                pending.append((pool.submit(hash_batch, self._items(batch)), batch))
+                # Se limita el trabajo en vuelo para no acumular lotes en memoria
+                if len(pending) >= options['workers'] * 2:
+                    done_future, done_batch = pending.pop(0)
+                    answers += self._store(done_future, done_batch)
+                    indexed += len(done_batch)
+            for future, batch in pending:
+                answers += self._store(future, batch)
+                indexed += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexadas {answers} respuestas de {indexed} ejecuciones en {time.monotonic() - started:.1f}s"
+        ))
+
+        if options['flag']:
+            flagged = 0
+            finished = TestExecution.objects.filter(finish_time__isnull=False).only('id', 'entity_id', 'user_id')
+            for execution in finished.iterator(chunk_size=500):
+                flags = find_similar(execution)
+                TestExecution.objects.filter(pk=execution.pk).update(similarity_flags=flags or None)
+                flagged += bool(flags)
+            self.stdout.write(self.style.SUCCESS(f"{flagged} ejecuciones con respuestas similares"))
+
+    def _batches(self, executions, batch_size):
+        batch = []
+        for execution in iter_rehydrated(executions, chunk_size=batch_size):
+            batch.append(execution)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _items(self, batch):
+        return [
+            ((execution.pk, position), str(message.get('content') or ''))
+            for execution in batch
+            for position, message in enumerate(execution.chat_log or [])
+            if isinstance(message, dict) and message.get('role') == 'user'
+        ]
+
+    def _store(self, future, batch) -> int:
+        executions = {execution.pk: execution for execution in batch}
+        hashed = {}
+        for (execution_id, position), sig, keys in future.result():
+            hashed.setdefault(execution_id, []).append((position, sig, keys))
+        signatures, buckets = [], []
+        for execution_id, rows in hashed.items():
+            execution_signatures, execution_buckets = build_rows(executions[execution_id], rows)
+            signatures += execution_signatures
+            buckets += execution_buckets
+        with transaction.atomic():
+            save_rows(signatures, buckets)
+            TestExecution.objects.filter(pk__in=executions).update(similarity_indexed_at=timezone.now())
+        self.stdout.write(f"  {len(batch)} ejecuciones...")
+        return len(signatures)
@@ -0,0 +1,68 @@
+import csv
+import os
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Entity
+from core.onboarding import PASSWORD_HASH, PASSWORD_INVITE, OnboardingError, import_candidates
+
+
+class Command(BaseCommand):
+    help = "Da de alta candidatos (User + EntityProfile) en bloque desde un CSV"
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_path', help="CSV con cabecera: username[,email,first_name,last_name,is_manager,password]")
+        parser.add_argument('--entity', required=True, help="Nombre de la entidad a la que se asignan")
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--passwords', choices=[PASSWORD_INVITE, PASSWORD_HASH], default=PASSWORD_INVITE,
+                            help="'invite': invitaciones de un solo uso; 'hash': usa la columna password si existe")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help="Hilos para calcular los hashes de contraseña (--passwords hash)")
+        parser.add_argument('--invites-out', help="CSV de salida con username,email,invite_url")
+        parser.add_argument('--dry-run', action='store_true', help="Valida y cuenta sin crear nada")
+
+    def handle(self, *args, **options):
+        entity = Entity.objects.filter(name=options['entity']).first()
+        if entity is None:
+            raise CommandError(f"Entidad no encontrada: {options['entity']}")
+
+        started = time.monotonic()
+        counts = Counter()
+        out = writer = None
+        if options['invites_out'] and not options['dry_run']:
+            out = open(options['invites_out'], 'w', newline='', encoding='utf-8')
+            writer = csv.writer(out)
+            writer.writerow(['username', 'email', 'invite_url'])
+        try:
+            with open(options['csv_path'], 'rb') as fh:
+                results = import_candidates(
+                    fh, entity,
+                    chunk_size=options['chunk_size'],
+                    password_mode=options['passwords'],
+                    workers=options['workers'],
+                    dry_run=options['dry_run'],
+                )
+                for result in results:
+                    counts[result['status']] += 1
+                    if result['status'] == 'invalid':
+                        self.stderr.write(f"Línea {result['line']}: {result['error']}")
+                    elif result['status'] in {'exists', 'duplicate'}:
+                        self.stderr.write(f"Línea {result['line']}: '{result['username']}' "
+                                          f"{'ya existe' if result['status'] == 'exists' else 'repetido en el CSV'}")
+                    elif writer and result.get('invite_url'):
+                        writer.writerow([result['username'], result['email'], result['invite_url']])
+        except OnboardingError as err:
+            raise CommandError(str(err))
+        except OSError as err:
+            raise CommandError(f"No se pudo leer el CSV: {err}")
+        finally:
+            if out:
+                out.close()
+
+        verb = "Se crearían" if options['dry_run'] else "Creados"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {counts['created']} candidatos en {entity.name} ({time.monotonic() - started:.1f}s); "
+            f"ya existentes {counts['exists']}, repetidos {counts['duplicate']}, no válidos {counts['invalid']}"
+        ))
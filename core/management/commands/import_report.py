@@ -0,0 +1,121 @@
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management import get_commands
+from django.core.management.base import BaseCommand, CommandError
+
+# Script que se ejecuta en un intérprete limpio (-X importtime) y mide el arranque por fases
+STAGES_SCRIPT = """
+import json, sys, time
+stages = []
+started = last = time.perf_counter()
+
+def mark(name):
+    global last
+    now = time.perf_counter()
+    stages.append([name, (now - last) * 1000])
+    last = now
+
+import django
+django.setup()
+mark('django.setup')
+from django.urls import get_resolver
+get_resolver().url_patterns
+mark('urlconf')
+from django.core.wsgi import get_wsgi_application
+get_wsgi_application()
+mark('wsgi (middleware)')
+from importlib import import_module
+for name, app in json.loads(sys.argv[1]):
+    import_module(f'{app}.management.commands.{name}')
+    mark(f'comando {name}')
+stages.append(['total', (time.perf_counter() - started) * 1000])
+print(json.dumps(stages))
+"""
+
+PROJECT_PACKAGES = ('api', 'core', 'testeador_project')
+
+
+def parse_importtime(stderr: str) -> list:
+    # Líneas "import time: self [us] | cumulative | imported package" -> [(módulo, self_us, cum_us, nivel)]
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        except ValueError:
+            continue
+        level = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), level))
+    return rows
+
+
+class Command(BaseCommand):
+    help = ("Mide el arranque en frío (django.setup, URLconf, middleware y comandos) en un intérprete limpio "
+            "y lista los módulos que más tardan en importarse")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--command', action='append', default=[],
+                            help="Mide también la importación de este comando de manage.py (repetible)")
+        parser.add_argument('--repeat', type=int, default=3, help="Ejecuciones (se toma la más rápida)")
+        parser.add_argument('--top', type=int, default=25, help="Módulos a listar")
+        parser.add_argument('--project-only', action='store_true', help="Lista solo módulos del proyecto")
+        parser.add_argument('--json', action='store_true', help="Salida en JSON")
+        parser.add_argument('--max-ms', type=float, help="Falla si el arranque total supera estos milisegundos")
+
+    def handle(self, *args, **options):
+        commands = get_commands()
+        targets = []
+        for name in options['command']:
+            if name not in commands:
+                raise CommandError(f"Comando desconocido: {name}")
+            targets.append([name, commands[name]])
+
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': settings.SETTINGS_MODULE}
+        best = None
+        for _ in range(max(1, options['repeat'])):
+            proc = subprocess.run(
+                [sys.executable, '-X', 'importtime', '-c', STAGES_SCRIPT, json.dumps(targets)],
+                capture_output=True, text=True, env=env, cwd=settings.BASE_DIR,
+            )
+            if proc.returncode != 0:
+                raise CommandError(f"Error al arrancar el proyecto:\n{proc.stderr[-2000:]}")
+            stages = json.loads(proc.stdout.strip().splitlines()[-1])
+            if best is None or stages[-1][1] < best[0][-1][1]:
+                best = (stages, parse_importtime(proc.stderr))
+
+        stages, rows = best
+        modules = [row for row in rows if not options['project_only'] or row[0].split('.')[0] in PROJECT_PACKAGES]
+        modules.sort(key=lambda row: row[2], reverse=True)
+        packages = defaultdict(int)
+        for name, self_us, _, _ in rows:
+            packages[name.split('.')[0]] += self_us
+        top_packages = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:options['top']]
+
+        if options['json']:
+            self.stdout.write(json.dumps({
+                "stages": {name: round(ms, 1) for name, ms in stages},
+                "modules": [{"module": n, "self_ms": s / 1000, "cumulative_ms": c / 1000}
+                            for n, s, c, _ in modules[:options['top']]],
+                "packages": {name: us / 1000 for name, us in top_packages},
+            }, indent=2))
+        else:
+            self.stdout.write("Fases del arranque (ms):")
+            for name, ms in stages:
+                self.stdout.write(f"  {name:<28} {ms:>8.1f}")
+            self.stdout.write(f"\nMódulos por tiempo acumulado ({len(rows)} importados):")
+            self.stdout.write(f"  {'módulo':<48} {'propio':>8} {'acumulado':>10}")
+            for name, self_us, cumulative_us, level in modules[:options['top']]:
+                self.stdout.write(f"  {('  ' * level + name)[:48]:<48} {self_us / 1000:>8.1f} {cumulative_us / 1000:>10.1f}")
+            self.stdout.write("\nPaquetes por tiempo propio (ms):")
+            for name, self_us in top_packages:
+                self.stdout.write(f"  {name:<48} {self_us / 1000:>8.1f}")
+
+        total = stages[-1][1]
+        if options['max_ms'] is not None and total > options['max_ms']:
+            raise CommandError(f"Arranque de {total:.0f} ms (máximo {options['max_ms']:.0f} ms)")
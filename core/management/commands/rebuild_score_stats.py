@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from core.archive import iter_rehydrated
+from core.models import CriterionScore, TestExecution
+from core.score_stats import build_rows, bump_generation
+
+
+class Command(BaseCommand):
+    help = "Reconstruye las puntuaciones por criterio (estadísticas de cohorte) desde evaluation_result"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        # Las ejecuciones archivadas tienen evaluation_result comprimido: también se incluyen
+        executions = TestExecution.objects.filter(
+            Q(evaluation_result__isnull=False) | Q(archived_at__isnull=False),
+        ).only('id', 'test_id', 'entity_id', 'evaluation_result', 'archived_at').order_by('pk')
+
+        batch_size = options['batch_size']
+        total = 0
+        with transaction.atomic():
+            CriterionScore.objects.all().delete()
+            batch = []
+            for execution in iter_rehydrated(executions, chunk_size=batch_size):
+                batch.extend(build_rows(execution))
+                if len(batch) >= batch_size:
+                    CriterionScore.objects.bulk_create(batch)
+                    total += len(batch)
+                    batch = []
+            if batch:
+                CriterionScore.objects.bulk_create(batch)
+                total += len(batch)
+            transaction.on_commit(bump_generation)
+        self.stdout.write(self.style.SUCCESS(f"Guardadas {total} puntuaciones"))
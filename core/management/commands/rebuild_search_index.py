@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.archive import iter_rehydrated
+from core.models import ExecutionSearchDocument, TestExecution
+from core.search import build_document
+
+
+class Command(BaseCommand):
+    help = "Reconstruye el índice de búsqueda de texto completo (transcripciones y evaluaciones)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--missing-only', action='store_true',
+                            help="Solo indexa ejecuciones sin documento de búsqueda")
+
+    def handle(self, *args, **options):
+        executions = TestExecution.objects.only(
+            'id', 'entity_id', 'chat_log', 'evaluation_result', 'archived_at',
+        ).order_by('pk')
+        if options['missing_only']:
+            executions = executions.filter(search_document__isnull=True)
+
+        batch_size = options['batch_size']
+        total = 0
+        batch = []
+        for execution in iter_rehydrated(executions, chunk_size=batch_size):
+            batch.append(build_document(execution))
+            if len(batch) >= batch_size:
+                total += self._flush(batch)
+                batch = []
+        if batch:
+            total += self._flush(batch)
+        self.stdout.write(self.style.SUCCESS(f"Indexadas {total} ejecuciones"))
+
+    def _flush(self, docs):
+        with transaction.atomic():
+            ExecutionSearchDocument.objects.filter(execution_id__in=[d.execution_id for d in docs]).delete()
+            ExecutionSearchDocument.objects.bulk_create(docs)
+        self.stdout.write(f"  {len(docs)} documentos...")
+        return len(docs)
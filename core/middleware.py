@@ -0,0 +1,131 @@
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.functional import SimpleLazyObject
+from django.utils.regex_helper import _lazy_re_compile
+
+from core.auth_cache import get_user
+from core.db_router import mark_user_wrote, pin_to_primary, replica_alias, user_recently_wrote
+from core.profiling import profile_request, should_sample
+
+# brotli es opcional: sin él solo se negocia gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+re_accepts_br = _lazy_re_compile(r"\bbr\b(?!\s*;\s*q=0(?:\.0*)?\b)")
+
+
+def _get_cached_user(request):
+    if not hasattr(request, '_cached_user'):
+        request._cached_user = get_user(request)
+    return request._cached_user
+
+
+async def _aget_cached_user(request):
+    return await sync_to_async(_get_cached_user)(request)
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    # Sustituye a AuthenticationMiddleware: resuelve usuario, perfil y entidad desde cache
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: _get_cached_user(request))
+        request.auser = partial(_aget_cached_user, request)
+
+
+def _brotli_sequence(sequence, quality):
+    compressor = brotli.Compressor(quality=quality)
+    for chunk in sequence:
+        data = compressor.process(chunk) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+async def _abrotli_sequence(sequence, quality):
+    compressor = brotli.Compressor(quality=quality)
+    async for chunk in sequence:
+        data = compressor.process(chunk) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+class CompressionMiddleware(GZipMiddleware):
+    # Compresión negociada (brotli si está disponible, si no gzip) por encima de un umbral de tamaño.
+    # brotli solo para JSON de la API: el HTML (con token CSRF) va por GZipMiddleware, que añade
+    # relleno aleatorio contra BREACH
+    def process_response(self, request, response):
+        content_type = response.get('Content-Type', '')
+        # SSE: cada evento debe llegar al cliente en cuanto se emite
+        if content_type.startswith('text/event-stream'):
+            return response
+        if not response.streaming and len(response.content) < getattr(settings, 'COMPRESSION_MIN_SIZE', 1024):
+            return response
+        if response.has_header('Content-Encoding'):
+            return response
+
+        accept_encoding = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        use_brotli = brotli is not None and content_type.startswith('application/json')
+        if not use_brotli or not re_accepts_br.search(accept_encoding):
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        quality = getattr(settings, 'COMPRESSION_BROTLI_QUALITY', 5)
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = _abrotli_sequence(response.streaming_content, quality)
+            else:
+                response.streaming_content = _brotli_sequence(response.streaming_content, quality)
+            del response.headers['Content-Length']
+        else:
+            compressed = brotli.compress(response.content, quality=quality)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        # Igual que GZipMiddleware: un ETag fuerte pasa a débil al cambiar la codificación
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = 'br'
+        return response
+
+
+class ReplicaStickinessMiddleware:
+    # Read-your-writes: quien acaba de escribir lee de la primaria durante unos segundos
+    SAFE_METHODS = {'GET', 'HEAD', 'OPTIONS', 'TRACE'}
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if replica_alias() is None:
+            return self.get_response(request)
+
+        user = getattr(request, 'user', None)
+        user_id = user.pk if user is not None and user.is_authenticated else None
+        with pin_to_primary(bool(user_id) and user_recently_wrote(user_id)):
+            response = self.get_response(request)
+
+        if user_id and request.method not in self.SAFE_METHODS and response.status_code < 400:
+            mark_user_wrote(user_id)
+        return response
+
+
+class RequestProfilerMiddleware:
+    # Perfila una muestra de las peticiones (PROFILER_SAMPLE_RATE); ver core.profiling
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not should_sample():
+            return self.get_response(request)
+        return profile_request(request, self.get_response)
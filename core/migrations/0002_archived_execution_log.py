@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-19 13:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedExecutionLog',
+            fields=[
+                ('execution', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='archived_log', serialize=False, to='core.testexecution')),
+                ('codec', models.CharField(max_length=10)),
+                ('payload', models.BinaryField()),
+                ('original_size', models.PositiveIntegerField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Log archivado',
+                'verbose_name_plural': 'Logs archivados',
+            },
+        ),
+        migrations.AddField(
+            model_name='testexecution',
+            name='archived_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
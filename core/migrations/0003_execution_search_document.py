@@ -0,0 +1,94 @@
+# Generated by Django 5.2.7 on 2026-10-19 13:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Estructuras de búsqueda específicas de cada motor. El resto de motores usa
+# el fallback con icontains de core.search.
+POSTGRES_FORWARD = [
+    """
+    ALTER TABLE core_executionsearchdocument ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('spanish', coalesce(evaluation, '')), 'A') ||
+        setweight(to_tsvector('spanish', coalesce(transcript, '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX core_execsearch_vector_gin ON core_executionsearchdocument USING GIN (search_vector)",
+]
+POSTGRES_REVERSE = [
+    "DROP INDEX IF EXISTS core_execsearch_vector_gin",
+    "ALTER TABLE core_executionsearchdocument DROP COLUMN IF EXISTS search_vector",
+]
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE core_executionsearch_fts USING fts5(
+        transcript, evaluation,
+        content='core_executionsearchdocument', content_rowid='execution_id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER core_execsearch_ai AFTER INSERT ON core_executionsearchdocument BEGIN
+        INSERT INTO core_executionsearch_fts(rowid, transcript, evaluation)
+        VALUES (new.execution_id, new.transcript, new.evaluation);
+    END
+    """,
+    """
+    CREATE TRIGGER core_execsearch_ad AFTER DELETE ON core_executionsearchdocument BEGIN
+        INSERT INTO core_executionsearch_fts(core_executionsearch_fts, rowid, transcript, evaluation)
+        VALUES ('delete', old.execution_id, old.transcript, old.evaluation);
+    END
+    """,
+    """
+    CREATE TRIGGER core_execsearch_au AFTER UPDATE OF transcript, evaluation ON core_executionsearchdocument BEGIN
+        INSERT INTO core_executionsearch_fts(core_executionsearch_fts, rowid, transcript, evaluation)
+        VALUES ('delete', old.execution_id, old.transcript, old.evaluation);
+        INSERT INTO core_executionsearch_fts(rowid, transcript, evaluation)
+        VALUES (new.execution_id, new.transcript, new.evaluation);
+    END
+    """,
+]
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS core_execsearch_au",
+    "DROP TRIGGER IF EXISTS core_execsearch_ad",
+    "DROP TRIGGER IF EXISTS core_execsearch_ai",
+    "DROP TABLE IF EXISTS core_executionsearch_fts",
+]
+
+
+def _run(statements_by_vendor):
+    def run(apps, schema_editor):
+        for sql in statements_by_vendor.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_archived_execution_log'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExecutionSearchDocument',
+            fields=[
+                ('execution', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='core.testexecution')),
+                ('transcript', models.TextField(blank=True, default='')),
+                ('evaluation', models.TextField(blank=True, default='')),
+                ('indexed_turns', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('entity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.entity')),
+            ],
+            options={
+                'verbose_name': 'Documento de búsqueda',
+                'verbose_name_plural': 'Documentos de búsqueda',
+            },
+        ),
+        migrations.RunPython(
+            _run({'postgresql': POSTGRES_FORWARD, 'sqlite': SQLITE_FORWARD}),
+            _run({'postgresql': POSTGRES_REVERSE, 'sqlite': SQLITE_REVERSE}),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-19 13:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CriterionScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('criterion', models.CharField(max_length=100)),
+                ('score', models.FloatField()),
+                ('entity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.entity')),
+                ('execution', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='criterion_scores', to='core.testexecution')),
+                ('test', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.test')),
+            ],
+            options={
+                'verbose_name': 'Puntuación por criterio',
+                'verbose_name_plural': 'Puntuaciones por criterio',
+                'indexes': [models.Index(fields=['test', 'id'], name='criterionscore_test_id')],
+                'constraints': [models.UniqueConstraint(fields=('execution', 'criterion'), name='criterionscore_execution_criterion')],
+            },
+        ),
+    ]
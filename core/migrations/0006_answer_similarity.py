@@ -0,0 +1,57 @@
+# Generated by Django 5.2.7 on 2026-10-19 13:18
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_criterion_score'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testexecution',
+            name='similarity_flags',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='AnswerSignature',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField()),
+                ('signature', models.BinaryField()),
+                ('entity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.entity')),
+                ('execution', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='answer_signatures', to='core.testexecution')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Firma de respuesta',
+                'verbose_name_plural': 'Firmas de respuestas',
+            },
+        ),
+        migrations.CreateModel(
+            name='AnswerBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.BigIntegerField()),
+                ('entity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.entity')),
+                ('signature', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='buckets', to='core.answersignature')),
+            ],
+            options={
+                'verbose_name': 'Cubo LSH',
+                'verbose_name_plural': 'Cubos LSH',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='answersignature',
+            constraint=models.UniqueConstraint(fields=('execution', 'position'), name='answersignature_execution_position'),
+        ),
+        migrations.AddIndex(
+            model_name='answerbucket',
+            index=models.Index(fields=['entity', 'key'], name='answerbucket_entity_key'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 13:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_answer_similarity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='test',
+            name='ai_provider',
+            field=models.CharField(blank=True, default='', help_text="Proveedor de IA (p. ej. 'local'); vacío para el de por defecto", max_length=50),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-19 13:21
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_test_ai_provider'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testexecution',
+            name='auto_finished',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='testexecution',
+            index=models.Index(condition=models.Q(('finish_time__isnull', True)), fields=['updated_at'], name='testexecution_unfinished_idle'),
+        ),
+    ]
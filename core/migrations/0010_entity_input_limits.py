@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-19 13:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_invite_token'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='entity',
+            name='max_conversation_tokens',
+            field=models.PositiveIntegerField(blank=True, help_text='Tokens máximos de toda la conversación', null=True),
+        ),
+        migrations.AddField(
+            model_name='entity',
+            name='max_message_tokens',
+            field=models.PositiveIntegerField(blank=True, help_text='Tokens máximos por mensaje del candidato', null=True),
+        ),
+        migrations.AddField(
+            model_name='entity',
+            name='max_prompt_tokens',
+            field=models.PositiveIntegerField(blank=True, help_text='Tokens máximos del prompt de un test creado', null=True),
+        ),
+        migrations.AddField(
+            model_name='entity',
+            name='oversize_policy',
+            field=models.CharField(blank=True, choices=[('reject', 'Rechazar'), ('truncate', 'Recortar')], default='', help_text='Qué hacer con un mensaje demasiado largo; vacío = valor de settings', max_length=10),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 13:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_entity_input_limits'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testexecution',
+            name='similarity_indexed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,88 @@
+import hashlib
+import random
+import re
+import unicodedata
+from array import array
+
+# MinHash + LSH sobre respuestas de texto (sin dependencias de Django: se usa también
+# desde procesos hijos en build_similarity_index).
+# Con 16 bandas de 4 filas, dos respuestas con similitud de Jaccard 0.6 comparten al
+# menos una clave con probabilidad ~0.89 (0.99 a partir de 0.75).
+NUM_PERMUTATIONS = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_PERMUTATIONS // BANDS
+SHINGLE_SIZE = 3
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(20240601)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(NUM_PERMUTATIONS)
+]
+
+_WORD_RE = re.compile(r'\w+')
+
+
+def words(text: str) -> list:
+    # Minúsculas y sin tildes: "Programación" y "programacion" cuentan igual
+    normalized = unicodedata.normalize('NFKD', text.lower())
+    normalized = ''.join(ch for ch in normalized if not unicodedata.combining(ch))
+    return _WORD_RE.findall(normalized)
+
+
+def shingles(tokens: list, size: int = SHINGLE_SIZE) -> set:
+    if len(tokens) < size:
+        return {' '.join(tokens)} if tokens else set()
+    return {' '.join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+
+
+def _hash64(value: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(value, digest_size=8).digest(), 'little')
+
+
+def signature(shingle_set: set) -> array:
+    hashes = [_hash64(s.encode('utf-8')) % _MERSENNE_PRIME for s in shingle_set]
+    return array('Q', [
+        min((a * h + b) % _MERSENNE_PRIME for h in hashes)
+        for a, b in _PERMUTATIONS
+    ])
+
+
+def band_keys(sig: array) -> list:
+    # Una clave por banda (entero con signo de 64 bits, cabe en BigIntegerField)
+    keys = []
+    for band in range(BANDS):
+        chunk = sig[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        digest = hashlib.blake2b(bytes([band]) + chunk.tobytes(), digest_size=8).digest()
+        keys.append(int.from_bytes(digest, 'little', signed=True))
+    return keys
+
+
+def similarity(sig_a, sig_b) -> float:
+    # Estimación de la similitud de Jaccard: fracción de componentes iguales
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / NUM_PERMUTATIONS
+
+
+def from_bytes(data: bytes) -> array:
+    sig = array('Q')
+    sig.frombytes(bytes(data))
+    return sig
+
+
+def hash_answer(text: str, min_words: int):
+    # (firma en bytes, claves LSH) o None si la respuesta es demasiado corta para compararla
+    tokens = words(text or '')
+    if len(tokens) < min_words:
+        return None
+    sig = signature(shingles(tokens))
+    return sig.tobytes(), band_keys(sig)
+
+
+def hash_answers(items: list, min_words: int) -> list:
+    # Para ProcessPoolExecutor: items = [(clave, texto)] -> [(clave, firma, claves LSH)]
+    results = []
+    for key, text in items:
+        hashed = hash_answer(text, min_words)
+        if hashed is not None:
+            results.append((key, *hashed))
+    return results
@@ -7,6 +7,19 @@ class Entity(models.Model):
     contact_email = models.EmailField()
     is_active = models.BooleanField(default=True)
 
+    # Límites de entrada antes de llamar a la IA (core.input_guards); vacío = valor de settings
+    max_message_tokens = models.PositiveIntegerField(null=True, blank=True,
+                                                     help_text="Tokens máximos por mensaje del candidato")
+    max_conversation_tokens = models.PositiveIntegerField(null=True, blank=True,
+                                                          help_text="Tokens máximos de toda la conversación")
+    max_prompt_tokens = models.PositiveIntegerField(null=True, blank=True,
+                                                    help_text="Tokens máximos del prompt de un test creado")
+    oversize_policy = models.CharField(
+        max_length=10, blank=True, default='',
+        choices=[('reject', 'Rechazar'), ('truncate', 'Recortar')],
+        help_text="Qué hacer con un mensaje demasiado largo; vacío = valor de settings",
+    )
+
     def __str__(self):
         return self.name
 
@@ -41,6 +54,13 @@ class Test(models.Model):
 
     creator = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='created_test')
 
+    # Proveedor de IA para este Test (clave de settings.AI_PROVIDERS); vacío = reglas de AI_ROUTING
+    ai_provider = models.CharField(max_length=50, blank=True, default='',
+                                   help_text="Proveedor de IA (p. ej. 'local'); vacío para el de por defecto")
+
+    # Versión de la fila: base de ETag/Last-Modified en los listados
+    updated_at = models.DateTimeField(auto_now=True)
+
     def __str__(self):
         return self.name
 
@@ -63,9 +83,139 @@ class TestExecution(models.Model):
 
     pdf_report_path = models.CharField(max_length=255, null=True, blank=True)
 
+    # Fecha de archivado: chat_log y evaluation_result viven comprimidos en ArchivedExecutionLog
+    archived_at = models.DateTimeField(null=True, blank=True)
+
+    # Última modificación (cada turno guarda la ejecución): base de ETag/Last-Modified
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Respuestas casi idénticas a las de otras ejecuciones de la entidad (ver core.similarity)
+    similarity_flags = models.JSONField(null=True, blank=True)
+    # Procesada por build_similarity_index (aunque no tuviera respuestas largas que indexar)
+    similarity_indexed_at = models.DateTimeField(null=True, blank=True)
+
+    # Finalizada automáticamente por inactividad (reap_executions), no por el usuario
+    auto_finished = models.BooleanField(default=False)
+
     def __str__(self):
         return f"Ejecución de {self.test.name} por {self.user.username} ({self.entity.name})"
 
     class Meta:
         verbose_name = "Ejecución de test"
-        ordering = ['-start_time']
\ No newline at end of file
+        ordering = ['-start_time']
+        indexes = [
+            # Índice parcial: solo ejecuciones sin finalizar, ordenadas por última actividad
+            models.Index(fields=['updated_at'], condition=models.Q(finish_time__isnull=True),
+                         name='testexecution_unfinished_idle'),
+        ]
+
+
+class ArchivedExecutionLog(models.Model):
+    # Almacenamiento frío: chat_log y evaluation_result comprimidos de una ejecución finalizada
+    execution = models.OneToOneField(TestExecution, on_delete=models.CASCADE, primary_key=True,
+                                     related_name='archived_log')
+    codec = models.CharField(max_length=10)
+    payload = models.BinaryField()
+    original_size = models.PositiveIntegerField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Archivo de ejecución {self.execution_id} ({self.codec})"
+
+    class Meta:
+        verbose_name = "Log archivado"
+        verbose_name_plural = "Logs archivados"
+
+class ExecutionSearchDocument(models.Model):
+    # Texto indexado de una ejecución (transcripción + evaluación) para búsqueda de texto completo.
+    # El índice lo mantiene la BD: tsvector + GIN en PostgreSQL y tabla FTS5 en SQLite (ver core.search)
+    execution = models.OneToOneField(TestExecution, on_delete=models.CASCADE, primary_key=True,
+                                     related_name='search_document')
+    entity = models.ForeignKey(Entity, on_delete=models.CASCADE, related_name='+')
+    transcript = models.TextField(blank=True, default='')
+    evaluation = models.TextField(blank=True, default='')
+    # Número de mensajes del chat_log ya incorporados (indexado incremental)
+    indexed_turns = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Documento de búsqueda de la ejecución {self.execution_id}"
+
+    class Meta:
+        verbose_name = "Documento de búsqueda"
+        verbose_name_plural = "Documentos de búsqueda"
+
+class CriterionScore(models.Model):
+    # Puntuación numérica de un criterio extraída de evaluation_result['scores'].
+    # Base de las estadísticas por cohorte (Test/Entidad), ver core.score_stats
+    execution = models.ForeignKey(TestExecution, on_delete=models.CASCADE, related_name='criterion_scores')
+    test = models.ForeignKey(Test, on_delete=models.CASCADE, related_name='+')
+    entity = models.ForeignKey(Entity, on_delete=models.CASCADE, related_name='+')
+    criterion = models.CharField(max_length=100)
+    score = models.FloatField()
+
+    def __str__(self):
+        return f"{self.criterion}={self.score} (ejecución {self.execution_id})"
+
+    class Meta:
+        verbose_name = "Puntuación por criterio"
+        verbose_name_plural = "Puntuaciones por criterio"
+        constraints = [
+            models.UniqueConstraint(fields=['execution', 'criterion'], name='criterionscore_execution_criterion'),
+        ]
+        indexes = [
+            # Carga incremental de la cohorte de un Test (filas nuevas por id)
+            models.Index(fields=['test', 'id'], name='criterionscore_test_id'),
+        ]
+
+
+class AnswerSignature(models.Model):
+    # Firma MinHash de una respuesta del usuario (detección de respuestas casi duplicadas)
+    execution = models.ForeignKey(TestExecution, on_delete=models.CASCADE, related_name='answer_signatures')
+    entity = models.ForeignKey(Entity, on_delete=models.CASCADE, related_name='+')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    # Posición del mensaje en chat_log
+    position = models.PositiveIntegerField()
+    signature = models.BinaryField()
+
+    def __str__(self):
+        return f"Firma de la respuesta {self.position} (ejecución {self.execution_id})"
+
+    class Meta:
+        verbose_name = "Firma de respuesta"
+        verbose_name_plural = "Firmas de respuestas"
+        constraints = [
+            models.UniqueConstraint(fields=['execution', 'position'], name='answersignature_execution_position'),
+        ]
+
+class AnswerBucket(models.Model):
+    # Clave LSH (una por banda) de una firma: las respuestas que comparten clave son candidatas
+    signature = models.ForeignKey(AnswerSignature, on_delete=models.CASCADE, related_name='buckets')
+    entity = models.ForeignKey(Entity, on_delete=models.CASCADE, related_name='+')
+    key = models.BigIntegerField()
+
+    def __str__(self):
+        return f"{self.key} (firma {self.signature_id})"
+
+    class Meta:
+        verbose_name = "Cubo LSH"
+        verbose_name_plural = "Cubos LSH"
+        indexes = [
+            models.Index(fields=['entity', 'key'], name='answerbucket_entity_key'),
+        ]
+
+class InviteToken(models.Model):
+    # Invitación de un solo uso para que un candidato importado elija su contraseña.
+    # Solo se guarda el hash SHA-256 del token; el token en claro se entrega una vez al importar
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='invite_tokens')
+    token_hash = models.CharField(max_length=64, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+    used_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Invitación de {self.user.username}"
+
+    class Meta:
+        verbose_name = "Invitación"
+        verbose_name_plural = "Invitaciones"
@@ -0,0 +1,171 @@
+import csv
+import hashlib
+import io
+import secrets
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.validators import validate_email
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models.functions import Lower
+from django.urls import reverse
+from django.utils import timezone
+
+from core.models import EntityProfile, InviteToken
+
+# Alta masiva de candidatos desde CSV (cabecera obligatoria 'username'; opcionales:
+# email, first_name, last_name, is_manager, password). Se procesa por lotes sin cargar
+# el fichero entero. Sin contraseña en el CSV se crea la cuenta con contraseña inutilizable
+# y una invitación de un solo uso: el hash (caro a propósito) se calcula al aceptarla.
+PASSWORD_INVITE = 'invite'
+PASSWORD_HASH = 'hash'
+
+TRUE_VALUES = {'1', 'true', 'si', 'sí', 'yes', 'x'}
+
+
+class OnboardingError(ValueError):
+    # Error de formato del CSV (mensaje apto para mostrar al administrador)
+    pass
+
+
+def hash_token(token: str) -> str:
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def invite_url(token: str) -> str:
+    return f"{settings.YOUR_SITE_URL.rstrip('/')}{reverse('invite', args=[token])}"
+
+
+def read_csv(fileobj):
+    # Acepta ficheros binarios (subidas) o de texto; BOM de Excel incluido
+    if isinstance(fileobj.read(0), bytes):
+        fileobj = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    reader = csv.DictReader(fileobj)
+    fields = [f.strip().lower() for f in reader.fieldnames or []]
+    if 'username' not in fields:
+        raise OnboardingError("El CSV debe tener una columna 'username'")
+    reader.fieldnames = fields
+    # El número de línea incluye la cabecera (línea 1)
+    for line, row in enumerate(reader, start=2):
+        yield line, {key: (value or '').strip() for key, value in row.items() if key}
+
+
+def _validate_row(row: dict):
+    username = row.get('username', '')
+    if not username:
+        return "Falta 'username'"
+    if len(username) > User._meta.get_field('username').max_length:
+        return "'username' demasiado largo"
+    try:
+        User._meta.get_field('username').run_validators(username)
+    except ValidationError:
+        return "'username' con caracteres no válidos"
+    if row.get('email'):
+        try:
+            validate_email(row['email'])
+        except ValidationError:
+            return "Email no válido"
+    return None
+
+
+def _hash_passwords(passwords: list, workers: int) -> list:
+    # PBKDF2 (hashlib) libera el GIL: los hilos calculan los hashes en paralelo
+    if workers <= 1 or len(passwords) < 2:
+        return [make_password(p) for p in passwords]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash') as pool:
+        return list(pool.map(make_password, passwords))
+
+
+def _save_chunk(chunk: list, entity, password_mode: str, workers: int) -> list:
+    # chunk = [(línea, fila)] ya validado y sin duplicados. Devuelve [(usuario, token o None)]
+    with_password = [
+        index for index, (_, row) in enumerate(chunk)
+        if password_mode == PASSWORD_HASH and row.get('password')
+    ]
+    hashed = dict(zip(with_password, _hash_passwords([chunk[i][1]['password'] for i in with_password], workers)))
+
+    users = [
+        User(
+            username=row['username'],
+            email=row.get('email', ''),
+            first_name=row.get('first_name', '')[:150],
+            last_name=row.get('last_name', '')[:150],
+            # Contraseña inutilizable (sin coste de hash) hasta aceptar la invitación
+            password=hashed.get(index) or make_password(None),
+        )
+        for index, (_, row) in enumerate(chunk)
+    ]
+    with transaction.atomic():
+        users = User.objects.bulk_create(users)
+        if any(user.pk is None for user in users):
+            # Motores sin RETURNING (MySQL): se recuperan los ids por nombre de usuario
+            ids = dict(User.objects.filter(username__in=[u.username for u in users]).values_list('username', 'pk'))
+            for user in users:
+                user.pk = user.id = ids[user.username]
+        EntityProfile.objects.bulk_create([
+            EntityProfile(user_id=user.pk, entity=entity,
+                          is_manager=row.get('is_manager', '').lower() in TRUE_VALUES)
+            for user, (_, row) in zip(users, chunk)
+        ])
+        expires_at = timezone.now() + timedelta(days=getattr(settings, 'INVITE_TOKEN_TTL_DAYS', 14))
+        tokens, invites = [], []
+        for index, user in enumerate(users):
+            token = None
+            if index not in hashed:
+                token = secrets.token_urlsafe(32)
+                invites.append(InviteToken(user_id=user.pk, token_hash=hash_token(token), expires_at=expires_at))
+            tokens.append(token)
+        InviteToken.objects.bulk_create(invites)
+    return list(zip(users, tokens))
+
+
+def import_candidates(fileobj, entity, chunk_size: int = 1000, password_mode: str = PASSWORD_INVITE,
+                      workers: int = 1, dry_run: bool = False):
+    # Generador: produce un dict por fila ({'line', 'username', 'status', ...}) a medida que se procesa.
+    # status: 'created', 'invalid', 'duplicate' (en el CSV) o 'exists' (ya en la BD)
+    existing = set(User.objects.annotate(lower=Lower('username')).values_list('lower', flat=True))
+    seen = set()
+    chunk = []
+
+    def flush():
+        if dry_run:
+            return [{"line": line, "username": row['username'], "email": row.get('email', ''),
+                     "status": 'created', "invite_url": None} for line, row in chunk]
+        results = []
+        for (line, row), (user, token) in zip(chunk, _save_chunk(chunk, entity, password_mode, workers)):
+            results.append({"line": line, "username": user.username, "email": user.email, "status": 'created',
+                            "invite_url": invite_url(token) if token else None})
+        return results
+
+    for line, row in read_csv(fileobj):
+        error = _validate_row(row)
+        if error:
+            yield {"line": line, "username": row.get('username', ''), "status": 'invalid', "error": error}
+            continue
+        key = row['username'].lower()
+        if key in existing:
+            yield {"line": line, "username": row['username'], "status": 'exists'}
+            continue
+        if key in seen:
+            yield {"line": line, "username": row['username'], "status": 'duplicate'}
+            continue
+        seen.add(key)
+        chunk.append((line, row))
+        if len(chunk) >= chunk_size:
+            yield from flush()
+            chunk = []
+    if chunk:
+        yield from flush()
+
+
+def get_valid_invite(token: str):
+    # Devuelve la invitación vigente (sin usar y sin caducar) o None
+    return (
+        InviteToken.objects.select_related('user')
+        .filter(token_hash=hash_token(token), used_at__isnull=True, expires_at__gt=timezone.now())
+        .first()
+    )
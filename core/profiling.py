@@ -0,0 +1,147 @@
+import io
+import random
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+# Perfilado por muestreo: para una fracción de las peticiones se mide el tiempo en SQL
+# (execute_wrapper en cada conexión), en llamadas HTTP de salida (proveedores de IA) y el
+# resto en Python. Las peticiones lentas se guardan en un buffer circular por proceso.
+_current = ContextVar('request_profile', default=None)
+
+_traces = deque(maxlen=100)
+_traces_lock = threading.Lock()
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class RequestProfile:
+    def __init__(self, max_queries: int):
+        self.max_queries = max_queries
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.queries = []
+        self.upstream = []
+        self._lock = threading.Lock()
+
+    def sql_wrapper(self, alias):
+        def wrapper(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                self.add_query(alias, sql, time.perf_counter() - started)
+        return wrapper
+
+    def add_query(self, alias, sql, seconds):
+        with self._lock:
+            self.sql_count += 1
+            self.sql_seconds += seconds
+            if len(self.queries) < self.max_queries:
+                self.queries.append({"db": alias, "sql": sql[:300], "ms": round(seconds * 1000, 2)})
+
+    def add_upstream(self, label, seconds, call_type=None):
+        # Puede llamarse desde hilos (evaluación por criterios): de ahí el lock
+        with self._lock:
+            self.upstream.append({"target": label, "call_type": call_type, "ms": round(seconds * 1000, 1)})
+
+
+def record_upstream(label: str, seconds: float, call_type: str = None):
+    # Punto de enganche para las llamadas HTTP de salida; no hace nada fuera de una petición muestreada
+    profile = _current.get()
+    if profile is not None:
+        profile.add_upstream(label, seconds, call_type)
+
+
+def should_sample() -> bool:
+    rate = _setting('PROFILER_SAMPLE_RATE', 0.0)
+    return rate > 0 and (rate >= 1 or random.random() < rate)
+
+
+def _store(trace: dict):
+    global _traces
+    size = _setting('PROFILER_BUFFER_SIZE', 100)
+    with _traces_lock:
+        if _traces.maxlen != size:
+            _traces = deque(_traces, maxlen=size)
+        _traces.append(trace)
+
+
+def get_traces(limit: int = None) -> list:
+    # Más recientes primero
+    with _traces_lock:
+        traces = list(reversed(_traces))
+    return traces[:limit] if limit else traces
+
+
+def clear_traces():
+    with _traces_lock:
+        _traces.clear()
+
+
+def _cprofile_text(profiler, lines: int) -> str:
+    import pstats
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).strip_dirs().sort_stats('cumulative').print_stats(lines)
+    return out.getvalue()
+
+
+def profile_request(request, get_response):
+    # Ejecuta la vista midiendo SQL/HTTP/Python y guarda la traza si supera PROFILER_SLOW_MS.
+    # En respuestas en streaming solo se mide hasta devolver la respuesta (no el consumo del iterador)
+    profile = RequestProfile(_setting('PROFILER_MAX_QUERIES', 50))
+    token = _current.set(profile)
+    profiler = None
+    if _setting('PROFILER_CPROFILE', False):
+        # Importación diferida: el middleware se carga en cada arranque y cProfile/pstats casi nunca se usan
+        import cProfile
+        profiler = cProfile.Profile()
+    started = time.perf_counter()
+    try:
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(profile.sql_wrapper(alias)))
+            if profiler:
+                profiler.enable()
+            try:
+                response = get_response(request)
+            finally:
+                if profiler:
+                    profiler.disable()
+    finally:
+        _current.reset(token)
+    total = time.perf_counter() - started
+
+    total_ms = total * 1000
+    if total_ms >= _setting('PROFILER_SLOW_MS', 500):
+        upstream_ms = sum(call["ms"] for call in profile.upstream)
+        sql_ms = profile.sql_seconds * 1000
+        user = getattr(request, 'user', None)
+        match = getattr(request, 'resolver_match', None)
+        _store({
+            "at": time.time(),
+            "method": request.method,
+            "path": request.path,
+            "view": match.view_name if match else None,
+            "status": response.status_code,
+            "user_id": user.pk if user is not None and user.is_authenticated else None,
+            "total_ms": round(total_ms, 1),
+            "sql_ms": round(sql_ms, 1),
+            "sql_count": profile.sql_count,
+            "upstream_ms": round(upstream_ms, 1),
+            "upstream_count": len(profile.upstream),
+            # Lo que queda: Python (vistas, serialización, plantillas) y esperas no instrumentadas.
+            # Las llamadas en paralelo pueden sumar más que el total: entonces queda en 0
+            "python_ms": round(max(0.0, total_ms - sql_ms - upstream_ms), 1),
+            "queries": profile.queries,
+            "upstream": profile.upstream,
+            "cprofile": _cprofile_text(profiler, _setting('PROFILER_CPROFILE_LINES', 30)) if profiler else None,
+        })
+    return response
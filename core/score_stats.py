@@ -0,0 +1,244 @@
+import math
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import transaction
+
+from core.models import CriterionScore, TestExecution
+from core.shared_state import get_state, update_max
+
+# Estadísticas de puntuaciones por cohorte (mismo Test, y opcionalmente misma Entidad).
+# Cada proceso mantiene en memoria, por Test, una matriz columnar: una columna array('d')
+# por criterio (NaN si la ejecución no tiene ese criterio) y una columna con la entidad.
+# Se actualiza de forma incremental leyendo solo las filas de CriterionScore nuevas; las
+# secuencias y generaciones que avisan a los demás procesos van en core.shared_state.
+SEQ_KEY = 'scores:seq:{}'
+GENERATION_KEY = 'scores:generation'
+TEST_GENERATION_KEY = 'scores:generation:{}'
+
+# Histograma de la escala 1..5 (un cubo por punto)
+HISTOGRAM_EDGES = (0.5, 1.5, 2.5, 3.5, 4.5, 5.5)
+
+_cohorts = OrderedDict()
+_lock = threading.Lock()
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+@lru_cache(maxsize=None)
+def _numpy():
+    # numpy es opcional: sin él las estadísticas se calculan con array + bisect.
+    # Se importa al calcular la primera cohorte, no al arrancar (~70 ms por worker y comando)
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def extract_scores(evaluation_result) -> dict:
+    # Puntuaciones numéricas válidas de un resultado de evaluación
+    if not isinstance(evaluation_result, dict) or 'error' in evaluation_result:
+        return {}
+    scores = evaluation_result.get('scores')
+    if not isinstance(scores, dict):
+        return {}
+    extracted = {}
+    for criterion, score in scores.items():
+        if isinstance(score, str):
+            try:
+                score = float(score.strip())
+            except ValueError:
+                continue
+        if isinstance(score, bool) or not isinstance(score, (int, float)) or not math.isfinite(score):
+            continue
+        extracted[str(criterion)[:100]] = float(score)
+    return extracted
+
+
+def build_rows(execution: TestExecution) -> list:
+    return [
+        CriterionScore(execution_id=execution.pk, test_id=execution.test_id, entity_id=execution.entity_id,
+                       criterion=criterion, score=score)
+        for criterion, score in extract_scores(execution.evaluation_result).items()
+    ]
+
+
+def record_evaluation(execution: TestExecution):
+    # Sustituye las puntuaciones de la ejecución y avisa a los procesos de que hay filas nuevas
+    rows = build_rows(execution)
+    with transaction.atomic():
+        replaced, _ = CriterionScore.objects.filter(execution_id=execution.pk).delete()
+        rows = CriterionScore.objects.bulk_create(rows)
+    # En SQLite/PostgreSQL bulk_create devuelve los ids; sin ids se fuerza la lectura incremental
+    last_id = max((row.pk or 0 for row in rows), default=0)
+    transaction.on_commit(lambda: bump_sequence(execution.test_id, last_id))
+    if replaced:
+        # Reevaluación: la lectura incremental no ve las filas borradas, se recarga la cohorte del Test
+        transaction.on_commit(lambda: bump_generation(execution.test_id))
+
+
+def bump_sequence(test_id, last_id):
+    key = SEQ_KEY.format(test_id)
+    if last_id:
+        update_max(key, last_id)
+    else:
+        get_state().delete(key)
+
+
+def bump_generation(test_id=None):
+    # Tras una reconstrucción completa (o de un Test), los procesos recargan sus cohortes
+    get_state().incr(GENERATION_KEY if test_id is None else TEST_GENERATION_KEY.format(test_id))
+
+
+class Cohort:
+    # Matriz columnar de las puntuaciones de un Test (una fila por ejecución evaluada).
+    # Cada cohorte tiene su propio lock: cargar un Test no bloquea las consultas de los demás
+    def __init__(self, test_id, generation):
+        self.test_id = test_id
+        self.generation = generation
+        self.lock = threading.Lock()
+        self.loaded = False
+        self.last_id = 0
+        self.rows = {}
+        self.entities = array('q')
+        self.columns = {}
+        # Valores ordenados por (criterio, entidad); se descartan al leer filas nuevas
+        self._sorted = {}
+
+    def _row(self, execution_id, entity_id) -> int:
+        row = self.rows.get(execution_id)
+        if row is None:
+            row = self.rows[execution_id] = len(self.entities)
+            self.entities.append(entity_id)
+            for column in self.columns.values():
+                column.append(math.nan)
+        return row
+
+    def load(self):
+        # Lee solo las filas posteriores a la última cargada (con self.lock adquirido)
+        new_rows = (
+            CriterionScore.objects.filter(test_id=self.test_id, pk__gt=self.last_id)
+            .order_by('pk').values_list('pk', 'execution_id', 'entity_id', 'criterion', 'score')
+        )
+        for pk, execution_id, entity_id, criterion, score in new_rows.iterator(chunk_size=2000):
+            row = self._row(execution_id, entity_id)
+            column = self.columns.get(criterion)
+            if column is None:
+                column = self.columns[criterion] = array('d', [math.nan]) * len(self.entities)
+            column[row] = score
+            self.last_id = pk
+            self._sorted.clear()
+        self.loaded = True
+
+    def refresh(self, seq):
+        # Carga inicial, o lectura incremental si hay filas nuevas o la secuencia es desconocida
+        with self.lock:
+            if not self.loaded or seq is None or seq > self.last_id:
+                self.load()
+
+    def _sorted_values(self, criterion, entity_id):
+        column = self.columns.get(criterion)
+        if column is None:
+            return ()
+        numpy = _numpy()
+        if numpy is None:
+            if entity_id is None:
+                return tuple(sorted(v for v in column if v == v))
+            return tuple(sorted(v for v, e in zip(column, self.entities) if e == entity_id and v == v))
+        # numpy.array copia el array: ninguna vista del buffer sobrevive al lock (load() lo amplía)
+        data = numpy.array(column, dtype=numpy.float64)
+        mask = ~numpy.isnan(data)
+        if entity_id is not None:
+            mask &= numpy.array(self.entities, dtype=numpy.int64) == entity_id
+        values = numpy.sort(data[mask])
+        # Compartido entre peticiones: de solo lectura
+        values.flags.writeable = False
+        return values
+
+    def values(self, criterion, entity_id=None):
+        key = (criterion, entity_id)
+        with self.lock:
+            values = self._sorted.get(key)
+            if values is None:
+                values = self._sorted[key] = self._sorted_values(criterion, entity_id)
+            return values
+
+
+def get_cohort(test_id) -> Cohort:
+    keys = get_state().get_many([GENERATION_KEY, TEST_GENERATION_KEY.format(test_id), SEQ_KEY.format(test_id)])
+    generation = (keys.get(GENERATION_KEY, 0), keys.get(TEST_GENERATION_KEY.format(test_id), 0))
+    seq = keys.get(SEQ_KEY.format(test_id))
+    # El lock del módulo solo protege el diccionario; la lectura de la BD va con el lock de la cohorte
+    with _lock:
+        cohort = _cohorts.get(test_id)
+        if cohort is None or cohort.generation != generation:
+            cohort = _cohorts[test_id] = Cohort(test_id, generation)
+        _cohorts.move_to_end(test_id)
+        while len(_cohorts) > _setting('SCORE_COHORT_CACHE_SIZE', 128):
+            _cohorts.popitem(last=False)
+    cohort.refresh(seq)
+    if seq is None:
+        get_state().add(SEQ_KEY.format(test_id), cohort.last_id)
+    return cohort
+
+
+def describe(values, score: float) -> dict:
+    # Percentil (rango percentil: % por debajo + mitad de los empates), z-score e histograma
+    size = len(values)
+    if size < _setting('SCORE_COHORT_MIN_SIZE', 5):
+        # Cohortes pequeñas no se publican: permitirían deducir puntuaciones individuales
+        return {"size": size}
+    numpy = _numpy()
+    if numpy is not None:
+        below = int(numpy.searchsorted(values, score, side='left'))
+        equal = int(numpy.searchsorted(values, score, side='right')) - below
+        mean = float(values.mean())
+        std = float(values.std())
+        histogram = numpy.histogram(values, bins=HISTOGRAM_EDGES)[0].tolist()
+    else:
+        below = bisect_left(values, score)
+        equal = bisect_right(values, score) - below
+        mean = math.fsum(values) / size
+        std = math.sqrt(math.fsum((v - mean) ** 2 for v in values) / size)
+        histogram = [
+            bisect_left(values, HISTOGRAM_EDGES[i + 1]) - bisect_left(values, HISTOGRAM_EDGES[i])
+            for i in range(len(HISTOGRAM_EDGES) - 1)
+        ]
+    return {
+        "size": size,
+        "percentile": round(100.0 * (below + 0.5 * equal) / size, 1),
+        "mean": round(mean, 3),
+        "std": round(std, 3),
+        "z_score": round((score - mean) / std, 3) if std else 0.0,
+        "histogram": histogram,
+    }
+
+
+def cohort_for(execution: TestExecution) -> dict:
+    # Comparación de cada criterio de la ejecución con su Entidad y con todo el Test
+    scores = extract_scores(execution.evaluation_result)
+    if not scores:
+        return {}
+    cohort = get_cohort(execution.test_id)
+    return {
+        criterion: {
+            "score": score,
+            "entity": describe(cohort.values(criterion, execution.entity_id), score),
+            "test": describe(cohort.values(criterion), score),
+        }
+        for criterion, score in scores.items()
+    }
+
+
+def version(test_id) -> str:
+    # Versión de las cohortes de un Test (para validadores de cache HTTP)
+    keys = get_state().get_many([GENERATION_KEY, TEST_GENERATION_KEY.format(test_id), SEQ_KEY.format(test_id)])
+    return (f"{keys.get(GENERATION_KEY, 0)}.{keys.get(TEST_GENERATION_KEY.format(test_id), 0)}."
+            f"{keys.get(SEQ_KEY.format(test_id)) or 0}")
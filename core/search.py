@@ -0,0 +1,166 @@
+from django.db import connection
+from django.db.models import F, Q, Value
+from django.db.models.functions import Concat
+
+from core.models import ExecutionSearchDocument, TestExecution
+
+# Búsqueda de texto completo sobre transcripciones y evaluaciones.
+# - PostgreSQL: columna generada tsvector (evaluación con peso A, transcripción B) + índice GIN
+# - SQLite: tabla virtual FTS5 sincronizada por triggers
+# Ambas estructuras se crean en la migración 0003. Nota: si una migración futura
+# reconstruye core_executionsearchdocument en SQLite hay que recrear los triggers.
+FTS_TABLE = 'core_executionsearch_fts'
+DOC_TABLE = ExecutionSearchDocument._meta.db_table
+
+
+def _format_turns(messages) -> str:
+    return ''.join(f"{m.get('role', '')}: {m.get('content', '')}\n" for m in messages if isinstance(m, dict))
+
+
+def _format_evaluation(result) -> str:
+    if not isinstance(result, dict) or 'error' in result:
+        return ''
+    parts = [str(result.get(key) or '') for key in ('summary', 'feedback')]
+    return '\n'.join(p for p in parts if p)
+
+
+def append_turns(execution: TestExecution, messages: list):
+    # Indexado incremental: solo se concatena el texto de los mensajes nuevos
+    if not messages:
+        return
+    updated = ExecutionSearchDocument.objects.filter(execution_id=execution.pk).update(
+        transcript=Concat(F('transcript'), Value(_format_turns(messages))),
+        indexed_turns=F('indexed_turns') + len(messages),
+    )
+    if not updated:
+        index_execution(execution)
+
+
+def index_evaluation(execution: TestExecution):
+    updated = ExecutionSearchDocument.objects.filter(execution_id=execution.pk).update(
+        evaluation=_format_evaluation(execution.evaluation_result),
+    )
+    if not updated:
+        index_execution(execution)
+
+
+def build_document(execution: TestExecution) -> ExecutionSearchDocument:
+    chat_log = execution.chat_log or []
+    return ExecutionSearchDocument(
+        execution_id=execution.pk,
+        entity_id=execution.entity_id,
+        transcript=_format_turns(chat_log),
+        evaluation=_format_evaluation(execution.evaluation_result),
+        indexed_turns=len(chat_log),
+    )
+
+
+def index_execution(execution: TestExecution):
+    # (Re)indexa la ejecución completa
+    doc = build_document(execution)
+    ExecutionSearchDocument.objects.update_or_create(
+        execution_id=doc.execution_id,
+        defaults={
+            'entity_id': doc.entity_id,
+            'transcript': doc.transcript,
+            'evaluation': doc.evaluation,
+            'indexed_turns': doc.indexed_turns,
+        },
+    )
+
+
+def _fts5_query(query: str) -> str:
+    # Cada término entre comillas: evita errores de sintaxis de FTS5 con la entrada del usuario
+    return ' '.join('"{}"'.format(term.replace('"', '""')) for term in query.split())
+
+
+def _search_postgresql(query, entity_id, offset, limit):
+    entity_sql = "AND d.entity_id = %s" if entity_id else ""
+    params = [query] + ([entity_id] if entity_id else [])
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT count(*) FROM {DOC_TABLE} d
+            WHERE d.search_vector @@ websearch_to_tsquery('spanish', %s) {entity_sql}
+        """, params)
+        total = cursor.fetchone()[0]
+        cursor.execute(f"""
+            SELECT d.execution_id,
+                   ts_rank(d.search_vector, q.query) AS rank,
+                   ts_headline('spanish', d.evaluation || ' ' || d.transcript, q.query,
+                               'MaxWords=25, MinWords=8, MaxFragments=2') AS snippet
+            FROM {DOC_TABLE} d, websearch_to_tsquery('spanish', %s) AS q(query)
+            WHERE d.search_vector @@ q.query {entity_sql}
+            ORDER BY rank DESC, d.execution_id DESC
+            LIMIT %s OFFSET %s
+        """, params + [limit, offset])
+        return total, cursor.fetchall()
+
+
+def _search_sqlite(query, entity_id, offset, limit):
+    match = _fts5_query(query)
+    if not match:
+        return 0, []
+    entity_sql = "AND d.entity_id = %s" if entity_id else ""
+    params = [match] + ([entity_id] if entity_id else [])
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT count(*) FROM {FTS_TABLE} f JOIN {DOC_TABLE} d ON d.execution_id = f.rowid
+            WHERE {FTS_TABLE} MATCH %s {entity_sql}
+        """, params)
+        total = cursor.fetchone()[0]
+        # bm25: menor es mejor; la evaluación pesa el doble que la transcripción
+        cursor.execute(f"""
+            SELECT f.rowid, -bm25({FTS_TABLE}, 1.0, 2.0) AS rank,
+                   snippet({FTS_TABLE}, -1, '[', ']', '…', 16) AS snippet
+            FROM {FTS_TABLE} f JOIN {DOC_TABLE} d ON d.execution_id = f.rowid
+            WHERE {FTS_TABLE} MATCH %s {entity_sql}
+            ORDER BY rank DESC, f.rowid DESC
+            LIMIT %s OFFSET %s
+        """, params + [limit, offset])
+        return total, cursor.fetchall()
+
+
+def _search_fallback(query, entity_id, offset, limit):
+    # Motores sin índice de texto: coincidencia de todos los términos, sin ranking
+    condition = Q()
+    for term in query.split():
+        condition &= Q(transcript__icontains=term) | Q(evaluation__icontains=term)
+    docs = ExecutionSearchDocument.objects.filter(condition)
+    if entity_id:
+        docs = docs.filter(entity_id=entity_id)
+    total = docs.count()
+    rows = docs.order_by('-execution_id').values_list('execution_id', 'evaluation')[offset:offset + limit]
+    return total, [(pk, 0.0, evaluation[:200]) for pk, evaluation in rows]
+
+
+def search_executions(query: str, entity_id=None, offset: int = 0, limit: int = 20) -> tuple:
+    # Devuelve (total, resultados ordenados por relevancia)
+    query = (query or '').strip()
+    if not query:
+        return 0, []
+
+    backend = {
+        'postgresql': _search_postgresql,
+        'sqlite': _search_sqlite,
+    }.get(connection.vendor, _search_fallback)
+    total, rows = backend(query, entity_id, offset, limit)
+
+    executions = TestExecution.objects.select_related('test', 'user', 'entity').only(
+        'id', 'start_time', 'finish_time', 'test__name', 'user__username', 'entity__name',
+    ).in_bulk([row[0] for row in rows])
+    results = []
+    for pk, rank, snippet in rows:
+        ex = executions.get(pk)
+        if ex is None:
+            continue
+        results.append({
+            "execution_id": pk,
+            "username": ex.user.username,
+            "test": ex.test.name,
+            "entity": ex.entity.name,
+            "start_time": ex.start_time,
+            "finish_time": ex.finish_time,
+            "rank": round(float(rank), 4),
+            "snippet": snippet,
+        })
+    return total, results
@@ -0,0 +1,279 @@
+import os
+import pickle
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils.module_loading import import_string
+
+# Estado compartido entre workers (contadores, claves con TTL y compare-and-set) con backend
+# intercambiable según el despliegue (settings.SHARED_STATE):
+#   'local' -> en memoria del proceso (un solo worker, pruebas)
+#   'shm'   -> SQLite sobre tmpfs (/dev/shm): todos los procesos del mismo host, sin servicios extra
+#   'cache' -> cache de Django: compartido entre hosts si la cache lo es (Redis/Memcached)
+# ttl en segundos; None = sin caducidad. incr no renueva el TTL de una clave existente.
+# Cada backend indica en 'shared' si lo que guarda lo ven los demás procesos.
+BACKENDS = {
+    'local': 'core.shared_state.LocalBackend',
+    'shm': 'core.shared_state.SharedMemoryBackend',
+    'cache': 'core.shared_state.CacheBackend',
+}
+
+_state = None
+_state_lock = threading.Lock()
+
+
+class LocalBackend:
+    shared = False
+
+    def __init__(self, options: dict):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        item = self._data.get(key)
+        if item is not None and item[1] is not None and item[1] <= time.monotonic():
+            del self._data[key]
+            return None
+        return item
+
+    def _expiry(self, ttl):
+        return time.monotonic() + ttl if ttl is not None else None
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._get(key)
+        return item[0] if item is not None else default
+
+    def get_many(self, keys) -> dict:
+        with self._lock:
+            items = {key: self._get(key) for key in keys}
+        return {key: item[0] for key, item in items.items() if item is not None}
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (value, self._expiry(ttl))
+
+    def add(self, key, value, ttl=None) -> bool:
+        with self._lock:
+            if self._get(key) is not None:
+                return False
+            self._data[key] = (value, self._expiry(ttl))
+            return True
+
+    def incr(self, key, delta=1, ttl=None) -> int:
+        with self._lock:
+            item = self._get(key)
+            if item is None:
+                item = (0, self._expiry(ttl))
+            value = item[0] + delta
+            self._data[key] = (value, item[1])
+            return value
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def compare_and_set(self, key, expected, value, ttl=None) -> bool:
+        # expected=None: solo si la clave no existe
+        with self._lock:
+            item = self._get(key)
+            if (item[0] if item is not None else None) != expected:
+                return False
+            self._data[key] = (value, self._expiry(ttl))
+            return True
+
+
+class SharedMemoryBackend:
+    # Una base SQLite en tmpfs: las operaciones de lectura-modificación-escritura van en
+    # transacciones BEGIN IMMEDIATE (un escritor a la vez), así que son atómicas entre procesos
+    PURGE_EVERY = 1000
+    # Límite de parámetros por consulta en get_many
+    CHUNK_SIZE = 500
+    shared = True
+
+    def __init__(self, options: dict):
+        directory = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+        self.path = options.get('PATH') or os.path.join(directory, 'testeador-state.sqlite3')
+        self._local = threading.local()
+        self._writes = 0
+        with self._transaction() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value BLOB, expires REAL)")
+
+    def _db(self):
+        db = getattr(self._local, 'db', None)
+        # Tras un fork la conexión heredada no es válida en el hijo
+        if db is None or self._local.pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=OFF")
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return db
+
+    @contextmanager
+    def _transaction(self):
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    def _read(self, db, key):
+        # Devuelve (valor, expires) o None si no existe o ha caducado (wall clock: compartido entre procesos)
+        row = db.execute("SELECT value, expires FROM state WHERE key = ?", (key,)).fetchone()
+        if row is None or (row[1] is not None and row[1] <= time.time()):
+            return None
+        return pickle.loads(row[0]), row[1]
+
+    def _write(self, db, key, value, expires):
+        db.execute("INSERT OR REPLACE INTO state (key, value, expires) VALUES (?, ?, ?)",
+                   (key, pickle.dumps(value), expires))
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            db.execute("DELETE FROM state WHERE expires IS NOT NULL AND expires <= ?", (time.time(),))
+
+    def _expiry(self, ttl):
+        return time.time() + ttl if ttl is not None else None
+
+    def get(self, key, default=None):
+        item = self._read(self._db(), key)
+        return item[0] if item is not None else default
+
+    def get_many(self, keys) -> dict:
+        keys = list(keys)
+        found = {}
+        now = time.time()
+        db = self._db()
+        for start in range(0, len(keys), self.CHUNK_SIZE):
+            chunk = keys[start:start + self.CHUNK_SIZE]
+            rows = db.execute(
+                f"SELECT key, value, expires FROM state WHERE key IN ({', '.join('?' * len(chunk))})", chunk,
+            )
+            found.update((key, pickle.loads(value)) for key, value, expires in rows
+                         if expires is None or expires > now)
+        return found
+
+    def set(self, key, value, ttl=None):
+        with self._transaction() as db:
+            self._write(db, key, value, self._expiry(ttl))
+
+    def add(self, key, value, ttl=None) -> bool:
+        with self._transaction() as db:
+            if self._read(db, key) is not None:
+                return False
+            self._write(db, key, value, self._expiry(ttl))
+            return True
+
+    def incr(self, key, delta=1, ttl=None) -> int:
+        with self._transaction() as db:
+            item = self._read(db, key) or (0, self._expiry(ttl))
+            value = item[0] + delta
+            self._write(db, key, value, item[1])
+            return value
+
+    def delete(self, key):
+        self._db().execute("DELETE FROM state WHERE key = ?", (key,))
+
+    def compare_and_set(self, key, expected, value, ttl=None) -> bool:
+        with self._transaction() as db:
+            item = self._read(db, key)
+            if (item[0] if item is not None else None) != expected:
+                return False
+            self._write(db, key, value, self._expiry(ttl))
+            return True
+
+
+class CacheBackend:
+    # add/incr son atómicos en Redis y Memcached. La cache de Django no tiene compare-and-set:
+    # se serializa con un cerrojo (add de una clave auxiliar de vida corta)
+    LOCK_TIMEOUT = 5
+    LOCK_WAIT = 0.2
+
+    def __init__(self, options: dict):
+        self.cache = caches[options.get('CACHE', 'default')]
+        self.prefix = options.get('PREFIX', 'state:')
+        self.shared = cache_is_shared(self.cache)
+
+    def get(self, key, default=None):
+        return self.cache.get(self.prefix + key, default)
+
+    def get_many(self, keys) -> dict:
+        found = self.cache.get_many([self.prefix + key for key in keys])
+        return {key[len(self.prefix):]: value for key, value in found.items()}
+
+    def set(self, key, value, ttl=None):
+        self.cache.set(self.prefix + key, value, ttl)
+
+    def add(self, key, value, ttl=None) -> bool:
+        return self.cache.add(self.prefix + key, value, ttl)
+
+    def incr(self, key, delta=1, ttl=None) -> int:
+        key = self.prefix + key
+        self.cache.add(key, 0, ttl)
+        try:
+            return self.cache.incr(key, delta)
+        except ValueError:
+            # La clave caducó o fue desalojada entre add e incr
+            self.cache.set(key, delta, ttl)
+            return delta
+
+    def delete(self, key):
+        self.cache.delete(self.prefix + key)
+
+    def compare_and_set(self, key, expected, value, ttl=None) -> bool:
+        lock = f"{self.prefix}lock:{key}"
+        deadline = time.monotonic() + self.LOCK_WAIT
+        while not self.cache.add(lock, 1, self.LOCK_TIMEOUT):
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.001)
+        try:
+            if self.cache.get(self.prefix + key) != expected:
+                return False
+            self.cache.set(self.prefix + key, value, ttl)
+            return True
+        finally:
+            self.cache.delete(lock)
+
+
+def cache_is_shared(cache=None) -> bool:
+    # La cache en memoria local (y la nula) es de cada proceso: con varios workers no se comparte
+    cache = cache if cache is not None else caches['default']
+    return not isinstance(cache, (LocMemCache, DummyCache))
+
+
+def create_backend(name: str, options: dict = None):
+    return import_string(BACKENDS.get(name, name))(options or {})
+
+
+def get_state():
+    # Backend configurado en settings.SHARED_STATE (por defecto la cache de Django)
+    global _state
+    if _state is None:
+        with _state_lock:
+            if _state is None:
+                config = getattr(settings, 'SHARED_STATE', {})
+                _state = create_backend(config.get('BACKEND', 'cache'), config.get('OPTIONS'))
+    return _state
+
+
+def update_max(key, value, ttl=None) -> bool:
+    # Guarda value si supera el máximo actual (reintenta si otro worker escribió a la vez)
+    state = get_state()
+    for _ in range(5):
+        current = state.get(key)
+        if current is not None and current >= value:
+            return False
+        if state.compare_and_set(key, current, value, ttl):
+            return True
+    return False
@@ -0,0 +1,34 @@
+from django.contrib.auth.models import User
+from django.contrib.auth.signals import user_logged_out
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.auth_cache import invalidate_user, invalidate_users
+from core.models import Entity, EntityProfile
+
+
+# Invalidación de la cache de autenticación (ver core.auth_cache)
+@receiver(user_logged_out)
+def _invalidate_on_logout(sender, request, user, **kwargs):
+    if user is not None:
+        invalidate_user(user.pk)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def _invalidate_on_user_change(sender, instance, **kwargs):
+    # Cubre cambio de contraseña, desactivación, permisos y last_login
+    invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=EntityProfile)
+@receiver(post_delete, sender=EntityProfile)
+def _invalidate_on_profile_change(sender, instance, **kwargs):
+    invalidate_user(instance.user_id)
+
+
+@receiver(post_save, sender=Entity)
+def _invalidate_on_entity_change(sender, instance, created, **kwargs):
+    # La entidad viaja dentro del usuario cacheado
+    if not created:
+        invalidate_users(instance.users.values_list('user_id', flat=True))
@@ -0,0 +1,94 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+
+from core import minhash
+from core.models import AnswerBucket, AnswerSignature, TestExecution
+
+# Detección de respuestas casi duplicadas entre ejecuciones de la misma Entidad.
+# Cada respuesta del usuario se guarda como firma MinHash con 16 claves LSH; la búsqueda
+# solo compara contra las respuestas que comparten alguna clave (consulta por índice).
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def build_rows(execution: TestExecution, hashed: list) -> tuple:
+    # hashed = [(posición, firma, claves LSH)] -> (firmas, cubos) sin guardar
+    signatures, buckets = [], []
+    for position, sig, keys in hashed:
+        signature = AnswerSignature(execution_id=execution.pk, entity_id=execution.entity_id,
+                                    user_id=execution.user_id, position=position, signature=sig)
+        signatures.append(signature)
+        buckets.append((signature, keys))
+    return signatures, buckets
+
+
+def save_rows(signatures: list, buckets: list):
+    with transaction.atomic():
+        AnswerSignature.objects.bulk_create(signatures)
+        AnswerBucket.objects.bulk_create([
+            AnswerBucket(signature_id=signature.pk, entity_id=signature.entity_id, key=key)
+            for signature, keys in buckets
+            for key in keys
+        ], batch_size=1000)
+
+
+def index_turns(execution: TestExecution, messages: list, start_position: int):
+    # Indexa las respuestas del usuario de los mensajes nuevos (las cortas se ignoran)
+    min_words = _setting('SIMILARITY_MIN_WORDS', 12)
+    hashed = []
+    for offset, message in enumerate(messages):
+        if not isinstance(message, dict) or message.get('role') != 'user':
+            continue
+        result = minhash.hash_answer(str(message.get('content') or ''), min_words)
+        if result is not None:
+            hashed.append((start_position + offset, *result))
+    if hashed:
+        save_rows(*build_rows(execution, hashed))
+
+
+def find_similar(execution: TestExecution) -> list:
+    # Respuestas de otros usuarios de la Entidad con similitud estimada >= SIMILARITY_THRESHOLD
+    own = {
+        position: minhash.from_bytes(sig)
+        for position, sig in AnswerSignature.objects.filter(execution_id=execution.pk)
+        .values_list('position', 'signature')
+    }
+    if not own:
+        return []
+
+    keys = defaultdict(set)
+    for position, sig in own.items():
+        for key in minhash.band_keys(sig):
+            keys[key].add(position)
+
+    candidates = defaultdict(set)
+    for key, signature_id in (
+        AnswerBucket.objects.filter(entity_id=execution.entity_id, key__in=list(keys))
+        .exclude(signature__execution_id=execution.pk)
+        .values_list('key', 'signature_id')
+    ):
+        candidates[signature_id] |= keys[key]
+
+    threshold = _setting('SIMILARITY_THRESHOLD', 0.6)
+    flags = []
+    for signature_id, execution_id, user_id, position, sig in (
+        AnswerSignature.objects.filter(pk__in=list(candidates)).exclude(user_id=execution.user_id)
+        .values_list('pk', 'execution_id', 'user_id', 'position', 'signature')
+    ):
+        other = minhash.from_bytes(sig)
+        for own_position in candidates[signature_id]:
+            score = minhash.similarity(own[own_position], other)
+            if score >= threshold:
+                flags.append({
+                    "position": own_position,
+                    "execution_id": execution_id,
+                    "user_id": user_id,
+                    "other_position": position,
+                    "similarity": round(score, 3),
+                })
+    flags.sort(key=lambda flag: (flag["position"], -flag["similarity"], flag["execution_id"]))
+    return flags
@@ -1,3 +1,205 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core import auth_cache
+from core.archive import archive_execution, available_codecs, rehydrate, rehydrate_many
+from core.input_guards import (
+    POLICY_TRUNCATE,
+    TRUNCATION_MARK,
+    InputTooLarge,
+    get_counters,
+    guard_conversation,
+    guard_message,
+    guard_prompt,
+)
+from core.models import Entity, EntityProfile, InviteToken, Test, TestExecution
+from core.onboarding import hash_token
+
+
+class AuthCacheTests(TestCase):
+    # Usuario resuelto desde cache (core.auth_cache) e invalidación por señales
+    def setUp(self):
+        cache.clear()
+        self.entity = Entity.objects.create(name='Entidad', contact_email='e@example.com')
+        self.user = User.objects.create_user('candidato', password='clave-segura-1')
+        EntityProfile.objects.create(user=self.user, entity=self.entity)
+        self.client.force_login(self.user)
+        self.key = auth_cache._cache_key(self.user.pk)
+        # La cache local de los tests hace de cache compartida
+        patcher = mock.patch('core.auth_cache.cache_is_shared', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_user_is_cached_after_request(self):
+        self.assertEqual(self.client.get(reverse('dashboard')).status_code, 200)
+        self.assertEqual(cache.get(self.key).pk, self.user.pk)
+
+    def test_password_change_invalidates_cached_user(self):
+        self.client.get(reverse('dashboard'))
+        self.user.set_password('otra-clave-segura-2')
+        self.user.save()
+        self.assertIsNone(cache.get(self.key))
+        # El hash de la sesión ya no coincide: la sesión se cierra
+        self.assertEqual(self.client.get(reverse('dashboard')).status_code, 302)
+
+    def test_deactivation_invalidates_cached_user(self):
+        self.client.get(reverse('dashboard'))
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(reverse('dashboard')).status_code, 302)
+
+    def test_entity_change_invalidates_cached_user(self):
+        self.client.get(reverse('dashboard'))
+        self.entity.name = 'Entidad renombrada'
+        self.entity.save()
+        self.assertIsNone(cache.get(self.key))
+
+    def test_logout_invalidates_cached_user(self):
+        self.client.get(reverse('dashboard'))
+        self.client.get(reverse('logout'))
+        self.assertIsNone(cache.get(self.key))
+
+    def test_not_cached_without_shared_cache(self):
+        with mock.patch('core.auth_cache.cache_is_shared', return_value=False):
+            self.assertEqual(self.client.get(reverse('dashboard')).status_code, 200)
+        self.assertIsNone(cache.get(self.key))
+
+
+class InviteTests(TestCase):
+    # Invitaciones de un solo uso (alta por CSV)
+    def setUp(self):
+        self.user = User.objects.create_user('invitado')
+        self.user.set_unusable_password()
+        self.user.save()
+        self.token = 'token-de-prueba'
+        self.invite = InviteToken.objects.create(
+            user=self.user, token_hash=hash_token(self.token), expires_at=timezone.now() + timedelta(days=1),
+        )
+        self.url = reverse('invite', args=[self.token])
+        self.data = {'password': 'Contrasena-Segura-123', 'password_confirm': 'Contrasena-Segura-123'}
+
+    def test_invite_sets_password_and_is_consumed(self):
+        response = self.client.post(self.url, self.data)
+        self.assertRedirects(response, reverse('dashboard'), fetch_redirect_response=False)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password(self.data['password']))
+        self.invite.refresh_from_db()
+        self.assertIsNotNone(self.invite.used_at)
+
+    def test_invite_cannot_be_used_twice(self):
+        self.client.post(self.url, self.data)
+        self.client.logout()
+        response = self.client.post(self.url, {'password': 'Otra-Clave-456', 'password_confirm': 'Otra-Clave-456'})
+        self.assertEqual(response.status_code, 404)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password(self.data['password']))
+
+    def test_invite_consumed_concurrently_is_rejected(self):
+        # Otra petición consume la invitación entre la lectura y el UPDATE condicional
+        original = InviteToken.objects.select_related('user').get(pk=self.invite.pk)
+        InviteToken.objects.filter(pk=self.invite.pk).update(used_at=timezone.now())
+        with mock.patch('core.views.get_valid_invite', return_value=original):
+            response = self.client.post(self.url, self.data)
+        self.assertEqual(response.status_code, 404)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.has_usable_password())
+
+    def test_expired_invite_is_rejected(self):
+        InviteToken.objects.filter(pk=self.invite.pk).update(expires_at=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+@override_settings(INPUT_MAX_MESSAGE_TOKENS=10, INPUT_MAX_CONVERSATION_TOKENS=30, INPUT_MAX_PROMPT_TOKENS=20,
+                   INPUT_CHARS_PER_TOKEN=4)
+class InputGuardTests(TestCase):
+    # Límites de tamaño de la entrada con las políticas 'reject' y 'truncate'
+    def setUp(self):
+        cache.clear()
+        self.entity = Entity.objects.create(name='Entidad', contact_email='e@example.com')
+
+    def test_short_message_passes(self):
+        self.assertEqual(guard_message('hola', self.entity), ('hola', False))
+
+    def test_reject_policy_raises_and_counts(self):
+        with self.assertRaises(InputTooLarge) as ctx:
+            guard_message('palabra ' * 10, self.entity)
+        self.assertEqual(ctx.exception.limit, 10)
+        self.assertEqual(get_counters(self.entity)['message']['rejected']['count'], 1)
+
+    def test_truncate_policy_cuts_at_word_boundary(self):
+        self.entity.oversize_policy = POLICY_TRUNCATE
+        text = 'palabra ' * 10
+        kept, truncated = guard_message(text, self.entity)
+        self.assertTrue(truncated)
+        self.assertTrue(kept.endswith(TRUNCATION_MARK))
+        self.assertLessEqual(len(kept), 10 * 4)
+        self.assertTrue(kept[:-len(TRUNCATION_MARK)].endswith('palabra'))
+        self.assertEqual(get_counters(self.entity)['message']['truncated']['count'], 1)
+
+    @override_settings(INPUT_OVERSIZE_POLICY=POLICY_TRUNCATE)
+    def test_truncate_policy_from_settings(self):
+        self.assertTrue(guard_message('x' * 100, None)[1])
+
+    def test_entity_limit_overrides_settings(self):
+        self.entity.max_message_tokens = 100
+        self.assertEqual(guard_message('palabra ' * 10, self.entity)[1], False)
+
+    def test_conversation_limit_is_always_rejected(self):
+        self.entity.oversize_policy = POLICY_TRUNCATE
+        chat_log = [{'role': 'user', 'content': 'x' * 200}]
+        with self.assertRaises(InputTooLarge):
+            guard_conversation(chat_log, 'hola', self.entity)
+
+    def test_prompt_limit_is_always_rejected(self):
+        self.entity.oversize_policy = POLICY_TRUNCATE
+        with self.assertRaises(InputTooLarge):
+            guard_prompt({'ai_prompt_instructions': 'x' * 100, 'evaluation_criteria': {}}, self.entity)
+
+
+class ArchiveTests(TestCase):
+    # Archivado en frío de chat_log/evaluation_result y rehidratación
+    def setUp(self):
+        self.user = User.objects.create_user('candidato')
+        self.entity = Entity.objects.create(name='Entidad', contact_email='e@example.com')
+        self.test = Test.objects.create(name='Test', purpose='p', ai_prompt_instructions='x',
+                                        evaluation_criteria={'a': 'b'}, creator=self.user)
+        self.chat_log = [{'role': 'assistant', 'content': 'Hola, ¿qué tal?'}, {'role': 'user', 'content': 'Bien ñ'}]
+        self.result = {'scores': {'a': 4}, 'summary': 'Correcto'}
+
+    def _execution(self):
+        return TestExecution.objects.create(test=self.test, user=self.user, entity=self.entity,
+                                            chat_log=self.chat_log, evaluation_result=self.result,
+                                            finish_time=timezone.now())
+
+    def test_round_trip_with_every_codec(self):
+        for codec in available_codecs():
+            with self.subTest(codec=codec):
+                execution = self._execution()
+                archive_execution(execution, codec=codec)
+                stored = TestExecution.objects.get(pk=execution.pk)
+                self.assertEqual(stored.chat_log, [])
+                self.assertIsNone(stored.evaluation_result)
+                self.assertIsNotNone(stored.archived_at)
+                rehydrate(stored)
+                self.assertEqual(stored.chat_log, self.chat_log)
+                self.assertEqual(stored.evaluation_result, self.result)
+
+    def test_rehydrate_many_mixes_archived_and_live(self):
+        archived, live = self._execution(), self._execution()
+        archive_execution(archived)
+        executions = rehydrate_many(list(TestExecution.objects.filter(pk__in=[archived.pk, live.pk])))
+        for execution in executions:
+            self.assertEqual(execution.chat_log, self.chat_log)
+            self.assertEqual(execution.evaluation_result, self.result)
+
+    def test_rehydrate_leaves_live_execution_untouched(self):
+        execution = self._execution()
+        with self.assertNumQueries(0):
+            rehydrate(execution)
+        self.assertEqual(execution.chat_log, self.chat_log)
@@ -3,9 +3,16 @@ from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.contrib.auth.models import User
+from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
 from django.views.decorators.http import require_http_methods
 from django.http import HttpResponseForbidden
-from .models import Entity, EntityProfile, TestExecution
+from .archive import rehydrate_many
+from .db_router import replica_reads
+from .models import Entity, EntityProfile, InviteToken, TestExecution
+from .onboarding import get_valid_invite
 
 
 @require_http_methods(["GET", "POST"])
@@ -59,6 +66,44 @@ def register_view(request):
     return render(request, 'core/register.html')
 
 
+@require_http_methods(["GET", "POST"])
+def invite_view(request, token):
+    # Alta de un candidato importado por CSV: elige su contraseña con la invitación de un solo uso
+    invite = get_valid_invite(token)
+    if invite is None:
+        messages.error(request, 'La invitación no es válida o ha caducado.')
+        return render(request, 'core/invite.html', {'invite': None}, status=404)
+
+    if request.method == 'POST':
+        password = request.POST.get('password') or ''
+        if password != (request.POST.get('password_confirm') or ''):
+            messages.error(request, 'Las contraseñas no coinciden.')
+            return render(request, 'core/invite.html', {'invite': invite})
+        try:
+            validate_password(password, user=invite.user)
+        except ValidationError as err:
+            for message in err.messages:
+                messages.error(request, message)
+            return render(request, 'core/invite.html', {'invite': invite})
+
+        # Consumo atómico de la invitación: con un doble envío o peticiones simultáneas solo una la usa
+        with transaction.atomic():
+            consumed = InviteToken.objects.filter(
+                pk=invite.pk, used_at__isnull=True, expires_at__gt=timezone.now(),
+            ).update(used_at=timezone.now())
+            if not consumed:
+                messages.error(request, 'La invitación ya se ha utilizado.')
+                return render(request, 'core/invite.html', {'invite': None}, status=404)
+            user = invite.user
+            user.set_password(password)
+            user.save(update_fields=['password'])
+
+        login(request, user, backend='django.contrib.auth.backends.ModelBackend')
+        return redirect('dashboard')
+
+    return render(request, 'core/invite.html', {'invite': invite})
+
+
 def logout_view(request):
     logout(request)
     return redirect('login')
@@ -71,6 +116,7 @@ def dashboard(request):
 
 @require_http_methods(["GET"])
 @login_required
+@replica_reads
 def export_tests_by_user_html(request):
     # Solo personal con permisos
     if not (request.user.is_staff or request.user.is_superuser):
@@ -94,10 +140,12 @@ def export_tests_by_user_html(request):
             'count': 0,
         })
 
-    executions = TestExecution.objects.filter(user=user).order_by('-start_time')
+    executions = rehydrate_many(list(
+        TestExecution.objects.filter(user=user).select_related('test').order_by('-start_time')
+    ))
     return render(request, 'core/export_user_tests.html', {
         'error': None,
         'username': username,
         'executions': executions,
-        'count': executions.count(),
+        'count': len(executions),
     })
@@ -49,11 +49,18 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Primero, para que el desglose incluya sesión y autenticación (ver core.profiling)
+    'core.middleware.RequestProfilerMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # Compresión de respuestas grandes: brotli para JSON de la API, gzip (con mitigación BREACH) para el resto
+    'core.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # Resuelve usuario + perfil de entidad desde cache (ver core.auth_cache)
+    'core.middleware.CachedAuthenticationMiddleware',
+    # Tras una escritura, el usuario lee de la primaria (ver core.db_router)
+    'core.middleware.ReplicaStickinessMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -92,6 +99,163 @@ DATABASES = {
     }
 }
 
+# Réplica de solo lectura (opcional). Con DB_REPLICA_NAME definido, core.db_router envía
+# a la réplica las lecturas de los listados/exportaciones. En local se puede probar con
+# dos SQLite (DB_REPLICA_MIGRATE=1 para crear el esquema en la segunda).
+if os.environ.get('DB_REPLICA_NAME'):
+    DATABASES['replica'] = {
+        'ENGINE': os.environ.get('DB_REPLICA_ENGINE', DATABASES['default']['ENGINE']),
+        'NAME': os.environ.get('DB_REPLICA_NAME'),
+        'USER': os.environ.get('DB_REPLICA_USER', DATABASES['default']['USER']),
+        'PASSWORD': os.environ.get('DB_REPLICA_PASSWORD', DATABASES['default']['PASSWORD']),
+        'HOST': os.environ.get('DB_REPLICA_HOST', DATABASES['default']['HOST']),
+        'PORT': os.environ.get('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        # En los tests la réplica apunta a la base de datos por defecto
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['core.db_router.ReplicaRouter']
+DATABASE_REPLICA_ALIAS = 'replica'
+# Retraso máximo (s) tolerado antes de volver a leer de la primaria
+DATABASE_REPLICA_MAX_LAG = float(os.environ.get('DB_REPLICA_MAX_LAG', 5))
+# Cada cuántos segundos se comprueba el retraso de la réplica
+DATABASE_REPLICA_CHECK_INTERVAL = 5
+# Segundos que un usuario lee de la primaria tras escribir (read-your-writes)
+DATABASE_REPLICA_STICKY_SECONDS = int(os.environ.get('DB_REPLICA_STICKY_SECONDS', 10))
+DATABASE_REPLICA_MIGRATE = os.environ.get('DB_REPLICA_MIGRATE') == '1'
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Por defecto memoria local; en producción con varios workers usar Redis/Memcached:
+#   CACHE_BACKEND=django.core.cache.backends.redis.RedisCache CACHE_LOCATION=redis://127.0.0.1:6379
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'testeador'),
+    }
+}
+
+# Estado compartido entre workers (core.shared_state): eventos SSE, versiones de estadísticas y
+# ETag, métricas y salud de los proveedores de IA, salud de la réplica, contadores de entradas
+# rechazadas. 'cache' (la cache de arriba; con Redis/Memcached se comparte entre hosts),
+# 'shm' (mismo host, sin servicios) o 'local' (por proceso)
+SHARED_STATE = {
+    'BACKEND': os.environ.get('SHARED_STATE_BACKEND', 'cache'),
+    'OPTIONS': {},
+}
+
+# Sesiones en cache con escritura en BD: la lectura de la sesión no consulta la BD. Solo con una
+# cache compartida: con la memoria local de cada worker, un logout no cerraría la sesión en los demás
+if CACHES['default']['BACKEND'].endswith(('.LocMemCache', '.DummyCache')):
+    SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+else:
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+# Segundos que se mantiene en cache el usuario autenticado (con su perfil y entidad).
+# Sin cache compartida no se cachea (ver core.auth_cache.cache_enabled)
+AUTH_USER_CACHE_TIMEOUT = int(os.environ.get('AUTH_USER_CACHE_TIMEOUT', 300))
+
+# Minutos sin actividad tras los que reap_executions da por abandonada una ejecución
+EXECUTION_IDLE_TIMEOUT_MINUTES = int(os.environ.get('EXECUTION_IDLE_TIMEOUT_MINUTES', 60))
+# Días de validez de las invitaciones de candidatos importados (import_candidates)
+INVITE_TOKEN_TTL_DAYS = 14
+
+# Canal push (SSE, /api/events/stream/) y evaluación en segundo plano.
+# Los eventos viven en el estado compartido (SHARED_STATE): con varios workers usar 'shm' o Redis/Memcached.
+# El canal debe servirse con ASGI (testeador_project.asgi): bajo WSGI cada conexión ocupa un hilo
+EVALUATION_WORKERS = int(os.environ.get('EVALUATION_WORKERS', 4))
+EVENTS_TTL = 300
+EVENTS_POLL_INTERVAL = 1.0
+EVENTS_STREAM_SECONDS = 300
+
+# Proveedores de LLM (api.llm_providers). 'local' es un servidor compatible con OpenAI en
+# la misma máquina (llama.cpp, vLLM, Ollama...), solo disponible si se define LOCAL_LLM_URL.
+AI_PROVIDERS = {
+    'openrouter': {
+        'BACKEND': 'api.llm_providers.OpenRouterProvider',
+        'TIMEOUT': int(os.environ.get('OPENROUTER_TIMEOUT', 60)),
+        'RETRIES': 2,
+    },
+}
+if os.environ.get('LOCAL_LLM_URL'):
+    AI_PROVIDERS['local'] = {
+        'BACKEND': 'api.llm_providers.OpenAICompatibleProvider',
+        'BASE_URL': os.environ.get('LOCAL_LLM_URL'),
+        'MODEL': os.environ.get('LOCAL_LLM_MODEL', 'local'),
+        'API_KEY': os.environ.get('LOCAL_LLM_API_KEY'),
+        'TIMEOUT': int(os.environ.get('LOCAL_LLM_TIMEOUT', 30)),
+    }
+AI_DEFAULT_PROVIDER = 'openrouter'
+# Proveedor por tipo de llamada: start, turn, turn_short, evaluation, evaluation_criterion,
+# evaluation_summary (los tipos sin regla heredan la de turn/evaluation o la de por defecto).
+# Ej.: LOCAL_LLM_ROUTES=turn_short,evaluation_criterion
+AI_ROUTING = {
+    call_type: 'local'
+    for call_type in filter(None, os.environ.get('LOCAL_LLM_ROUTES', '').split(','))
+}
+# Un proveedor con PROVIDER_FAILURE_THRESHOLD errores en PROVIDER_FAILURE_WINDOW segundos se salta
+# (se usa el de por defecto) durante PROVIDER_COOLDOWN segundos
+PROVIDER_FAILURE_THRESHOLD = 5
+PROVIDER_FAILURE_WINDOW = 60
+PROVIDER_COOLDOWN = 30
+# Un turno es "corto" (turn_short) si el mensaje del usuario no supera estos caracteres
+AI_SHORT_TURN_MAX_CHARS = 200
+
+# Evaluación de la IA: 'single' (una llamada), 'sharded' (una sub-petición por criterio
+# en paralelo) o 'auto' (en paralelo a partir de AI_EVALUATION_SHARD_MIN_CRITERIA criterios)
+AI_EVALUATION_MODE = os.environ.get('AI_EVALUATION_MODE', 'auto')
+AI_EVALUATION_SHARD_MIN_CRITERIA = 4
+# Sub-peticiones simultáneas por evaluación y reintentos de cada una
+AI_EVALUATION_CONCURRENCY = int(os.environ.get('AI_EVALUATION_CONCURRENCY', 4))
+AI_EVALUATION_SHARD_RETRIES = 1
+
+# Estadísticas por cohorte (core.score_stats): tamaño mínimo publicado y Tests en memoria por proceso
+SCORE_COHORT_MIN_SIZE = 5
+SCORE_COHORT_CACHE_SIZE = 128
+
+# Respuestas casi duplicadas (core.similarity): palabras mínimas para indexar una respuesta
+# y similitud de Jaccard estimada a partir de la cual se marca la ejecución
+SIMILARITY_MIN_WORDS = 12
+SIMILARITY_THRESHOLD = 0.6
+
+# Límites de entrada antes de llamar a la IA (core.input_guards). Cada Entidad puede fijar los suyos.
+# Tokens estimados como caracteres / INPUT_CHARS_PER_TOKEN. Política para mensajes largos:
+# 'reject' (HTTP 413) o 'truncate' (se recorta y se avisa con "truncated": true)
+INPUT_CHARS_PER_TOKEN = 4
+INPUT_MAX_MESSAGE_TOKENS = 1000
+INPUT_MAX_CONVERSATION_TOKENS = 16000
+INPUT_MAX_PROMPT_TOKENS = 4000
+INPUT_OVERSIZE_POLICY = 'reject'
+
+# Perfilado por muestreo (core.profiling): fracción de peticiones perfiladas (0 = desactivado),
+# umbral para guardar la traza y tamaño del buffer circular (por proceso). PROFILER_CPROFILE
+# añade la salida de cProfile a cada traza (caro: solo para diagnósticos puntuales).
+PROFILER_SAMPLE_RATE = float(os.environ.get('PROFILER_SAMPLE_RATE', 0))
+PROFILER_SLOW_MS = int(os.environ.get('PROFILER_SLOW_MS', 500))
+PROFILER_BUFFER_SIZE = 100
+PROFILER_MAX_QUERIES = 50
+PROFILER_CPROFILE = os.environ.get('PROFILER_CPROFILE', '').lower() in {'1', 'true', 'yes'}
+
+
+# Django REST framework: renderer/parser JSON rápidos (usan orjson si está instalado)
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+}
+
+# Tamaño mínimo (bytes) a partir del cual se comprimen las respuestas
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+COMPRESSION_BROTLI_QUALITY = 5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators